@@ -4,6 +4,7 @@ Aplicación principal de análisis de sentimientos con IA
 import streamlit as st
 import sys
 import os
+from importlib.util import find_spec
 from pathlib import Path
 
 # Agregar el directorio raíz al path para importaciones
@@ -12,20 +13,23 @@ sys.path.append(str(root_dir))
 
 # Importar módulos locales
 try:
-    from utils.ai_analyzer import analyzer
+    from utils.ai_analyzer import get_analyzer
     from components.ui_components import (
-        render_header,
-        render_description,
+        render_page_chrome,
         render_sidebar,
         render_input_section,
         render_provider_selection,
         render_analysis_results,
+        render_analysis_stream,
+        render_history_section,
+        render_search_section,
         render_footer,
         render_error_message,
         render_success_message,
         show_loading_animation
     )
-    from config.settings import APP_TITLE, APP_DESCRIPTION
+    from config.settings import APP_TITLE, APP_DESCRIPTION, STREAMING_ENABLED, METRICS_PORT
+    from utils.metrics import start_metrics_server
 except ImportError as e:
     st.error(f"Error importando módulos: {e}")
     st.stop()
@@ -55,90 +59,16 @@ st.set_page_config(
     }
 )
 
-# CSS personalizado
-st.markdown("""
-<style>
-    /* Estilos generales */
-    .main {
-        padding-top: 2rem;
-    }
-    
-    /* Ocultar elementos de Streamlit */
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-    header {visibility: hidden;}
-    
-    /* Estilos para botones */
-    .stButton > button {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        border: none;
-        border-radius: 25px;
-        padding: 0.75rem 2rem;
-        font-weight: 600;
-        transition: all 0.3s ease;
-        box-shadow: 0 4px 15px rgba(102, 126, 234, 0.3);
-    }
-    
-    .stButton > button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 6px 20px rgba(102, 126, 234, 0.4);
-    }
-    
-    /* Estilos para inputs */
-    .stTextArea > div > div > textarea {
-        border-radius: 10px;
-        border: 2px solid #e1e5e9;
-        transition: border-color 0.3s ease;
-    }
+@st.cache_resource(show_spinner=False)
+def load_analyzer():
+    """
+    Analizador compartido por todas las sesiones
     
-    .stTextArea > div > div > textarea:focus {
-        border-color: #667eea;
-        box-shadow: 0 0 0 3px rgba(102, 126, 234, 0.1);
-    }
-    
-    /* Estilos para selectbox */
-    .stSelectbox > div > div {
-        border-radius: 10px;
-    }
-    
-    /* Animación de carga */
-    .loading-spinner {
-        display: flex;
-        justify-content: center;
-        align-items: center;
-        height: 100px;
-    }
-    
-    .spinner {
-        width: 40px;
-        height: 40px;
-        border: 4px solid #f3f3f3;
-        border-top: 4px solid #667eea;
-        border-radius: 50%;
-        animation: spin 1s linear infinite;
-    }
-    
-    @keyframes spin {
-        0% { transform: rotate(0deg); }
-        100% { transform: rotate(360deg); }
-    }
-    
-    /* Estilos para métricas */
-    .metric-card {
-        background: white;
-        padding: 1.5rem;
-        border-radius: 15px;
-        box-shadow: 0 4px 20px rgba(0, 0, 0, 0.1);
-        border: 1px solid #e1e5e9;
-        transition: transform 0.3s ease;
-    }
-    
-    .metric-card:hover {
-        transform: translateY(-5px);
-    }
-</style>
-""", unsafe_allow_html=True)
+    Se guarda como recurso de Streamlit: las re-ejecuciones del script lo
+    reutilizan (con sus clientes, caché y router) en lugar de volver a
+    resolverlo, y "Clear cache" lo descarta junto con el resto de recursos.
+    """
+    return get_analyzer()
 
 def main():
     """Función principal de la aplicación"""
@@ -151,36 +81,46 @@ def main():
     if 'last_review' not in st.session_state:
         st.session_state.last_review = ""
     
+    # Endpoint /metrics para Prometheus (una sola vez por proceso)
+    start_metrics_server(METRICS_PORT)
+    
     # Renderizar sidebar
     render_sidebar()
     
-    # Renderizar header y descripción
-    render_header()
-    render_description()
+    # CSS, header y descripción (un solo elemento, construido una vez)
+    render_page_chrome()
     
     # Verificar proveedores disponibles
+    analyzer = load_analyzer()
+    provider_health = analyzer.get_provider_health()
     available_providers = analyzer.get_available_providers()
     
-    if not available_providers:
+    if not provider_health:
         st.error("""
         🚨 **Configuración Requerida**
         
-        Para usar esta aplicación, necesitas configurar al menos una API key:
+        Para usar esta aplicación, necesitas configurar al menos un proveedor:
         
         1. **OpenAI**: Obtén tu API key en https://platform.openai.com/api-keys
         2. **Groq**: Obtén tu API key en https://console.groq.com/keys
-        3. Agrega la API key al archivo `.env` en la carpeta del proyecto
+        3. **Local**: Indica la URL de un servidor compatible con OpenAI (llama.cpp, vLLM...)
+        4. Agrega la configuración al archivo `.env` en la carpeta del proyecto
         
         **Ejemplo del archivo .env:**
         ```
         OPENAI_API_KEY=tu_api_key_aqui
         GROQ_API_KEY=tu_api_key_aqui
+        LOCAL_LLM_BASE_URL=http://localhost:8080/v1
         ```
         """)
         st.stop()
     
     # Mostrar proveedores disponibles
-    st.success(f"✅ Proveedores disponibles: {', '.join(available_providers)}")
+    if available_providers:
+        st.success(f"✅ Proveedores disponibles: {', '.join(available_providers)}")
+    unavailable_providers = [p for p in provider_health if p not in available_providers]
+    if unavailable_providers:
+        st.warning(f"⚠️ Temporalmente no disponibles por fallos repetidos: {', '.join(unavailable_providers)}")
     
     # Sección de entrada
     st.markdown("---")
@@ -192,6 +132,7 @@ def main():
     
     # Selección de proveedor
     provider = render_provider_selection()
+    product = st.session_state.get("product_tag") or None
     
     # Botón de análisis
     st.markdown("---")
@@ -206,32 +147,51 @@ def main():
         )
     
     # Procesar análisis
+    streamed_now = False
     if analyze_button:
         if not review_text or not review_text.strip():
             st.warning("⚠️ Por favor, ingresa una reseña para analizar.")
             return
         
-        # Mostrar loading
-        with st.spinner("🤖 Analizando sentimiento... Por favor espera"):
+        if STREAMING_ENABLED:
+            # Los resultados se pintan a medida que llegan en lugar de esperar con un spinner
+            status = st.empty()
+            status.info("🤖 Analizando sentimiento...")
+            st.markdown("---")
             try:
-                # Realizar análisis
-                result = analyzer.analyze_sentiment(review_text, provider)
-                
-                # Guardar resultado
+                result = render_analysis_stream(analyzer.analyze_sentiment_stream(review_text, provider, product))
                 st.session_state.analysis_result = result
                 st.session_state.last_review = review_text
-                
-                # Mostrar mensaje de éxito
-                render_success_message()
-                
+                with status.container():
+                    render_success_message()
+                streamed_now = True
             except Exception as e:
-                render_error_message(str(e))
+                with status.container():
+                    render_error_message(str(e))
                 return
+        else:
+            # Mostrar loading
+            with st.spinner("🤖 Analizando sentimiento... Por favor espera"):
+                try:
+                    # Realizar análisis
+                    result = analyzer.analyze_sentiment(review_text, provider, product=product)
+                    
+                    # Guardar resultado
+                    st.session_state.analysis_result = result
+                    st.session_state.last_review = review_text
+                    
+                    # Mostrar mensaje de éxito
+                    render_success_message()
+                    
+                except Exception as e:
+                    render_error_message(str(e))
+                    return
     
-    # Mostrar resultados si existen
+    # Mostrar resultados si existen (ya pintados si se acaban de recibir en streaming)
     if st.session_state.analysis_result:
-        st.markdown("---")
-        render_analysis_results(st.session_state.analysis_result)
+        if not streamed_now:
+            st.markdown("---")
+            render_analysis_results(st.session_state.analysis_result)
         
         # Opción para nuevo análisis
         st.markdown("---")
@@ -244,26 +204,35 @@ def main():
                     del st.session_state.ejemplo_seleccionado
                 st.rerun()
     
+    # Historial de análisis guardados
+    st.markdown("---")
+    render_history_section()
+    render_search_section()
+    
     # Footer
     render_footer()
 
+@st.cache_resource(show_spinner=False)
+def _missing_modules() -> tuple:
+    """
+    Buscar los módulos necesarios sin importarlos (una vez por proceso)
+    
+    `find_spec` solo localiza el paquete: importarlo aquí cargaría en cada
+    arranque dependencias que la app solo usa más tarde, o nunca.
+    """
+    required_modules = {
+        'streamlit': 'streamlit',
+        'openai': 'openai',
+        'groq': 'groq',
+        'plotly': 'plotly',
+        'pandas': 'pandas',
+        'python-dotenv': 'dotenv'
+    }
+    return tuple(package for package, module in required_modules.items() if find_spec(module) is None)
+
 def check_requirements():
     """Verificar que todos los módulos necesarios estén instalados"""
-    required_modules = [
-        'streamlit',
-        'openai',
-        'groq',
-        'plotly',
-        'pandas',
-        'python-dotenv'
-    ]
-    
-    missing_modules = []
-    for module in required_modules:
-        try:
-            __import__(module.replace('-', '_'))
-        except ImportError:
-            missing_modules.append(module)
+    missing_modules = _missing_modules()
     
     if missing_modules:
         st.error(f"""
@@ -0,0 +1,147 @@
+"""
+Prueba de carga del servicio HTTP contra el servidor LLM simulado
+
+Uso:
+    python -m benchmarks.api_load --requests 500 --concurrency 64
+    python -m benchmarks.api_load --max-concurrent 8 --concurrency 64 --latency 0.2
+
+Arranca el servidor simulado en otro proceso y la API (uvicorn) en un hilo
+de este, apuntando el proveedor OpenAI al simulado. Lanza peticiones
+concurrentes a POST /analyze y un lote a POST /analyze/batch, e informa
+del rendimiento, los percentiles de latencia y cuántas peticiones se
+rechazaron con 429. Con --max-concurrent por debajo de --concurrency se
+comprueba la contrapresión. Sale con código 1 si alguna respuesta no es
+200 ni 429 o si el lote no devuelve una línea por reseña.
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.mock_server import MockConfig
+from benchmarks.run_benchmarks import build_analyzers, make_reviews, start_mock_process
+
+
+def start_api(app, timeout: float = 10):
+    """
+    Arrancar uvicorn en un hilo en segundo plano
+
+    Returns:
+        Tuple[uvicorn.Server, str]: Servidor (para detenerlo) y URL base
+    """
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="api", daemon=True)
+    thread.start()
+    deadline = time.monotonic() + timeout
+    while not server.started:
+        if time.monotonic() > deadline or not thread.is_alive():
+            raise RuntimeError("La API no arrancó")
+        time.sleep(0.02)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, f"http://127.0.0.1:{port}"
+
+
+async def _load(url: str, reviews: List[str], concurrency: int, timeout: float) -> Dict:
+    """Lanzar las peticiones individuales con `concurrency` clientes a la vez"""
+    import httpx
+
+    statuses: Dict[int, int] = {}
+    latencies: List[float] = []
+    queue = list(reversed(reviews))
+
+    async def _client(http):
+        while queue:
+            review = queue.pop()
+            start_time = time.perf_counter()
+            response = await http.post("/analyze", json={"review": review, "provider": "openai"})
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - start_time)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as http:
+        start_time = time.perf_counter()
+        await asyncio.gather(*(_client(http) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start_time
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "peticiones": len(reviews),
+        "segundos": round(elapsed, 3),
+        "peticiones_por_segundo": round(len(reviews) / elapsed, 1),
+        "respuestas": statuses,
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 1) if latencies else None,
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 1) if latencies else None,
+    }
+
+
+async def _batch(url: str, reviews: List[str], timeout: float) -> Dict:
+    """Enviar un lote y leer la respuesta NDJSON línea a línea"""
+    import httpx
+
+    lines = []
+    first_line = None
+    async with httpx.AsyncClient(base_url=url, timeout=timeout) as http:
+        start_time = time.perf_counter()
+        payload = {"reviews": reviews, "provider": "openai", "dedup": False}
+        async with http.stream("POST", "/analyze/batch", json=payload) as response:
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                if first_line is None:
+                    first_line = time.perf_counter() - start_time
+                lines.append(json.loads(line))
+        elapsed = time.perf_counter() - start_time
+    return {
+        "estado": response.status_code,
+        "lineas": len(lines),
+        "errores": sum(1 for line in lines if line.get("error")),
+        "primera_linea_ms": round(first_line * 1000, 1) if first_line is not None else None,
+        "segundos": round(elapsed, 3),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Ejecutar la prueba de carga y salir con 1 si algo falla"""
+    parser = argparse.ArgumentParser(description="Prueba de carga del servicio HTTP")
+    parser.add_argument("--requests", type=int, default=500, help="Peticiones a POST /analyze")
+    parser.add_argument("--concurrency", type=int, default=32, help="Clientes simultáneos")
+    parser.add_argument("--max-concurrent", type=int, default=64, help="Cupo de peticiones en curso de la API")
+    parser.add_argument("--analyzer-concurrency", type=int, default=64, help="Llamadas simultáneas al proveedor")
+    parser.add_argument("--batch-size", type=int, default=200, help="Reseñas del lote NDJSON (0 para omitirlo)")
+    parser.add_argument("--latency", type=float, default=0.05, help="Latencia del servidor simulado")
+    parser.add_argument("--timeout", type=float, default=30, help="Límite por petición de la API")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    from utils.api import create_app
+
+    process, mock_url = start_mock_process(MockConfig(latency=args.latency, jitter=args.latency / 4))
+    try:
+        _, analyzer = build_analyzers(mock_url, args.analyzer_concurrency)
+        app = create_app(analyzer, max_concurrent_requests=args.max_concurrent, request_timeout=args.timeout)
+        server, url = start_api(app)
+        try:
+            reviews = make_reviews(args.requests + args.batch_size, args.seed)
+            single = asyncio.run(_load(url, reviews[:args.requests], args.concurrency, args.timeout + 5))
+            batch = asyncio.run(_batch(url, reviews[args.requests:], args.timeout + 5)) if args.batch_size else None
+        finally:
+            server.should_exit = True
+    finally:
+        process.terminate()
+
+    print(json.dumps({"analyze": single, "analyze_batch": batch}, indent=2, ensure_ascii=False))
+    ok = set(single["respuestas"]) <= {200, 429}
+    if batch is not None:
+        ok = ok and batch["estado"] == 200 and batch["lineas"] == args.batch_size
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
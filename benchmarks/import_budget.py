@@ -0,0 +1,127 @@
+"""
+Comprobación del coste de arranque: tiempo de importación y dependencias cargadas
+
+Uso:
+    python -m benchmarks.import_budget
+    python -m benchmarks.import_budget --budget-core 0.3 --budget-ui 0.4
+
+Cada objetivo se importa en un intérprete nuevo (varias veces, se toma la
+mejor) y falla si supera su presupuesto o si carga alguna dependencia
+pesada que solo debería importarse en el primer uso. Sale con código 1 si
+algún objetivo no cumple, para poder usarlo en CI.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Se miden con las claves configuradas pero sin red: crear clientes o leer
+# los secrets de Streamlit sería justo lo que esta comprobación quiere evitar
+_ENV = {"OPENAI_API_KEY": "budget", "GROQ_API_KEY": "budget", "CACHE_ENABLED": "false", "HISTORY_ENABLED": "false"}
+
+_PROBE = """
+import json, sys, time
+{setup}
+start = time.perf_counter()
+{imports}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+@dataclass
+class Target:
+    """Conjunto de módulos a importar y lo que no deben arrastrar"""
+
+    name: str
+    imports: Tuple[str, ...]
+    forbidden: Tuple[str, ...]
+    budget: float
+    # Módulos que ya están cargados en el escenario real (p. ej. streamlit
+    # en la app) y no cuentan para el presupuesto
+    preloaded: Tuple[str, ...] = ()
+
+
+def default_targets(budget_core: float, budget_ui: float) -> List[Target]:
+    """Objetivos por defecto: núcleo (CLI/API) e interfaz de Streamlit"""
+    return [
+        Target(
+            name="core",
+            imports=("config.settings", "utils.ai_analyzer", "utils.batch_cli"),
+            forbidden=("openai", "groq", "httpx", "streamlit", "pandas", "plotly"),
+            budget=budget_core,
+        ),
+        Target(
+            name="ui",
+            imports=("utils.ai_analyzer", "components.ui_components", "utils.metrics"),
+            forbidden=("openai", "groq", "pandas", "plotly.express"),
+            budget=budget_ui,
+            preloaded=("streamlit",),
+        ),
+    ]
+
+
+def measure(target: Target, repeat: int = 3) -> Dict:
+    """
+    Importar un objetivo en intérpretes nuevos
+
+    Args:
+        target (Target): Objetivo a medir
+        repeat (int): Repeticiones; se toma el menor tiempo
+
+    Returns:
+        Dict: Segundos, módulos prohibidos cargados y si cumple
+    """
+    code = _PROBE.format(
+        setup="\n".join(f"import {name}" for name in target.preloaded),
+        imports="\n".join(f"import {name}" for name in target.imports),
+    )
+    env = {**os.environ, **_ENV, "PYTHONPATH": str(ROOT)}
+    best: Optional[Dict] = None
+    for _ in range(max(1, repeat)):
+        output = subprocess.run(
+            [sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        sample = json.loads(output.strip().splitlines()[-1])
+        if best is None or sample["seconds"] < best["seconds"]:
+            best = sample
+
+    loaded = set(best["modules"])
+    leaked = sorted(name for name in target.forbidden if name in loaded)
+    return {
+        "objetivo": target.name,
+        "segundos": round(best["seconds"], 4),
+        "presupuesto": target.budget,
+        "cargados": leaked,
+        "ok": best["seconds"] <= target.budget and not leaked,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Medir los objetivos y salir con 1 si alguno no cumple"""
+    parser = argparse.ArgumentParser(description="Presupuesto de tiempo de importación")
+    parser.add_argument("--budget-core", type=float, default=0.5, help="Segundos para el núcleo (CLI/API)")
+    parser.add_argument("--budget-ui", type=float, default=0.5, help="Segundos para la interfaz, sin streamlit")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="Imprimir el resultado como JSON")
+    args = parser.parse_args(argv)
+
+    results = [measure(target, args.repeat) for target in default_targets(args.budget_core, args.budget_ui)]
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        for result in results:
+            status = "OK  " if result["ok"] else "FALLA"
+            leaked = f" cargó: {', '.join(result['cargados'])}" if result["cargados"] else ""
+            print(f"{status} {result['objetivo']:<5} {result['segundos']:.3f}s (presupuesto {result['presupuesto']}s){leaked}")
+    return 0 if all(result["ok"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,292 @@
+"""
+Servidor local compatible con la API de chat de OpenAI/Groq para benchmarks
+
+Responde a `POST /v1/chat/completions` (OpenAI) y
+`POST /openai/v1/chat/completions` (Groq) sin coste ni red externa, con
+latencia, jitter, tasa de errores y forma de respuesta configurables.
+Todas las decisiones aleatorias salen de un generador con semilla para que
+las ejecuciones sean reproducibles.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+CHAT_PATHS = ("/v1/chat/completions", "/openai/v1/chat/completions")
+
+# Formas de respuesta: JSON limpio, en bloque de código, truncado (requiere
+# reparación) y texto libre (cae en el parsing alternativo)
+RESPONSE_SHAPES = ("json", "fenced", "truncated", "prose")
+
+_PACKED_ID_RE = re.compile(r"^\[(\d+)\]", re.MULTILINE)
+
+_ASPECTS = {
+    "Positivo": ["calidad del producto", "entrega rápida", "buen precio", "atención al cliente"],
+    "Negativo": ["producto dañado", "entrega tardía", "mala atención", "no funciona"],
+    "Neutral": ["precio aceptable", "calidad estándar"],
+}
+
+
+@dataclass
+class MockConfig:
+    """Comportamiento del servidor simulado"""
+
+    latency: float = 0.05
+    jitter: float = 0.02
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    shapes: Tuple[str, ...] = ("json",)
+    stream_chunk_chars: int = 12
+    seed: int = 42
+
+
+def _sentiment_for(text: str) -> Tuple[str, int]:
+    """Elegir un sentimiento determinista a partir del texto"""
+    value = sum(text.encode("utf-8")) % 10 + 1
+    if value >= 7:
+        return "Positivo", value
+    if value <= 4:
+        return "Negativo", value
+    return "Neutral", value
+
+
+def _analysis(text: str) -> Dict:
+    """Resultado simulado con la estructura que espera el analizador"""
+    sentiment, score = _sentiment_for(text)
+    aspects = _ASPECTS[sentiment]
+    return {
+        "sentimiento_general": sentiment,
+        "puntuacion": score,
+        "aspectos_positivos": aspects[:2] if sentiment != "Negativo" else [],
+        "aspectos_negativos": aspects[:2] if sentiment == "Negativo" else [],
+        "recomendaciones": ["Mantener la calidad", "Revisar los tiempos de entrega"],
+        "resumen": f"Reseña {sentiment.lower()} de {len(text)} caracteres.",
+    }
+
+
+def build_content(messages: List[Dict], shape: str) -> str:
+    """
+    Construir el contenido de la respuesta para unos mensajes
+
+    Args:
+        messages (List[Dict]): Mensajes recibidos
+        shape (str): Forma de respuesta (ver RESPONSE_SHAPES)
+
+    Returns:
+        str: Contenido del mensaje del asistente
+    """
+    prompt = messages[-1]["content"] if messages else ""
+
+    if "Resúmenes de los fragmentos" in prompt:
+        return "Resumen unificado de la reseña completa."
+
+    packed_ids = _PACKED_ID_RE.findall(prompt)
+    if packed_ids:
+        items = [{"id": int(item_id), **_analysis(f"{prompt}{item_id}")} for item_id in packed_ids]
+        return json.dumps(items, ensure_ascii=False)
+
+    data = _analysis(prompt)
+    if shape == "fenced":
+        return f"```json\n{json.dumps(data, ensure_ascii=False, indent=2)}\n```"
+    if shape == "truncated":
+        text = json.dumps(data, ensure_ascii=False)
+        return text[:text.index('"resumen"')] + '"resumen": "Reseña cortada'
+    if shape == "prose":
+        return f"El sentimiento general es {data['sentimiento_general'].lower()}."
+    return json.dumps(data, ensure_ascii=False)
+
+
+def _usage(messages: List[Dict], content: str) -> Dict[str, int]:
+    """Uso de tokens aproximado (4 caracteres por token) para las métricas de coste"""
+    prompt_tokens = sum(len(message.get("content", "")) for message in messages) // 4 + 1
+    completion_tokens = len(content) // 4 + 1
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Cabeceras y cuerpo van en escrituras separadas: sin esto Nagle añade ~40 ms
+    disable_nagle_algorithm = True
+    server: "MockLLMServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: Dict, headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        if self.path not in CHAT_PATHS:
+            self._send_json(404, {"error": {"message": f"Ruta desconocida: {self.path}"}})
+            return
+
+        delay, outcome, shape = self.server.draw()
+        time.sleep(delay)
+        self.server.count(outcome)
+
+        if outcome == "rate_limited":
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}},
+                {"retry-after-ms": "50", "x-ratelimit-remaining-requests": "0"},
+            )
+            return
+        if outcome == "error":
+            self._send_json(500, {"error": {"message": "Simulated server error", "type": "server_error"}})
+            return
+
+        content = build_content(request.get("messages", []), shape)
+        model = request.get("model", "mock")
+        if request.get("stream"):
+            self._stream(content, model)
+            return
+
+        self._send_json(200, {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": _usage(request.get("messages", []), content),
+        }, {"x-ratelimit-remaining-tokens": "1000000", "x-ratelimit-remaining-requests": "10000"})
+
+    def _stream(self, content: str, model: str) -> None:
+        """Enviar el contenido como eventos SSE troceados"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        size = self.server.config.stream_chunk_chars
+        for start in range(0, len(content), size):
+            chunk = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": content[start:start + size]}, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """
+    Servidor simulado que corre en un hilo en segundo plano
+
+    Uso:
+        with MockLLMServer(MockConfig(latency=0.1)) as server:
+            server.url  # http://127.0.0.1:<puerto>
+    """
+
+    daemon_threads = True
+    # La cola de 5 por defecto se desborda con ráfagas de conexiones y el cliente ve "Connection error"
+    request_queue_size = 256
+
+    def __init__(self, config: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _Handler)
+        self.config = config or MockConfig()
+        self.requests = {"ok": 0, "error": 0, "rate_limited": 0}
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """URL base del servidor"""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def draw(self) -> Tuple[float, str, str]:
+        """Sortear latencia, resultado y forma de la siguiente respuesta"""
+        config = self.config
+        with self._lock:
+            delay = max(0.0, config.latency + self._random.uniform(-config.jitter, config.jitter))
+            roll = self._random.random()
+            shape = self._random.choice(config.shapes)
+        if roll < config.rate_limit_rate:
+            return delay, "rate_limited", shape
+        if roll < config.rate_limit_rate + config.error_rate:
+            return delay, "error", shape
+        return delay, "ok", shape
+
+    def count(self, outcome: str) -> None:
+        """Contabilizar una respuesta servida"""
+        with self._lock:
+            self.requests[outcome] += 1
+
+    def start(self) -> "MockLLMServer":
+        """Atender peticiones en un hilo en segundo plano"""
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Detener el servidor"""
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "MockLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Ejecutar el servidor simulado en primer plano"""
+    parser = argparse.ArgumentParser(description="Servidor local compatible con OpenAI/Groq para benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="Latencia media en segundos")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Variación máxima de la latencia")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de respuestas 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fracción de respuestas 429")
+    parser.add_argument("--shapes", default="json", help=f"Formas separadas por comas: {','.join(RESPONSE_SHAPES)}")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    config = MockConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        shapes=tuple(args.shapes.split(",")),
+        seed=args.seed,
+    )
+    server = MockLLMServer(config, args.host, args.port)
+    print(f"Servidor simulado escuchando en {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
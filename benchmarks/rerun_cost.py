@@ -0,0 +1,134 @@
+"""
+Comprobación del coste de las re-ejecuciones de la interfaz de Streamlit
+
+Uso:
+    python -m benchmarks.rerun_cost
+
+Simula una sesión con `streamlit.testing.v1.AppTest` que ya tiene un
+resultado en pantalla y realiza interacciones que no tienen que ver con él
+(escribir, elegir un ejemplo, cambiar de proveedor). Comprueba que:
+
+- las secciones donde ocurren esas interacciones son fragmentos, de modo
+  que en el navegador solo se re-ejecutan ellas y no los resultados;
+- el gráfico de puntuación se construye una sola vez y se reutiliza;
+- el analizador se crea una sola vez y ninguna interacción lo invoca;
+- el resultado sigue visible tras cada interacción.
+
+AppTest re-ejecuta siempre el script completo (no simula re-ejecuciones
+de un solo fragmento), así que el aislamiento se comprueba por la
+decoración de las secciones y el resto midiendo el trabajo de cada vuelta.
+Sale con código 1 si alguna comprobación falla, para poder usarlo en CI.
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Claves ficticias: la comprobación no hace llamadas de red
+_ENV = {"OPENAI_API_KEY": "rerun", "GROQ_API_KEY": "rerun", "CACHE_ENABLED": "false", "HISTORY_ENABLED": "false", "METRICS_PORT": "0"}
+
+_RESULT = {
+    "sentimiento_general": "Positivo",
+    "puntuacion": 8,
+    "aspectos_positivos": ["calidad del producto"],
+    "aspectos_negativos": [],
+    "recomendaciones": ["Mantener la calidad"],
+    "resumen": "Reseña positiva.",
+    "proveedor": "OpenAI",
+}
+
+
+def _interactions(at) -> List:
+    """Interacciones ajenas al resultado, en el orden en que se aplican"""
+    return [
+        ("escribir una reseña", lambda: at.text_area(key="review_text").input("Llegó a tiempo y funciona bien.")),
+        ("elegir un ejemplo", lambda: at.button(key="ejemplo_Reseña Negativa").click()),
+        ("cambiar de proveedor", lambda: at.selectbox(key="provider").select_index(-1)),
+    ]
+
+
+def run_checks(timeout: float = 30) -> Dict[str, bool]:
+    """
+    Ejecutar la app con AppTest y aplicar las comprobaciones
+
+    Args:
+        timeout (float): Segundos máximos por ejecución del script
+
+    Returns:
+        Dict[str, bool]: Resultado de cada comprobación
+    """
+    os.environ.update(_ENV)
+    sys.path.insert(0, str(ROOT))
+
+    import plotly.graph_objects as go
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    from components import ui_components
+    from utils import ai_analyzer
+
+    checks: Dict[str, bool] = {}
+    has_fragments = (getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)) is not None
+    for name in ("render_input_section", "render_provider_selection"):
+        section = getattr(ui_components, name)
+        checks[f"{name} es un fragmento"] = not has_fragments or hasattr(section, "__wrapped__")
+
+    st.cache_resource.clear()
+    calls = {"figuras": 0, "analizador": 0, "analisis": 0}
+    real_indicator = go.Indicator
+    real_init = ai_analyzer.SentimentAnalyzer.__init__
+
+    def counting_indicator(*args, **kwargs):
+        calls["figuras"] += 1
+        return real_indicator(*args, **kwargs)
+
+    def counting_init(self, *args, **kwargs):
+        calls["analizador"] += 1
+        real_init(self, *args, **kwargs)
+
+    def forbidden_analysis(*args, **kwargs):
+        calls["analisis"] += 1
+        raise AssertionError("una interacción ajena al resultado lanzó un análisis")
+
+    with mock.patch.object(go, "Indicator", counting_indicator), \
+            mock.patch.object(ai_analyzer.SentimentAnalyzer, "__init__", counting_init), \
+            mock.patch.object(ai_analyzer.SentimentAnalyzer, "analyze_sentiment", forbidden_analysis), \
+            mock.patch.object(ai_analyzer.SentimentAnalyzer, "analyze_sentiment_stream", forbidden_analysis):
+        at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=timeout)
+        at.session_state["analysis_result"] = dict(_RESULT)
+        at.run()
+        checks["primera ejecución sin excepciones"] = not at.exception
+        static = [element for element in at.markdown if "<style>" in element.value]
+        checks["CSS, cabecera y descripción en un solo elemento"] = (
+            len(static) == 1 and "Analizador de Sentimientos" in static[0].value
+        )
+
+        for label, interact in _interactions(at):
+            interact().run()
+            shown = any("Resultados del Análisis" in element.value for element in at.markdown)
+            checks[f"{label}: sin excepciones y con el resultado visible"] = not at.exception and shown
+
+    checks["gráfico de puntuación construido una vez"] = calls["figuras"] == 1
+    checks["analizador creado una vez"] = calls["analizador"] <= 1
+    checks["ninguna interacción lanzó un análisis"] = calls["analisis"] == 0
+    return checks
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Ejecutar las comprobaciones y salir con 1 si alguna falla"""
+    parser = argparse.ArgumentParser(description="Coste de las re-ejecuciones de la interfaz")
+    parser.add_argument("--timeout", type=float, default=30, help="Segundos máximos por ejecución del script")
+    args = parser.parse_args(argv)
+
+    checks = run_checks(args.timeout)
+    for label, ok in checks.items():
+        print(f"{'OK  ' if ok else 'FALLA'} {label}")
+    return 0 if all(checks.values()) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,446 @@
+"""
+Benchmarks del pipeline de análisis contra un servidor LLM simulado
+
+Uso:
+    python -m benchmarks.run_benchmarks --scenarios single,batch --concurrency 1,8,32
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/a.json benchmarks/results/b.json
+
+El servidor simulado corre en un proceso aparte para que la CPU y la
+memoria medidas sean solo las del analizador. Los informes se guardan en
+JSON con el commit actual para compararlos entre versiones.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+# El benchmark mide el camino completo hasta el proveedor: sin caché, sin
+# léxico, sin historial y sin límites de cuota, salvo que se indique otra
+# cosa en el entorno
+for _name, _value in {
+    "CACHE_ENABLED": "false",
+    "HISTORY_ENABLED": "false",
+    "LEXICON_ENABLED": "false",
+    "OPENAI_RPM": "0",
+    "OPENAI_TPM": "0",
+    "GROQ_RPM": "0",
+    "GROQ_TPM": "0",
+    "OPENAI_API_KEY": "benchmark",
+    "GROQ_API_KEY": "benchmark",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from benchmarks.mock_server import RESPONSE_SHAPES, MockConfig, MockLLMServer, build_content
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+SCENARIOS = ("parse", "single", "batch", "packed", "async", "stream")
+
+# Variación relativa a partir de la cual --compare marca una diferencia
+REGRESSION_THRESHOLD = 0.10
+
+_WORDS = {
+    "inicio": ["El producto", "La entrega", "El servicio", "La calidad", "El empaque", "El precio"],
+    "verbo": ["fue", "resultó", "me pareció", "es", "estuvo"],
+    "valor": ["excelente", "aceptable", "terrible", "mejor de lo esperado", "normal", "decepcionante"],
+    "cierre": ["Lo recomiendo.", "No volveré a comprar.", "Cumple con lo básico.", "Llegó a tiempo.", "Podría mejorar."],
+}
+
+
+def make_reviews(count: int, seed: int, sentences: int = 4) -> List[str]:
+    """
+    Generar reseñas sintéticas deterministas
+
+    Args:
+        count (int): Número de reseñas
+        seed (int): Semilla del generador
+        sentences (int): Oraciones por reseña
+
+    Returns:
+        List[str]: Reseñas distintas entre sí
+    """
+    rng = random.Random(seed)
+    reviews = []
+    for i in range(count):
+        parts = [
+            f"{rng.choice(_WORDS['inicio'])} {rng.choice(_WORDS['verbo'])} {rng.choice(_WORDS['valor'])}."
+            for _ in range(sentences)
+        ]
+        parts.append(rng.choice(_WORDS["cierre"]))
+        reviews.append(f"{' '.join(parts)} (pedido {i})")
+    return reviews
+
+
+def _serve(config: MockConfig, queue) -> None:
+    """Proceso hijo: arrancar el servidor simulado e informar su URL"""
+    server = MockLLMServer(config)
+    queue.put(server.url)
+    server.serve_forever()
+
+
+def start_mock_process(config: MockConfig):
+    """
+    Arrancar el servidor simulado en otro proceso
+
+    Returns:
+        Tuple[multiprocessing.Process, str]: Proceso y URL base
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve, args=(config, queue), daemon=True)
+    process.start()
+    return process, queue.get(timeout=10)
+
+
+def build_analyzers(base_url: str, concurrency: int):
+    """
+    Crear analizadores síncrono y asíncrono apuntando al servidor simulado
+
+    Args:
+        base_url (str): URL del servidor simulado
+        concurrency (int): Concurrencia máxima del analizador asíncrono
+
+    Returns:
+        Tuple[SentimentAnalyzer, AsyncSentimentAnalyzer]
+    """
+    from utils.ai_analyzer import AsyncSentimentAnalyzer, SentimentAnalyzer, providers
+
+    # El SDK de Groq añade /openai/v1 a la URL base; el de OpenAI no. Se
+    # cierran los clientes compartidos para que se creen con la nueva URL
+    for name, url in (("openai", f"{base_url}/v1"), ("groq", base_url)):
+        providers[name].base_url = url
+        providers[name].close()
+
+    analyzer = SentimentAnalyzer()
+    async_analyzer = AsyncSentimentAnalyzer(max_concurrency=concurrency)
+    return analyzer, async_analyzer
+
+
+def _reset_provider_state() -> None:
+    """Cerrar los circuit breakers para que un escenario no afecte al siguiente"""
+    from utils.ai_analyzer import circuit_breakers
+
+    for breaker in circuit_breakers.values():
+        breaker.record_success()
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """Memoria residente máxima del proceso en MB"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KB y macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def measure(run: Callable[[], Dict]) -> Dict:
+    """
+    Ejecutar un escenario midiendo tiempo de pared, CPU y memoria
+
+    Args:
+        run (Callable[[], Dict]): Devuelve {"latencies", "errors", "operations"}
+
+    Returns:
+        Dict: Métricas del escenario
+    """
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    outcome = run()
+    duration = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    operations = outcome["operations"]
+    latencies = np.asarray(outcome["latencies"], dtype=np.float64) * 1000
+    metrics = {
+        "operations": operations,
+        "errors": outcome["errors"],
+        "duration_s": round(duration, 4),
+        "ops_per_s": round(operations / duration, 2) if duration else None,
+        "cpu_s": round(cpu, 4),
+        "cpu_per_op_ms": round(cpu * 1000 / operations, 4) if operations else None,
+        "rss_peak_mb": _peak_rss_mb(),
+    }
+    for percentile in (50, 95, 99):
+        metrics[f"p{percentile}_ms"] = round(float(np.percentile(latencies, percentile)), 3) if latencies.size else None
+    if outcome.get("first_chunk"):
+        metrics["first_chunk_p50_ms"] = round(float(np.percentile(outcome["first_chunk"], 50)) * 1000, 3)
+    return metrics
+
+
+def _timed_calls(function: Callable[[str], object], reviews: List[str], concurrency: int) -> Dict:
+    """Llamar a `function` por reseña en un pool de hilos, midiendo cada llamada"""
+    def _call(review: str):
+        start = time.perf_counter()
+        try:
+            function(review)
+            return time.perf_counter() - start, False
+        except Exception:
+            return time.perf_counter() - start, True
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(_call, reviews))
+    return {
+        "operations": len(reviews),
+        "latencies": [latency for latency, _ in outcomes],
+        "errors": sum(failed for _, failed in outcomes),
+    }
+
+
+def scenario_parse(analyzer, async_analyzer, reviews, provider, concurrency, shapes) -> Dict:
+    """`_parse_ai_response` sobre respuestas de las formas configuradas (solo CPU)"""
+    contents = [
+        build_content([{"role": "user", "content": review}], shapes[i % len(shapes)])
+        for i, review in enumerate(reviews)
+    ]
+    latencies = []
+    for content in contents:
+        start = time.perf_counter()
+        analyzer._parse_ai_response(content)
+        latencies.append(time.perf_counter() - start)
+    return {"operations": len(contents), "latencies": latencies, "errors": 0}
+
+
+def scenario_single(analyzer, async_analyzer, reviews, provider, concurrency, shapes) -> Dict:
+    """`analyze_sentiment` por reseña con `concurrency` hilos"""
+    return _timed_calls(lambda review: analyzer.analyze_sentiment(review, provider), reviews, concurrency)
+
+
+def scenario_batch(analyzer, async_analyzer, reviews, provider, concurrency, shapes) -> Dict:
+    """`analyze_batch` con `max_concurrency=concurrency`"""
+    items = list(analyzer.analyze_batch(reviews, provider, max_concurrency=concurrency))
+    return {
+        "operations": len(items),
+        "latencies": [item["latencia"] for item in items],
+        "errors": sum(item["error"] is not None for item in items),
+    }
+
+
+def scenario_packed(analyzer, async_analyzer, reviews, provider, concurrency, shapes) -> Dict:
+    """`analyze_packed` (latencias por lote completo, no por reseña)"""
+    start = time.perf_counter()
+    items = analyzer.analyze_packed(reviews, provider, max_concurrency=concurrency)
+    return {
+        "operations": len(items),
+        "latencies": [time.perf_counter() - start],
+        "errors": sum(item["error"] is not None for item in items),
+    }
+
+
+def scenario_async(analyzer, async_analyzer, reviews, provider, concurrency, shapes) -> Dict:
+    """
+    `aanalyze_batch` con un semáforo de `concurrency` peticiones
+
+    Todas las tareas se crean a la vez, así que su latencia incluye la
+    espera en el semáforo; comparar ops/s con el escenario "batch".
+    """
+    async def _run():
+        try:
+            return [item async for item in async_analyzer.aanalyze_batch(reviews, provider)]
+        finally:
+            # Cerrar las conexiones antes de que termine el event loop
+            for client in async_analyzer.async_clients.values():
+                await client.close()
+
+    items = asyncio.run(_run())
+    return {
+        "operations": len(items),
+        "latencies": [item["latencia"] for item in items],
+        "errors": sum(item["error"] is not None for item in items),
+    }
+
+
+def scenario_stream(analyzer, async_analyzer, reviews, provider, concurrency, shapes) -> Dict:
+    """`analyze_sentiment_stream` consumido por completo, midiendo el primer parcial"""
+    first_chunk = []
+
+    def _consume(review: str):
+        start = time.perf_counter()
+        for i, _ in enumerate(analyzer.analyze_sentiment_stream(review, provider)):
+            if i == 0:
+                first_chunk.append(time.perf_counter() - start)
+
+    outcome = _timed_calls(_consume, reviews, concurrency)
+    outcome["first_chunk"] = first_chunk
+    return outcome
+
+
+SCENARIO_FUNCTIONS = {
+    "parse": scenario_parse,
+    "single": scenario_single,
+    "batch": scenario_batch,
+    "packed": scenario_packed,
+    "async": scenario_async,
+    "stream": scenario_stream,
+}
+
+
+def current_commit() -> str:
+    """Commit actual del repositorio (o "desconocido")"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconocido"
+
+
+def run(args: argparse.Namespace) -> Dict:
+    """
+    Ejecutar los escenarios pedidos
+
+    Args:
+        args (argparse.Namespace): Argumentos de la línea de comandos
+
+    Returns:
+        Dict: Informe con metadatos y resultados
+    """
+    shapes = tuple(args.shapes.split(","))
+    config = MockConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        shapes=shapes,
+        seed=args.seed,
+    )
+    scenarios = args.scenarios.split(",")
+    levels = [int(level) for level in args.concurrency.split(",")]
+    reviews = make_reviews(args.requests, args.seed)
+
+    process, base_url = start_mock_process(config)
+    results = []
+    try:
+        for scenario in scenarios:
+            for concurrency in ([1] if scenario == "parse" else levels):
+                _reset_provider_state()
+                analyzer, async_analyzer = build_analyzers(base_url, concurrency)
+                # Calentamiento: conexiones e imports fuera de la medición
+                if scenario != "parse":
+                    _timed_calls(lambda review: analyzer.analyze_sentiment(review, args.provider), reviews[:2], 1)
+                metrics = measure(lambda: SCENARIO_FUNCTIONS[scenario](
+                    analyzer, async_analyzer, reviews, args.provider, concurrency, shapes
+                ))
+                results.append({"scenario": scenario, "concurrency": concurrency, **metrics})
+                print(format_row(results[-1]), file=sys.stderr)
+    finally:
+        process.terminate()
+        process.join()
+
+    return {
+        "meta": {
+            "commit": current_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "provider": args.provider,
+            "requests": args.requests,
+            "mock": {
+                "latency": config.latency,
+                "jitter": config.jitter,
+                "error_rate": config.error_rate,
+                "rate_limit_rate": config.rate_limit_rate,
+                "shapes": list(config.shapes),
+                "seed": config.seed,
+            },
+        },
+        "results": results,
+    }
+
+
+def format_row(result: Dict) -> str:
+    """Formatear una fila de resultados para la terminal"""
+    def _value(key):
+        value = result.get(key)
+        return "-" if value is None else value
+
+    return (
+        f"{result['scenario']:<7} c={result['concurrency']:<4} "
+        f"ops/s={_value('ops_per_s'):<9} p50={_value('p50_ms'):<9} p95={_value('p95_ms'):<9} "
+        f"p99={_value('p99_ms'):<9} cpu/op={_value('cpu_per_op_ms'):<8} "
+        f"rss={_value('rss_peak_mb')}MB errores={result['errors']}"
+    )
+
+
+def compare(baseline_path: str, current_path: str) -> int:
+    """
+    Comparar dos informes e imprimir las variaciones por escenario
+
+    Returns:
+        int: 1 si alguna métrica empeora más de REGRESSION_THRESHOLD, si no 0
+    """
+    baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    current = json.loads(Path(current_path).read_text(encoding="utf-8"))
+    print(f"Base: {baseline['meta']['commit']}  Actual: {current['meta']['commit']}")
+
+    # Para ops/s más es mejor; para latencias y CPU, menos
+    metrics = {"ops_per_s": 1, "p50_ms": -1, "p95_ms": -1, "p99_ms": -1, "cpu_per_op_ms": -1}
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline["results"]}
+    regressions = 0
+    for result in current["results"]:
+        before = previous.get((result["scenario"], result["concurrency"]))
+        if before is None:
+            continue
+        cells = []
+        for metric, direction in metrics.items():
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change * direction < -REGRESSION_THRESHOLD
+            regressions += worse
+            cells.append(f"{metric}={new} ({change:+.1%}){' ⚠' if worse else ''}")
+        print(f"{result['scenario']:<7} c={result['concurrency']:<4} " + "  ".join(cells))
+    return 1 if regressions else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Punto de entrada de la línea de comandos"""
+    parser = argparse.ArgumentParser(description="Benchmarks del analizador contra un LLM simulado")
+    parser.add_argument("--scenarios", default="parse,single,batch", help=f"Separados por comas: {','.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,8,32", help="Niveles de concurrencia separados por comas")
+    parser.add_argument("--requests", type=int, default=200, help="Reseñas por escenario")
+    parser.add_argument("--provider", choices=["openai", "groq"], default="openai")
+    parser.add_argument("--latency", type=float, default=0.05, help="Latencia media del servidor simulado")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Variación máxima de la latencia")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de respuestas 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fracción de respuestas 429")
+    parser.add_argument("--shapes", default="json", help=f"Formas de respuesta: {','.join(RESPONSE_SHAPES)}")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Ruta del informe JSON (por defecto benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "ACTUAL"), help="Comparar dos informes y salir")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return compare(*args.compare)
+
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Escenarios desconocidos: {', '.join(sorted(unknown))}")
+
+    report = run(args)
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{report['meta']['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"Informe guardado en {output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
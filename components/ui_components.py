@@ -1,16 +1,125 @@
 """
 Componentes de interfaz de usuario para la aplicación
 """
+import json
+import textwrap
+import time
 import streamlit as st
-import plotly.express as px
 import plotly.graph_objects as go
-import pandas as pd
-from typing import Dict, List
-from config.settings import COLORS, SIDEBAR_INFO
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+from config.settings import (
+    COLORS,
+    SIDEBAR_INFO,
+    BATCH_UPLOAD_MAX_ROWS,
+    BATCH_UI_REFRESH_SECONDS,
+    METRICS_REFRESH_SECONDS,
+    HISTORY_PAGE_SIZE
+)
+from utils.result_store import LIST_COLUMNS, ResultStore
 
-def render_header():
-    """Renderizar el header de la aplicación"""
-    st.markdown("""
+# pandas y plotly.express se importan al usarse: solo los necesitan el
+# análisis por lotes y sus gráficos, no el arranque de la app
+if TYPE_CHECKING:
+    import pandas as pd
+
+def fragment(func):
+    """
+    Aislar una sección de la página en un fragmento de Streamlit
+    
+    Las interacciones con los widgets del fragmento solo re-ejecutan esa
+    función: el resto de la página (CSS, cabecera, resultados) no se vuelve
+    a pintar. Sin `st.fragment` (Streamlit < 1.37) se usa la función tal
+    cual y cada interacción re-ejecuta la página completa, como antes.
+    """
+    decorator = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+    return decorator(func) if decorator is not None else func
+
+# Estilos globales de la página
+_PAGE_CSS = """
+<style>
+    /* Estilos generales */
+    .main {
+        padding-top: 2rem;
+    }
+    
+    /* Ocultar elementos de Streamlit */
+    #MainMenu {visibility: hidden;}
+    footer {visibility: hidden;}
+    header {visibility: hidden;}
+    
+    /* Estilos para botones */
+    .stButton > button {
+        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+        color: white;
+        border: none;
+        border-radius: 25px;
+        padding: 0.75rem 2rem;
+        font-weight: 600;
+        transition: all 0.3s ease;
+        box-shadow: 0 4px 15px rgba(102, 126, 234, 0.3);
+    }
+    
+    .stButton > button:hover {
+        transform: translateY(-2px);
+        box-shadow: 0 6px 20px rgba(102, 126, 234, 0.4);
+    }
+    
+    /* Estilos para inputs */
+    .stTextArea > div > div > textarea {
+        border-radius: 10px;
+        border: 2px solid #e1e5e9;
+        transition: border-color 0.3s ease;
+    }
+    
+    .stTextArea > div > div > textarea:focus {
+        border-color: #667eea;
+        box-shadow: 0 0 0 3px rgba(102, 126, 234, 0.1);
+    }
+    
+    /* Estilos para selectbox */
+    .stSelectbox > div > div {
+        border-radius: 10px;
+    }
+    
+    /* Animación de carga */
+    .loading-spinner {
+        display: flex;
+        justify-content: center;
+        align-items: center;
+        height: 100px;
+    }
+    
+    .spinner {
+        width: 40px;
+        height: 40px;
+        border: 4px solid #f3f3f3;
+        border-top: 4px solid #667eea;
+        border-radius: 50%;
+        animation: spin 1s linear infinite;
+    }
+    
+    @keyframes spin {
+        0% { transform: rotate(0deg); }
+        100% { transform: rotate(360deg); }
+    }
+    
+    /* Estilos para métricas */
+    .metric-card {
+        background: white;
+        padding: 1.5rem;
+        border-radius: 15px;
+        box-shadow: 0 4px 20px rgba(0, 0, 0, 0.1);
+        border: 1px solid #e1e5e9;
+        transition: transform 0.3s ease;
+    }
+    
+    .metric-card:hover {
+        transform: translateY(-5px);
+    }
+</style>
+"""
+
+_HEADER_HTML = """
     <div style="text-align: center; padding: 2rem 0;">
         <h1 style="color: #1976D2; font-size: 3rem; margin-bottom: 0;">
             🎯 Analizador de Sentimientos
@@ -20,11 +129,9 @@ def render_header():
         </h2>
         <hr style="width: 50%; margin: 2rem auto; border: 2px solid #1976D2;">
     </div>
-    """, unsafe_allow_html=True)
+    """
 
-def render_description():
-    """Renderizar la descripción de la aplicación"""
-    st.markdown("""
+_DESCRIPTION_HTML = """
     <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
                 padding: 2rem; border-radius: 10px; color: white; margin: 2rem 0;">
         <h3 style="margin-top: 0; color: white;">🚀 Potencia tu Negocio con IA</h3>
@@ -34,7 +141,23 @@ def render_description():
             percepción del cliente que te ayudarán a <strong>mejorar tu estrategia comercial</strong>.
         </p>
     </div>
-    """, unsafe_allow_html=True)
+    """
+
+# CSS, cabecera y descripción en un único bloque HTML, construido al importar:
+# cada re-ejecución completa emite un solo elemento estático en lugar de tres
+_PAGE_CHROME_HTML = "\n".join(
+    textwrap.dedent(block).strip() for block in (_PAGE_CSS, _HEADER_HTML, _DESCRIPTION_HTML)
+)
+
+def render_page_chrome():
+    """
+    Renderizar los estilos, el header y la descripción de la aplicación
+    
+    Streamlit borra los elementos que una re-ejecución completa no vuelve a
+    emitir, así que el bloque estático se emite en cada una; las
+    interacciones dentro de fragmentos no re-ejecutan esta parte.
+    """
+    st.markdown(_PAGE_CHROME_HTML, unsafe_allow_html=True)
 
 def render_sidebar():
     """Renderizar la barra lateral con información"""
@@ -53,6 +176,7 @@ def render_sidebar():
             st.session_state.analysis_count = 0
         
         st.metric("Análisis Realizados", st.session_state.analysis_count)
+        render_metrics_panel()
         
         # Información del desarrollador
         st.markdown("---")
@@ -62,24 +186,88 @@ def render_sidebar():
         *Integración de IA en Aplicaciones Web*
         """)
 
+def _metrics_panel_body():
+    """Contenido del panel de métricas por proveedor"""
+    from utils.ai_analyzer import metrics_summary, parse_total
+    
+    summary = metrics_summary()
+    if not summary:
+        st.caption("Aún no hay llamadas a proveedores")
+        return
+    
+    for provider, data in sorted(summary.items()):
+        st.markdown(f"**{provider.capitalize()}**")
+        col1, col2 = st.columns(2)
+        col1.metric("Llamadas", data["llamadas"], delta=f"{data['errores']} errores", delta_color="inverse")
+        col2.metric("p50 / p95", f"{data['p50_s']:.2f}s / {data['p95_s']:.2f}s")
+        col1.metric("Tokens", f"{data['tokens']:,}")
+        col2.metric("Coste", f"${data['coste_usd']:.4f}")
+        lookups = data["cache_hits"] + data["cache_misses"]
+        if lookups:
+            st.caption(
+                f"Caché: {data['cache_hits'] / lookups:.0%} aciertos · "
+                f"Espera media en cola: {data['espera_media_s']:.2f}s"
+            )
+    
+    parsed = {dict(key)["outcome"]: value for key, value in parse_total.values().items()}
+    total_parsed = sum(parsed.values())
+    if total_parsed:
+        st.caption(f"Parsing: {(total_parsed - parsed.get('fallback', 0)) / total_parsed:.0%} JSON válido o reparado")
+
+def render_metrics_panel():
+    """
+    Renderizar el panel de métricas en vivo de las llamadas a proveedores
+    
+    Con `st.fragment` el panel se refresca solo cada
+    METRICS_REFRESH_SECONDS sin re-ejecutar el resto de la página.
+    """
+    st.markdown("#### ⏱️ Métricas de Proveedores")
+    if hasattr(st, "fragment"):
+        st.fragment(run_every=METRICS_REFRESH_SECONDS)(_metrics_panel_body)()
+    else:
+        _metrics_panel_body()
+
+def _select_example(ejemplo: str):
+    """Callback: recordar el ejemplo elegido"""
+    st.session_state.ejemplo_seleccionado = ejemplo
+
+def _use_selected_example():
+    """Callback: copiar el ejemplo elegido al área de texto"""
+    st.session_state.review_text = st.session_state.ejemplo_seleccionado
+
+@fragment
 def render_input_section():
-    """Renderizar la sección de entrada de datos"""
+    """
+    Renderizar la sección de entrada de datos
+    
+    Es un fragmento: escribir, elegir ejemplos o usar la pestaña de archivo
+    no re-ejecuta la página. El texto queda en `st.session_state.review_text`
+    y la etiqueta de producto en `st.session_state.product_tag`.
+    """
     st.markdown("### 📝 Ingresa la Reseña del Producto")
     
     # Crear tabs para diferentes formas de entrada
-    tab1, tab2 = st.tabs(["✍️ Escribir Reseña", "📋 Ejemplos"])
+    tab1, tab2, tab3 = st.tabs(["✍️ Escribir Reseña", "📋 Ejemplos", "📁 Archivo"])
     
     with tab1:
         review_text = st.text_area(
             "Escribe o pega aquí la reseña del producto que quieres analizar:",
             height=150,
             placeholder="Ejemplo: 'Este producto es increíble, la calidad es excelente y llegó muy rápido. Lo recomiendo 100%'",
-            help="Puedes incluir reseñas en español o inglés"
+            help="Puedes incluir reseñas en español o inglés",
+            key="review_text"
         )
         
         # Contador de caracteres
         char_count = len(review_text) if review_text else 0
         st.caption(f"Caracteres: {char_count}")
+        
+        st.text_input(
+            "Producto (opcional):",
+            placeholder="Ejemplo: auriculares-x200",
+            help="Etiqueta con la que se guarda el análisis en el historial",
+            key="product_tag"
+        )
     
     with tab2:
         st.markdown("#### 💡 Ejemplos de Reseñas")
@@ -91,9 +279,7 @@ def render_input_section():
         }
         
         for titulo, ejemplo in ejemplos.items():
-            if st.button(f"Usar: {titulo}", key=f"ejemplo_{titulo}"):
-                st.session_state.ejemplo_seleccionado = ejemplo
-                st.rerun()
+            st.button(f"Usar: {titulo}", key=f"ejemplo_{titulo}", on_click=_select_example, args=(ejemplo,))
         
         # Si hay un ejemplo seleccionado, mostrarlo
         if hasattr(st.session_state, 'ejemplo_seleccionado'):
@@ -103,29 +289,274 @@ def render_input_section():
                 height=100,
                 disabled=True
             )
-            if st.button("Usar este ejemplo"):
-                review_text = st.session_state.ejemplo_seleccionado
+            st.button("Usar este ejemplo", on_click=_use_selected_example)
+    
+    with tab3:
+        render_batch_section()
     
     return review_text
 
+def load_reviews_file(uploaded_file) -> "pd.DataFrame":
+    """Leer un archivo subido (CSV, XLSX o JSONL) como DataFrame"""
+    import pandas as pd
+    
+    name = uploaded_file.name.lower()
+    if name.endswith((".xlsx", ".xls")):
+        return pd.read_excel(uploaded_file)
+    if name.endswith((".jsonl", ".ndjson")):
+        return pd.read_json(uploaded_file, lines=True)
+    return pd.read_csv(uploaded_file)
+
+def render_batch_section():
+    """
+    Renderizar el análisis por lotes a partir de un archivo
+    
+    El lote se envía como trabajo en segundo plano (ver `utils.jobs`): la
+    página no se bloquea mientras se analiza y el trabajo sigue aunque se
+    recargue la pestaña.
+    """
+    st.markdown("#### 📁 Analizar un Archivo de Reseñas")
+    _render_batch_upload()
+    render_jobs_panel()
+
+def _render_batch_upload():
+    """Subir el archivo, elegir columna y proveedor, y enviar el trabajo"""
+    from utils.ai_analyzer import get_analyzer
+    
+    analyzer = get_analyzer()
+    uploaded_file = st.file_uploader(
+        "Sube un archivo CSV, XLSX o JSONL con una reseña por fila:",
+        type=["csv", "xlsx", "jsonl"],
+        key="batch_file"
+    )
+    
+    if uploaded_file is None:
+        st.caption(f"Máximo {BATCH_UPLOAD_MAX_ROWS} filas por archivo")
+        return
+    
+    try:
+        df = load_reviews_file(uploaded_file)
+    except Exception as e:
+        st.error(f"No se pudo leer el archivo: {e}")
+        return
+    
+    if df.empty:
+        st.warning("⚠️ El archivo no contiene filas.")
+        return
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        column = st.selectbox("Columna con la reseña:", options=list(df.columns), key="batch_column")
+    with col2:
+        provider = st.selectbox(
+            "Proveedor de IA:",
+            options=analyzer.get_available_providers() + ["Auto"],
+            key="batch_provider"
+        )
+    with col3:
+        product = st.text_input("Producto (opcional):", key="batch_product")
+    
+    reviews = df[column].fillna("").astype(str).tolist()
+    if len(reviews) > BATCH_UPLOAD_MAX_ROWS:
+        st.warning(f"⚠️ Se analizarán solo las primeras {BATCH_UPLOAD_MAX_ROWS} de {len(reviews)} filas.")
+        reviews = reviews[:BATCH_UPLOAD_MAX_ROWS]
+    st.caption(f"Reseñas a analizar: {len(reviews)}")
+    
+    if st.button("🚀 Analizar Archivo", key="batch_analyze"):
+        from utils.jobs import get_job_manager
+        
+        st.session_state.batch_job = get_job_manager().submit(reviews, provider.lower(), product or None)
+        # Re-ejecución completa para que el panel del trabajo empiece a consultar su estado
+        st.rerun()
+
+def _results_frame(store: ResultStore, include_lists: bool = True) -> "pd.DataFrame":
+    """Tabla de resultados del lote ordenada por fila"""
+    return store.to_pandas(include_lists=include_lists).sort_values("fila").reset_index(drop=True)
+
+def _results_csv(results_df: "pd.DataFrame") -> bytes:
+    """Exportar la tabla de resultados a CSV con las listas en JSON"""
+    csv_df = results_df.copy()
+    for column in LIST_COLUMNS:
+        csv_df[column] = csv_df[column].map(lambda values: json.dumps(values, ensure_ascii=False))
+    return csv_df.to_csv(index=False).encode("utf-8")
+
+def render_batch_charts(store: ResultStore):
+    """Renderizar la distribución de sentimientos y los aspectos más mencionados del lote"""
+    import plotly.express as px
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        counts = store.sentiment_counts()
+        fig = px.bar(
+            x=counts.index,
+            y=counts.values,
+            color=counts.index,
+            color_discrete_map={
+                "Positivo": COLORS['positive'],
+                "Negativo": COLORS['negative'],
+                "Neutral": COLORS['neutral']
+            },
+            labels={"x": "Sentimiento", "y": "Reseñas"},
+            title="Distribución de Sentimientos"
+        )
+        fig.update_layout(height=300, showlegend=False)
+        st.plotly_chart(fig, use_container_width=True)
+    
+    with col2:
+        negatives = store.term_counts("aspectos_negativos")
+        if negatives.empty:
+            st.info("No se identificaron aspectos negativos en el lote")
+        else:
+            fig = px.bar(
+                x=negatives.values[::-1],
+                y=negatives.index[::-1],
+                orientation="h",
+                labels={"x": "Menciones", "y": ""},
+                title="Aspectos Negativos Más Mencionados"
+            )
+            fig.update_traces(marker_color=COLORS['negative'])
+            fig.update_layout(height=300)
+            st.plotly_chart(fig, use_container_width=True)
+
+_JOB_STATUS_LABELS = {
+    "en_cola": "⏳ En cola",
+    "en_curso": "🔄 Analizando",
+    "completado": "✅ Completado",
+    "cancelado": "⏹️ Cancelado",
+    "fallido": "❌ Fallido",
+    "interrumpido": "⚠️ Interrumpido"
+}
+
+def _job_results(jobs, job: Dict) -> ResultStore:
+    """
+    Resultados de un trabajo guardados en la sesión
+    
+    En cada consulta solo se leen los resultados que llegaron desde la
+    anterior, así que el coste no crece con el tamaño del lote.
+    """
+    cached = st.session_state.get("batch_job_results")
+    if cached is None or cached[0] != job["id"]:
+        cached = (job["id"], ResultStore(capacity=max(1, job["total"])))
+        st.session_state.batch_job_results = cached
+    store = cached[1]
+    for item in jobs.items(job["id"], offset=len(store)):
+        store.append_item(item)
+    return store
+
+def _jobs_panel_body():
+    """Estado, controles y resultados del trabajo elegido"""
+    from utils.jobs import ACTIVE_STATUSES, RESUMABLE_STATUSES, get_job_manager
+    
+    jobs = get_job_manager()
+    recent = jobs.list_jobs(limit=10)
+    if not recent:
+        return
+    
+    labels = {
+        job["id"]: f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(job['creado']))} · "
+                   f"{job['total']} reseñas · {job['proveedor']}"
+        for job in recent
+    }
+    if st.session_state.get("batch_job") not in labels:
+        st.session_state.batch_job = recent[0]["id"]
+    job_id = st.selectbox("Trabajo:", options=list(labels), format_func=labels.get, key="batch_job")
+    job = next(job for job in recent if job["id"] == job_id)
+    store = _job_results(jobs, job)
+    active = job["estado"] in ACTIVE_STATUSES
+    
+    st.progress(
+        job["completadas"] / job["total"] if job["total"] else 1.0,
+        text=f"{_JOB_STATUS_LABELS.get(job['estado'], job['estado'])}: {job['completadas']} de {job['total']} "
+             f"reseñas ({job['errores']} errores, {job['duplicadas']} casi duplicadas)"
+    )
+    if job["mensaje"]:
+        st.error(f"❌ {job['mensaje']}")
+    
+    if active:
+        st.button("⏹️ Cancelar", key="batch_job_cancel", on_click=jobs.cancel, args=(job_id,))
+    elif job["estado"] in RESUMABLE_STATUSES:
+        if st.button("▶️ Reanudar", key="batch_job_resume", help="Analiza solo las reseñas que faltan"):
+            jobs.resume(job_id)
+            st.rerun()
+    
+    if len(store):
+        if active:
+            st.dataframe(_results_frame(store, include_lists=False), use_container_width=True, hide_index=True)
+        else:
+            render_batch_charts(store)
+            results_df = _results_frame(store)
+            st.dataframe(results_df, use_container_width=True, hide_index=True)
+            st.download_button(
+                "⬇️ Descargar resultados (CSV)",
+                data=_results_csv(results_df),
+                file_name="resultados_sentimiento.csv",
+                mime="text/csv",
+                key="batch_download"
+            )
+    
+    # Al terminar, una re-ejecución completa deja de consultar el estado periódicamente
+    if st.session_state.get("batch_job_polling") and not active:
+        st.session_state.analysis_count += job["completadas"] - job["errores"]
+        st.rerun()
+
+def render_jobs_panel():
+    """
+    Renderizar el panel de trabajos por lotes
+    
+    Mientras haya un trabajo activo, el panel es un fragmento que se
+    re-ejecuta solo cada BATCH_UI_REFRESH_SECONDS para mostrar el progreso
+    y los resultados parciales sin re-ejecutar el resto de la página.
+    """
+    from utils.jobs import ACTIVE_STATUSES, get_job_manager
+    
+    job_id = st.session_state.get("batch_job")
+    job = get_job_manager().get(job_id) if job_id else None
+    polling = job is not None and job["estado"] in ACTIVE_STATUSES
+    st.session_state.batch_job_polling = polling
+    if polling and hasattr(st, "fragment"):
+        st.fragment(run_every=BATCH_UI_REFRESH_SECONDS)(_jobs_panel_body)()
+    else:
+        _jobs_panel_body()
+
+@fragment
 def render_provider_selection():
-    """Renderizar la selección de proveedor de IA"""
+    """
+    Renderizar la selección de proveedor de IA entre los registrados y configurados
+    
+    Es un fragmento: cambiar de proveedor solo repinta esta sección. El
+    proveedor elegido queda en `st.session_state.provider`.
+    """
+    from utils.ai_analyzer import get_analyzer, providers
+    
+    analyzer = get_analyzer()
+    
     st.markdown("### 🤖 Selecciona el Proveedor de IA")
     
     col1, col2 = st.columns(2)
     
+    provider_info = {
+        spec.label: (spec.description or spec.label, spec.model)
+        for spec in providers.values()
+        if spec.label in analyzer.get_available_providers()
+    }
+    provider_info["Auto"] = ("🔀 Automático", "Usa el proveedor más rápido y sano, con respaldo si se demora")
+    
     with col1:
         provider = st.selectbox(
             "Elige el modelo de IA:",
-            options=["OpenAI", "Groq"],
-            help="OpenAI GPT-3.5: Más preciso | Groq: Más rápido"
+            options=list(provider_info),
+            help=" | ".join(titulo for titulo, _ in provider_info.values()),
+            key="provider"
         )
     
+    titulo, descripcion = provider_info[provider]
+    
     with col2:
         st.info(f"""
-        **{'🎯 OpenAI GPT-3.5' if provider == 'OpenAI' else '⚡ Groq Llama-3'}**
+        **{titulo}**
         
-        {'Análisis más detallado y preciso' if provider == 'OpenAI' else 'Procesamiento ultra-rápido'}
+        {descripcion}
         """)
     
     return provider.lower()
@@ -137,7 +568,17 @@ def render_analysis_results(analysis_result: Dict):
     
     st.markdown("## 📊 Resultados del Análisis")
     
-    # Métricas principales
+    _render_metric_cards(analysis_result)
+    
+    # Gráfico de puntuación
+    render_score_chart(analysis_result.get('puntuacion', 0))
+    
+    _render_aspects(analysis_result)
+    _render_recommendations(analysis_result)
+    _render_summary(analysis_result)
+
+def _render_metric_cards(analysis_result: Dict):
+    """Renderizar las tarjetas de sentimiento, puntuación y confianza"""
     col1, col2, col3 = st.columns(3)
     
     sentimiento = analysis_result.get('sentimiento_general', 'No disponible')
@@ -189,10 +630,11 @@ def render_analysis_results(analysis_result: Dict):
         </div>
         """, unsafe_allow_html=True)
     
-    # Gráfico de puntuación
-    render_score_chart(puntuacion)
-    
-    # Aspectos detallados
+    if analysis_result.get('proveedor'):
+        st.caption(f"Respondido por: {analysis_result['proveedor']}")
+
+def _render_aspects(analysis_result: Dict):
+    """Renderizar los aspectos positivos y negativos"""
     col1, col2 = st.columns(2)
     
     with col1:
@@ -212,8 +654,9 @@ def render_analysis_results(analysis_result: Dict):
                 st.markdown(f"• {aspecto}")
         else:
             st.info("No se identificaron aspectos negativos específicos")
-    
-    # Recomendaciones
+
+def _render_recommendations(analysis_result: Dict):
+    """Renderizar las recomendaciones"""
     st.markdown("### 💡 Recomendaciones")
     recomendaciones = analysis_result.get('recomendaciones', [])
     if recomendaciones:
@@ -221,8 +664,9 @@ def render_analysis_results(analysis_result: Dict):
             st.markdown(f"**{i}.** {recomendacion}")
     else:
         st.info("No hay recomendaciones específicas disponibles")
-    
-    # Resumen ejecutivo
+
+def _render_summary(analysis_result: Dict):
+    """Renderizar el resumen ejecutivo"""
     st.markdown("### 📋 Resumen Ejecutivo")
     resumen = analysis_result.get('resumen', 'No disponible')
     st.markdown(f"""
@@ -231,11 +675,82 @@ def render_analysis_results(analysis_result: Dict):
     </div>
     """, unsafe_allow_html=True)
 
-def render_score_chart(score: int):
-    """Renderizar gráfico de puntuación"""
-    st.markdown("### 📈 Visualización de Puntuación")
+# Secciones de resultados y campos que necesita cada una para mostrarse
+_STREAM_SECTIONS = [
+    ("metricas", ("sentimiento_general", "puntuacion", "proveedor")),
+    ("grafico", ("puntuacion",)),
+    ("aspectos", ("aspectos_positivos", "aspectos_negativos")),
+    ("recomendaciones", ("recomendaciones",)),
+    ("resumen", ("resumen",)),
+]
+
+def _stream_section_ready(result: Dict, fields: tuple) -> bool:
+    """Comprobar que un resultado parcial trae los campos de una sección con un tipo usable"""
+    for field in fields:
+        value = result.get(field)
+        if field == "proveedor":
+            continue
+        if field == "puntuacion":
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                return False
+        elif field == "sentimiento_general" or field == "resumen":
+            if not isinstance(value, str):
+                return False
+        elif not isinstance(value, list):
+            return False
+    return True
+
+def render_analysis_stream(result_stream: Iterable[Dict]) -> Dict:
+    """
+    Renderizar los resultados a medida que llegan del analizador en streaming
+    
+    Cada sección se pinta en cuanto el modelo emite sus campos y se
+    repinta con el resultado final validado.
+    
+    Args:
+        result_stream (Iterable[Dict]): Resultados parciales y final de
+            `analyze_sentiment_stream`
+        
+    Returns:
+        Dict: Resultado final
+    """
+    st.markdown("## 📊 Resultados del Análisis")
+    placeholders = {name: st.empty() for name, _ in _STREAM_SECTIONS}
+    renderers = {
+        "metricas": _render_metric_cards,
+        # Clave distinta en cada repintado para no duplicar el id del gráfico
+        "grafico": lambda result: render_score_chart(
+            int(result['puntuacion']), key=f"stream_gauge_{rendered['grafico']}"
+        ),
+        "aspectos": _render_aspects,
+        "recomendaciones": _render_recommendations,
+        "resumen": _render_summary,
+    }
+    rendered = {}
+    
+    result = {}
+    for result in result_stream:
+        final = not result.get("parcial")
+        for name, fields in _STREAM_SECTIONS:
+            if not final and not _stream_section_ready(result, fields):
+                continue
+            signature = repr([result.get(field) for field in fields])
+            if rendered.get(name) == signature:
+                continue
+            rendered[name] = signature
+            with placeholders[name].container():
+                renderers[name](result)
+    return result
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _score_figure(score: int) -> go.Figure:
+    """
+    Gráfico de gauge para una puntuación
     
-    # Crear gráfico de gauge
+    La puntuación es un entero de 1 a 10, así que hay pocas figuras
+    distintas: se construyen una vez por proceso y se reutilizan en todas
+    las sesiones (no se modifican después de crearlas).
+    """
     fig = go.Figure(go.Indicator(
         mode="gauge+number",
         value=score,
@@ -258,7 +773,218 @@ def render_score_chart(score: int):
     ))
     
     fig.update_layout(height=300)
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
+
+def render_score_chart(score: int, key: Optional[str] = None):
+    """Renderizar gráfico de puntuación"""
+    st.markdown("### 📈 Visualización de Puntuación")
+    st.plotly_chart(_score_figure(int(score)), use_container_width=True, key=key)
+
+def _history_filters(history) -> Dict:
+    """Filtros del historial elegidos en la interfaz"""
+    periods = {"Todo": None, "Hoy": 1, "Últimos 7 días": 7, "Últimos 30 días": 30}
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        sentiment = st.selectbox("Sentimiento:", ["Todos", "Positivo", "Negativo", "Neutral"], key="history_sentiment")
+    with col2:
+        product = st.selectbox("Producto:", ["Todos"] + history.products(), key="history_product")
+    with col3:
+        period = st.selectbox("Periodo:", list(periods), key="history_period")
+    
+    days = periods[period]
+    since = None
+    if days is not None:
+        from utils.history import DAY_SECONDS
+        # Días completos: el informe se calcula sobre el resumen diario
+        since = (time.time() // DAY_SECONDS - (days - 1)) * DAY_SECONDS
+    return {
+        "sentiment": None if sentiment == "Todos" else sentiment,
+        "product": None if product == "Todos" else product,
+        "since": since
+    }
+
+def _show_history_record(record: Dict):
+    """Callback: mostrar un análisis del historial como resultado actual"""
+    st.session_state.analysis_result = record["resultado"]
+    st.session_state.last_review = record["resena"]
+
+def _change_page(prefix: str, delta: int):
+    """Callback: avanzar o retroceder una página de una lista paginada"""
+    st.session_state[f"{prefix}_page"] = st.session_state.get(f"{prefix}_page", 0) + delta
+
+def _current_page(prefix: str, filters: Dict, total: int) -> tuple:
+    """
+    Página actual de una lista paginada, que vuelve a la primera si cambian los filtros
+    
+    Returns:
+        tuple: (página actual desde 0, número de páginas)
+    """
+    if st.session_state.get(f"{prefix}_filters") != filters:
+        st.session_state[f"{prefix}_filters"] = filters
+        st.session_state[f"{prefix}_page"] = 0
+    pages = max(1, -(-total // HISTORY_PAGE_SIZE))
+    return max(0, min(st.session_state.get(f"{prefix}_page", 0), pages - 1)), pages
+
+def _render_pager(prefix: str, page: int, pages: int):
+    """Renderizar los botones de página anterior y siguiente"""
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        st.button("⬅️ Anterior", key=f"{prefix}_prev", disabled=page == 0, on_click=_change_page, args=(prefix, -1))
+    with col2:
+        st.caption(f"Página {page + 1} de {pages}")
+    with col3:
+        st.button(
+            "Siguiente ➡️",
+            key=f"{prefix}_next",
+            disabled=page >= pages - 1,
+            on_click=_change_page,
+            args=(prefix, 1)
+        )
+
+def _render_history_record(record: Dict, prefix: str, detail: Optional[str] = None):
+    """
+    Renderizar un análisis guardado con un botón para verlo completo
+    
+    Args:
+        record (Dict): Registro de `HistoryStore`
+        prefix (str): Prefijo de la clave del botón
+        detail (Optional[str]): Texto bajo la cabecera; por defecto el inicio de la reseña
+    """
+    col1, col2 = st.columns([6, 1])
+    with col1:
+        created = time.strftime("%Y-%m-%d %H:%M", time.localtime(record["creado"]))
+        tags = " · ".join(str(value) for value in (record["producto"], record["proveedor"]) if value)
+        st.markdown(
+            f"**{record['sentimiento'] or '—'}** ({record['puntuacion'] if record['puntuacion'] is not None else '—'}/10)"
+            f" · {created}{f' · {tags}' if tags else ''}"
+        )
+        if detail is None:
+            review = record["resena"]
+            st.caption(review if len(review) <= 200 else f"{review[:200]}…")
+        else:
+            st.markdown(detail)
+    with col2:
+        if st.button("Ver", key=f"{prefix}_show_{record['id']}", on_click=_show_history_record, args=(record,)):
+            st.rerun()
+
+def _export_history(history, filters: Dict):
+    """Callback: exportar el historial filtrado a Parquet para descargarlo"""
+    import os
+    import tempfile
+    
+    handle, path = tempfile.mkstemp(suffix=".parquet")
+    os.close(handle)
+    try:
+        history.export_parquet(path, **filters)
+        with open(path, "rb") as file:
+            st.session_state.history_export = file.read()
+    except ImportError as e:
+        st.session_state.history_export = None
+        st.session_state.history_export_error = str(e)
+    finally:
+        os.remove(path)
+
+@fragment
+def render_history_section():
+    """
+    Renderizar el historial de análisis guardados
+    
+    Es un fragmento: filtrar y paginar solo re-ejecuta esta sección. Al
+    elegir "Ver" en un análisis se re-ejecuta la página para mostrarlo.
+    """
+    from utils.ai_analyzer import get_analyzer
+    
+    st.markdown("### 🗂️ Historial de Análisis")
+    history = get_analyzer().history
+    if history is None:
+        st.caption("El historial está deshabilitado (HISTORY_ENABLED=false)")
+        return
+    
+    filters = _history_filters(history)
+    report = history.report(**filters)
+    if not report["total"]:
+        st.info("No hay análisis guardados con estos filtros")
+        return
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Análisis", f"{report['total']:,}")
+    if report["puntuacion_media"] is not None:
+        col2.metric("Puntuación media", f"{report['puntuacion_media']:.1f}/10")
+    if report["latencia_media"] is not None:
+        col3.metric("Latencia media", f"{report['latencia_media']:.2f}s")
+    col4.metric("Tokens", f"{report['tokens_prompt'] + report['tokens_completion']:,}")
+    
+    page, pages = _current_page("history", filters, report["total"])
+    for record in history.query(limit=HISTORY_PAGE_SIZE, offset=page * HISTORY_PAGE_SIZE, **filters):
+        _render_history_record(record, "history")
+    _render_pager("history", page, pages)
+    
+    st.button("📦 Exportar a Parquet", key="history_export_button", on_click=_export_history, args=(history, filters))
+    if st.session_state.pop("history_export_error", None):
+        st.warning("⚠️ La exportación a Parquet requiere pyarrow: pip install pyarrow")
+    if st.session_state.get("history_export"):
+        st.download_button(
+            "⬇️ Descargar historial (Parquet)",
+            data=st.session_state.history_export,
+            file_name="historial_sentimiento.parquet",
+            mime="application/octet-stream",
+            key="history_download"
+        )
+
+@fragment
+def render_search_section():
+    """
+    Renderizar la búsqueda de texto completo sobre el historial
+    
+    Busca en la reseña, los aspectos y el resumen de cada análisis y
+    muestra los resultados ordenados por relevancia, con las coincidencias
+    resaltadas. Es un fragmento: buscar y paginar solo re-ejecuta esta sección.
+    """
+    from utils.ai_analyzer import get_analyzer
+    from utils.history import SEARCH_FIELDS
+    
+    st.markdown("### 🔍 Buscar en el Historial")
+    history = get_analyzer().history
+    if history is None or not history.search_enabled:
+        st.caption("La búsqueda requiere el historial activado y un SQLite con FTS5")
+        return
+    
+    field_labels = {
+        "resena": "Reseña",
+        "aspectos_positivos": "Aspectos positivos",
+        "aspectos_negativos": "Aspectos negativos",
+        "resumen": "Resumen"
+    }
+    col1, col2, col3 = st.columns([3, 2, 1])
+    with col1:
+        text = st.text_input("Palabras:", placeholder="Ejemplo: envío", key="search_text")
+    with col2:
+        fields = st.multiselect(
+            "Buscar en:",
+            options=list(SEARCH_FIELDS),
+            format_func=field_labels.get,
+            placeholder="Todos los campos",
+            key="search_fields"
+        )
+    with col3:
+        sentiment = st.selectbox("Sentimiento:", ["Todos", "Positivo", "Negativo", "Neutral"], key="search_sentiment")
+    
+    if not text.strip():
+        st.caption("Escribe una o varias palabras: se buscan análisis que las contengan todas")
+        return
+    
+    filters = {"sentiment": None if sentiment == "Todos" else sentiment}
+    total = history.search_count(text, fields, **filters)
+    if not total:
+        st.info("No hay análisis que coincidan con la búsqueda")
+        return
+    
+    st.caption(f"{total:,} análisis encontrados")
+    page, pages = _current_page("search", {"text": text, "fields": fields, **filters}, total)
+    for record in history.search(text, fields, limit=HISTORY_PAGE_SIZE, offset=page * HISTORY_PAGE_SIZE, **filters):
+        _render_history_record(record, "search", record["fragmento"])
+    _render_pager("search", page, pages)
 
 def render_footer():
     """Renderizar el footer de la aplicación"""
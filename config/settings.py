@@ -2,27 +2,38 @@
 Configuraciones de la aplicación
 """
 import os
+import sys
 from dotenv import load_dotenv
 
-# Importar streamlit para secrets (producción)
-try:
-    import streamlit as st
-    STREAMLIT_AVAILABLE = True
-except ImportError:
-    STREAMLIT_AVAILABLE = False
-
 # Cargar variables de entorno
 load_dotenv()
 
 # Configuraciones de API (compatibilidad desarrollo/producción)
-if STREAMLIT_AVAILABLE and hasattr(st, 'secrets'):
-    # Producción (Streamlit Cloud)
-    OPENAI_API_KEY = st.secrets.get("OPENAI_API_KEY")
-    GROQ_API_KEY = st.secrets.get("GROQ_API_KEY")
-else:
-    # Desarrollo local
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-    GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+def _get_secret(name: str):
+    """
+    Leer una clave del entorno o, si no está, de los secrets de Streamlit
+    
+    El entorno va primero porque leer `st.secrets` la primera vez instala
+    vigilantes de archivos y cuesta cientos de ms en el arranque (Streamlit
+    Cloud ya expone los secrets como variables de entorno). Los secrets solo
+    se consultan si Streamlit ya está cargado: la CLI y los benchmarks no
+    pagan el coste de importarlo.
+    """
+    value = os.getenv(name)
+    if value:
+        return value
+    st = sys.modules.get("streamlit")
+    if st is not None and hasattr(st, 'secrets'):
+        try:
+            # Producción (Streamlit Cloud)
+            return st.secrets.get(name)
+        except Exception:
+            # Sin secrets.toml (desarrollo local)
+            pass
+    return None
+
+OPENAI_API_KEY = _get_secret("OPENAI_API_KEY")
+GROQ_API_KEY = _get_secret("GROQ_API_KEY")
 
 # Configuraciones de la aplicación
 APP_TITLE = "🎯 Analizador de Sentimientos - Reseñas de Productos"
@@ -34,6 +45,128 @@ proporcionando insights valiosos sobre la percepción del cliente.
 # Configuraciones de modelos
 OPENAI_MODEL = "gpt-3.5-turbo"
 GROQ_MODEL = "llama3-8b-8192"
+# Servidor de inferencia local compatible con OpenAI (llama.cpp, vLLM...);
+# sin URL el proveedor "local" no se ofrece
+LOCAL_LLM_BASE_URL = os.getenv("LOCAL_LLM_BASE_URL", "")
+LOCAL_LLM_MODEL = os.getenv("LOCAL_LLM_MODEL", "local-model")
+LOCAL_LLM_API_KEY = _get_secret("LOCAL_LLM_API_KEY") if LOCAL_LLM_BASE_URL else None
+LOCAL_LLM_JSON_MODE = os.getenv("LOCAL_LLM_JSON_MODE", "true").lower() in ("1", "true", "yes")
+MODEL_TEMPERATURE = 0.3
+MODEL_MAX_TOKENS = 1000
+# Pedir al proveedor salida JSON estructurada (response_format=json_object)
+STRUCTURED_OUTPUT_ENABLED = os.getenv("STRUCTURED_OUTPUT_ENABLED", "true").lower() in ("1", "true", "yes")
+# Mostrar los resultados a medida que el modelo los genera
+STREAMING_ENABLED = os.getenv("STREAMING_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Límites de cuota por proveedor en el cliente (0 = sin límite); se ajustan
+# solos con las cabeceras x-ratelimit-* que devuelve cada API
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", "500"))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", "200000"))
+GROQ_RPM = int(os.getenv("GROQ_RPM", "30"))
+GROQ_TPM = int(os.getenv("GROQ_TPM", "30000"))
+LOCAL_LLM_RPM = int(os.getenv("LOCAL_LLM_RPM", "0"))
+LOCAL_LLM_TPM = int(os.getenv("LOCAL_LLM_TPM", "0"))
+
+# Pool HTTP compartido por todas las sesiones: conexiones keep-alive
+# reutilizadas (sin repetir el handshake TLS) y un tope de conexiones abiertas
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+# HTTP/2 requiere el paquete h2 (pip install "httpx[http2]")
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() in ("1", "true", "yes")
+# Timeouts por proveedor en segundos (conexión y lectura)
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_READ_TIMEOUT = float(os.getenv("OPENAI_READ_TIMEOUT", "60"))
+GROQ_CONNECT_TIMEOUT = float(os.getenv("GROQ_CONNECT_TIMEOUT", "5"))
+GROQ_READ_TIMEOUT = float(os.getenv("GROQ_READ_TIMEOUT", "30"))
+LOCAL_LLM_CONNECT_TIMEOUT = float(os.getenv("LOCAL_LLM_CONNECT_TIMEOUT", "2"))
+LOCAL_LLM_READ_TIMEOUT = float(os.getenv("LOCAL_LLM_READ_TIMEOUT", "120"))
+
+# Reintentos y circuit breaker por proveedor
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "8"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RECOVERY_SECONDS = float(os.getenv("BREAKER_RECOVERY_SECONDS", "30"))
+BREAKER_HALF_OPEN_MAX_CALLS = int(os.getenv("BREAKER_HALF_OPEN_MAX_CALLS", "1"))
+
+# Pre-clasificador local por léxico: resuelve sin IA las reseñas claramente
+# polarizadas cuando su confianza supera el umbral
+LEXICON_ENABLED = os.getenv("LEXICON_ENABLED", "true").lower() in ("1", "true", "yes")
+LEXICON_CONFIDENCE_THRESHOLD = float(os.getenv("LEXICON_CONFIDENCE_THRESHOLD", "0.85"))
+
+# Deduplicación de lotes: las reseñas casi idénticas (similitud de Jaccard
+# estimada por MinHash por encima del umbral) se analizan una sola vez
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() in ("1", "true", "yes")
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
+DEDUP_NUM_PERM = int(os.getenv("DEDUP_NUM_PERM", "64"))
+DEDUP_SHINGLE_SIZE = int(os.getenv("DEDUP_SHINGLE_SIZE", "5"))
+
+# Configuraciones de procesamiento por lotes
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+ASYNC_MAX_CONCURRENCY = int(os.getenv("ASYNC_MAX_CONCURRENCY", "100"))
+BATCH_UPLOAD_MAX_ROWS = int(os.getenv("BATCH_UPLOAD_MAX_ROWS", "5000"))
+BATCH_UI_REFRESH_SECONDS = float(os.getenv("BATCH_UI_REFRESH_SECONDS", "1"))
+
+# Trabajos en segundo plano: los lotes de la interfaz se ejecutan en un pool
+# propio, con su estado y sus resultados parciales guardados en SQLite
+JOBS_PATH = os.getenv("JOBS_PATH", ".cache/jobs.sqlite3")
+JOBS_MAX_CONCURRENT = int(os.getenv("JOBS_MAX_CONCURRENT", "2"))
+JOBS_FLUSH_SECONDS = float(os.getenv("JOBS_FLUSH_SECONDS", "0.5"))
+
+# Configuraciones del modo empaquetado (varias reseñas por petición)
+PACK_TOKEN_BUDGET = int(os.getenv("PACK_TOKEN_BUDGET", "6000"))
+PACK_MAX_REVIEWS = int(os.getenv("PACK_MAX_REVIEWS", "20"))
+PACK_OUTPUT_TOKENS_PER_REVIEW = int(os.getenv("PACK_OUTPUT_TOKENS_PER_REVIEW", "250"))
+PACK_MAX_ATTEMPTS = int(os.getenv("PACK_MAX_ATTEMPTS", "2"))
+
+# Configuraciones de reseñas largas (map-reduce por fragmentos)
+LONG_REVIEW_TOKEN_LIMIT = int(os.getenv("LONG_REVIEW_TOKEN_LIMIT", "3000"))
+LONG_REVIEW_CHUNK_TOKENS = int(os.getenv("LONG_REVIEW_CHUNK_TOKENS", "1500"))
+LONG_REVIEW_MAX_CHUNKS = int(os.getenv("LONG_REVIEW_MAX_CHUNKS", "8"))
+LONG_REVIEW_CHUNK_OUTPUT_TOKENS = int(os.getenv("LONG_REVIEW_CHUNK_OUTPUT_TOKENS", "500"))
+LONG_REVIEW_SUMMARY_TOKENS = int(os.getenv("LONG_REVIEW_SUMMARY_TOKENS", "300"))
+
+# Configuraciones del enrutado automático entre proveedores ("auto")
+ROUTER_WINDOW_SIZE = int(os.getenv("ROUTER_WINDOW_SIZE", "200"))
+ROUTER_MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", "5"))
+ROUTER_MAX_ERROR_RATE = float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.5"))
+# Antigüedad máxima de las muestras: tras una caída el proveedor vuelve a
+# recibir tráfico pasado este tiempo (0 para no caducarlas)
+ROUTER_MAX_SAMPLE_AGE_SECONDS = float(os.getenv("ROUTER_MAX_SAMPLE_AGE_SECONDS", "300"))
+ROUTER_HEDGE_ENABLED = os.getenv("ROUTER_HEDGE_ENABLED", "true").lower() in ("1", "true", "yes")
+ROUTER_HEDGE_PERCENTILE = float(os.getenv("ROUTER_HEDGE_PERCENTILE", "95"))
+ROUTER_DEFAULT_HEDGE_SECONDS = float(os.getenv("ROUTER_DEFAULT_HEDGE_SECONDS", "5"))
+
+# Precios estimados por 1K tokens en USD (entrada, salida) para el coste de las métricas
+OPENAI_PRICE_INPUT_PER_1K = float(os.getenv("OPENAI_PRICE_INPUT_PER_1K", "0.0005"))
+OPENAI_PRICE_OUTPUT_PER_1K = float(os.getenv("OPENAI_PRICE_OUTPUT_PER_1K", "0.0015"))
+GROQ_PRICE_INPUT_PER_1K = float(os.getenv("GROQ_PRICE_INPUT_PER_1K", "0.00005"))
+GROQ_PRICE_OUTPUT_PER_1K = float(os.getenv("GROQ_PRICE_OUTPUT_PER_1K", "0.00008"))
+
+# Configuraciones de métricas (puerto 0 = sin endpoint /metrics)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_REFRESH_SECONDS = float(os.getenv("METRICS_REFRESH_SECONDS", "5"))
+
+# Configuraciones de caché de respuestas
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_PATH = os.getenv("CACHE_PATH", ".cache/sentiment_cache.sqlite3")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Servicio HTTP sobre el analizador (python -m utils.api); sin cupo libre
+# las peticiones se rechazan con 429 en lugar de encolarse
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+API_DEFAULT_PROVIDER = os.getenv("API_DEFAULT_PROVIDER", "auto")
+API_MAX_CONCURRENT_REQUESTS = int(os.getenv("API_MAX_CONCURRENT_REQUESTS", "64"))
+API_REQUEST_TIMEOUT_SECONDS = float(os.getenv("API_REQUEST_TIMEOUT_SECONDS", "30"))
+API_BATCH_MAX_REVIEWS = int(os.getenv("API_BATCH_MAX_REVIEWS", "1000"))
+
+# Historial persistente de análisis (SQLite en modo WAL)
+HISTORY_ENABLED = os.getenv("HISTORY_ENABLED", "true").lower() in ("1", "true", "yes")
+HISTORY_PATH = os.getenv("HISTORY_PATH", ".cache/analysis_history.sqlite3")
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "20"))
 
 # Prompt principal para análisis de sentimientos
 SENTIMENT_ANALYSIS_PROMPT = """
@@ -61,6 +194,51 @@ Formato de respuesta en JSON:
 Reseña a analizar:
 """
 
+# Prompt para analizar varias reseñas en una sola petición
+PACKED_SENTIMENT_ANALYSIS_PROMPT = """
+Eres un experto analista de sentimientos especializado en reseñas de productos.
+
+Analiza CADA una de las siguientes reseñas de forma independiente. Cada reseña
+va precedida de su identificador entre corchetes, por ejemplo [3].
+
+Para cada reseña proporciona:
+
+1. **Sentimiento General**: Positivo, Negativo o Neutral
+2. **Puntuación de Sentimiento**: Del 1 al 10 (1=muy negativo, 10=muy positivo)
+3. **Aspectos Positivos**: Lista los aspectos que destacan positivamente
+4. **Aspectos Negativos**: Lista los aspectos que se mencionan negativamente
+5. **Recomendaciones**: Sugerencias para el vendedor basadas en el análisis
+6. **Resumen**: Resumen ejecutivo del análisis
+
+Responde ÚNICAMENTE con un array JSON, con un objeto por reseña y su "id":
+[
+    {
+        "id": number,
+        "sentimiento_general": "string",
+        "puntuacion": number,
+        "aspectos_positivos": ["string"],
+        "aspectos_negativos": ["string"],
+        "recomendaciones": ["string"],
+        "resumen": "string"
+    }
+]
+
+Reseñas a analizar:
+"""
+
+# Prompt para unificar los resúmenes de los fragmentos de una reseña larga
+LONG_REVIEW_SUMMARY_PROMPT = """
+Eres un experto analista de sentimientos especializado en reseñas de productos.
+
+Los siguientes resúmenes corresponden a fragmentos consecutivos de una misma
+reseña extensa. Escribe un único resumen ejecutivo de la reseña completa, en
+un párrafo breve, sin mencionar que estaba dividida en fragmentos.
+
+Responde únicamente con el texto del resumen.
+
+Resúmenes de los fragmentos:
+"""
+
 # Configuraciones de UI
 SIDEBAR_INFO = {
     "title": "ℹ️ Cómo Funciona",
@@ -1,125 +1,1074 @@
 """
 Módulo de análisis de sentimientos con IA
 """
+import asyncio
+import contextvars
+import hashlib
+import inspect
 import json
 import logging
-from typing import Dict, Optional, Union
-import openai
-from groq import Groq
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from config.settings import (
     OPENAI_API_KEY, 
     GROQ_API_KEY, 
     OPENAI_MODEL, 
     GROQ_MODEL,
-    SENTIMENT_ANALYSIS_PROMPT
+    LOCAL_LLM_BASE_URL,
+    LOCAL_LLM_MODEL,
+    LOCAL_LLM_API_KEY,
+    LOCAL_LLM_JSON_MODE,
+    LOCAL_LLM_RPM,
+    LOCAL_LLM_TPM,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP2_ENABLED,
+    OPENAI_CONNECT_TIMEOUT,
+    OPENAI_READ_TIMEOUT,
+    GROQ_CONNECT_TIMEOUT,
+    GROQ_READ_TIMEOUT,
+    LOCAL_LLM_CONNECT_TIMEOUT,
+    LOCAL_LLM_READ_TIMEOUT,
+    MODEL_TEMPERATURE,
+    MODEL_MAX_TOKENS,
+    STRUCTURED_OUTPUT_ENABLED,
+    SENTIMENT_ANALYSIS_PROMPT,
+    PACKED_SENTIMENT_ANALYSIS_PROMPT,
+    BATCH_MAX_CONCURRENCY,
+    PACK_TOKEN_BUDGET,
+    PACK_MAX_REVIEWS,
+    PACK_OUTPUT_TOKENS_PER_REVIEW,
+    PACK_MAX_ATTEMPTS,
+    LONG_REVIEW_TOKEN_LIMIT,
+    LONG_REVIEW_CHUNK_TOKENS,
+    LONG_REVIEW_MAX_CHUNKS,
+    LONG_REVIEW_CHUNK_OUTPUT_TOKENS,
+    LONG_REVIEW_SUMMARY_TOKENS,
+    LONG_REVIEW_SUMMARY_PROMPT,
+    ASYNC_MAX_CONCURRENCY,
+    CACHE_ENABLED,
+    CACHE_PATH,
+    CACHE_MAX_ENTRIES,
+    CACHE_TTL_SECONDS,
+    HISTORY_ENABLED,
+    HISTORY_PATH,
+    ROUTER_WINDOW_SIZE,
+    ROUTER_MIN_SAMPLES,
+    ROUTER_MAX_ERROR_RATE,
+    ROUTER_MAX_SAMPLE_AGE_SECONDS,
+    ROUTER_HEDGE_ENABLED,
+    ROUTER_HEDGE_PERCENTILE,
+    ROUTER_DEFAULT_HEDGE_SECONDS,
+    OPENAI_RPM,
+    OPENAI_TPM,
+    GROQ_RPM,
+    GROQ_TPM,
+    RETRY_MAX_ATTEMPTS,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_RECOVERY_SECONDS,
+    BREAKER_HALF_OPEN_MAX_CALLS,
+    LEXICON_ENABLED,
+    LEXICON_CONFIDENCE_THRESHOLD,
+    DEDUP_ENABLED,
+    DEDUP_THRESHOLD,
+    DEDUP_NUM_PERM,
+    DEDUP_SHINGLE_SIZE,
+    OPENAI_PRICE_INPUT_PER_1K,
+    OPENAI_PRICE_OUTPUT_PER_1K,
+    GROQ_PRICE_INPUT_PER_1K,
+    GROQ_PRICE_OUTPUT_PER_1K
 )
+from utils.cache import ResponseCache, make_cache_key
+from utils.chunking import chunk_text, merge_results, select_chunks
+from utils.dedup import group_near_duplicates
+from utils.history import HistoryStore
+from utils.lexicon import LexiconClassifier
+from utils.metrics import registry
+from utils.rate_limit import ProviderRateLimiter, ProviderRateLimitError
+from utils.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy, is_retryable
+from utils.routing import LatencyRouter
+from utils.streaming import IncrementalJSONParser
+from utils.schema import ParseStats, ResultParseError, SentimentResult, parse_sentiment_result
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SYSTEM_PROMPT = "Eres un experto analista de sentimientos."
+
+# Huella del prompt: cambia la clave de caché cuando se edita el prompt
+PROMPT_VERSION = hashlib.sha256(
+    f"{SYSTEM_PROMPT}\n{SENTIMENT_ANALYSIS_PROMPT}".encode("utf-8")
+).hexdigest()[:16]
+
+FALLBACK_ASPECT = "Análisis automático - revisar manualmente"
+
+# Resultados del parser de respuestas (directo, reparado o fallback)
+parse_stats = ParseStats()
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimar el número de tokens de un texto sin tokenizador
+    
+    Usa la aproximación habitual de ~4 caracteres por token, suficiente
+    para repartir presupuestos sin depender de tiktoken.
+    
+    Args:
+        text (str): Texto a medir
+        
+    Returns:
+        int: Número aproximado de tokens
+    """
+    return len(text) // 4 + 1
+
+def estimate_request_tokens(messages: List[Dict], max_tokens: int) -> int:
+    """
+    Estimar el coste en tokens de una petición para el limitador de cuota
+    
+    Args:
+        messages (List[Dict]): Mensajes del chat
+        max_tokens (int): Máximo de tokens de la respuesta
+        
+    Returns:
+        int: Tokens del prompt estimados más `max_tokens`
+    """
+    return sum(estimate_tokens(message["content"]) for message in messages) + max_tokens
+
+def _http2_enabled() -> bool:
+    """HTTP/2 solo si está activado y el paquete h2 está instalado"""
+    if not HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("HTTP2_ENABLED requiere el paquete h2 (pip install \"httpx[http2]\"); se usa HTTP/1.1")
+        return False
+    return True
+
+def _http_pool_options() -> Dict:
+    """Opciones del pool de conexiones común a todos los clientes HTTP"""
+    import httpx
+    
+    return {
+        "limits": httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        ),
+        "http2": _http2_enabled()
+    }
+
+class ChatProvider:
+    """
+    Backend de chat con API compatible con OpenAI
+    
+    Describe cómo crear los clientes de un proveedor y sus límites; la cuota,
+    los reintentos, las métricas y el parsing son comunes y los aplica el
+    analizador. Sirve tal cual para OpenAI y para servidores de inferencia
+    locales (llama.cpp, vLLM...) indicando `base_url`.
+    
+    El cliente síncrono es único por proceso y se crea en el primer uso
+    (`get_client`): su pool keep-alive lo comparten todas las sesiones e
+    hilos de Streamlit. Los clientes asíncronos se crean por analizador
+    porque su pool queda ligado al event loop en que se usa. Los SDK se
+    importan al crear el primer cliente, no al importar este módulo.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        label: str,
+        model: str,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        rpm: int = 0,
+        tpm: int = 0,
+        price_input_per_1k: float = 0.0,
+        price_output_per_1k: float = 0.0,
+        json_mode: bool = True,
+        description: str = "",
+        connect_timeout: float = 5.0,
+        read_timeout: float = 60.0
+    ):
+        """
+        Args:
+            name (str): Identificador en minúsculas ("openai", "local"...)
+            label (str): Nombre para mostrar en la interfaz
+            model (str): Modelo a usar
+            api_key (Optional[str]): API key (opcional si hay `base_url`)
+            base_url (Optional[str]): URL base de la API; None para la oficial
+            rpm (int): Peticiones por minuto permitidas (0 = sin límite)
+            tpm (int): Tokens por minuto permitidos (0 = sin límite)
+            price_input_per_1k (float): USD por 1K tokens de entrada
+            price_output_per_1k (float): USD por 1K tokens de salida
+            json_mode (bool): El backend acepta response_format=json_object
+            description (str): Descripción breve para la interfaz
+            connect_timeout (float): Segundos máximos para abrir la conexión
+            read_timeout (float): Segundos máximos de espera de la respuesta
+        """
+        self.name = name.lower()
+        self.label = label
+        self.model = model
+        self.api_key = api_key
+        self.base_url = base_url or None
+        self.rpm = rpm
+        self.tpm = tpm
+        self.price_input_per_1k = price_input_per_1k
+        self.price_output_per_1k = price_output_per_1k
+        self.json_mode = json_mode
+        self.description = description
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._client = None
+        self._client_lock = threading.Lock()
+    
+    @property
+    def configured(self) -> bool:
+        """Hay API key o, en servidores propios, una URL base"""
+        return bool(self.api_key or self.base_url)
+    
+    @property
+    def timeout(self):
+        """Timeout de las peticiones: `read_timeout` para leer/escribir, `connect_timeout` para conectar"""
+        import httpx
+        
+        return httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+    
+    def _sdk_classes(self) -> Tuple[type, type]:
+        """Clases de cliente (síncrona y asíncrona) del SDK"""
+        from openai import AsyncOpenAI, OpenAI
+        
+        return OpenAI, AsyncOpenAI
+    
+    def _client_options(self, http_client) -> Dict:
+        # Los reintentos los gestiona el analizador (retry_policy); los
+        # servidores locales no exigen key pero el cliente no acepta una vacía
+        return {
+            "api_key": self.api_key or "sin-api-key",
+            "base_url": self.base_url,
+            "max_retries": 0,
+            "timeout": self.timeout,
+            "http_client": http_client
+        }
+    
+    def create_client(self):
+        """Crear un cliente síncrono con su propio pool de conexiones"""
+        import httpx
+        
+        client_class, _ = self._sdk_classes()
+        return client_class(**self._client_options(httpx.Client(**_http_pool_options())))
+    
+    def create_async_client(self):
+        """Crear un cliente asíncrono con su propio pool de conexiones"""
+        import httpx
+        
+        _, async_client_class = self._sdk_classes()
+        return async_client_class(**self._client_options(httpx.AsyncClient(**_http_pool_options())))
+    
+    def get_client(self):
+        """
+        Obtener el cliente síncrono compartido del proceso
+        
+        Returns:
+            Cliente del SDK, creado en el primer uso
+        """
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self.create_client()
+        return self._client
+    
+    def close(self) -> None:
+        """Cerrar el cliente compartido; el siguiente `get_client` crea uno nuevo"""
+        with self._client_lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+class GroqProvider(ChatProvider):
+    """Groq, con su SDK propio (misma interfaz de chat que OpenAI)"""
+    
+    def _sdk_classes(self) -> Tuple[type, type]:
+        from groq import AsyncGroq, Groq
+        
+        return Groq, AsyncGroq
+
+# Registro de proveedores y estado compartido por todas las instancias: la
+# cuota es por API key y la salud es del proveedor, no del analizador
+providers: Dict[str, ChatProvider] = {}
+rate_limiters: Dict[str, ProviderRateLimiter] = {}
+circuit_breakers: Dict[str, CircuitBreaker] = {}
+
+def register_provider(provider: ChatProvider) -> ChatProvider:
+    """
+    Registrar (o reemplazar) un proveedor con su limitador y circuit breaker
+    
+    Args:
+        provider (ChatProvider): Proveedor a registrar
+        
+    Returns:
+        ChatProvider: El mismo proveedor
+    """
+    providers[provider.name] = provider
+    rate_limiters[provider.name] = ProviderRateLimiter(provider.rpm, provider.tpm)
+    circuit_breakers[provider.name] = CircuitBreaker(
+        failure_threshold=BREAKER_FAILURE_THRESHOLD,
+        recovery_seconds=BREAKER_RECOVERY_SECONDS,
+        half_open_max_calls=BREAKER_HALF_OPEN_MAX_CALLS
+    )
+    return provider
+
+def get_provider(name: str) -> ChatProvider:
+    """
+    Obtener un proveedor registrado
+    
+    Args:
+        name (str): Identificador del proveedor (sin distinguir mayúsculas)
+        
+    Returns:
+        ChatProvider: Proveedor registrado
+    """
+    provider = providers.get(name.lower())
+    if provider is None:
+        supported = ", ".join(f"'{key}'" for key in providers)
+        raise ValueError(f"Proveedor {name} no soportado. Use {supported} o 'auto'")
+    return provider
+
+register_provider(ChatProvider(
+    "openai", "OpenAI", OPENAI_MODEL, api_key=OPENAI_API_KEY,
+    rpm=OPENAI_RPM, tpm=OPENAI_TPM,
+    price_input_per_1k=OPENAI_PRICE_INPUT_PER_1K, price_output_per_1k=OPENAI_PRICE_OUTPUT_PER_1K,
+    description="🎯 OpenAI GPT-3.5: análisis más detallado y preciso",
+    connect_timeout=OPENAI_CONNECT_TIMEOUT, read_timeout=OPENAI_READ_TIMEOUT
+))
+register_provider(GroqProvider(
+    "groq", "Groq", GROQ_MODEL, api_key=GROQ_API_KEY,
+    rpm=GROQ_RPM, tpm=GROQ_TPM,
+    price_input_per_1k=GROQ_PRICE_INPUT_PER_1K, price_output_per_1k=GROQ_PRICE_OUTPUT_PER_1K,
+    description="⚡ Groq Llama-3: procesamiento ultra-rápido",
+    connect_timeout=GROQ_CONNECT_TIMEOUT, read_timeout=GROQ_READ_TIMEOUT
+))
+# Sin API key solo se ofrece si hay URL: el SDK usaría la API oficial de OpenAI
+register_provider(ChatProvider(
+    "local", "Local", LOCAL_LLM_MODEL, api_key=LOCAL_LLM_API_KEY if LOCAL_LLM_BASE_URL else None,
+    base_url=LOCAL_LLM_BASE_URL, rpm=LOCAL_LLM_RPM, tpm=LOCAL_LLM_TPM, json_mode=LOCAL_LLM_JSON_MODE,
+    description="🏠 Servidor local: sin salida de datos y sin coste por token",
+    connect_timeout=LOCAL_LLM_CONNECT_TIMEOUT, read_timeout=LOCAL_LLM_READ_TIMEOUT
+))
+
+retry_policy = RetryPolicy(
+    max_attempts=RETRY_MAX_ATTEMPTS,
+    base_delay=RETRY_BASE_DELAY,
+    max_delay=RETRY_MAX_DELAY
+)
+
+# Métricas por llamada a proveedor (ver utils.metrics)
+request_duration = registry.histogram(
+    "sentiment_request_duration_seconds", "Duración de las llamadas a proveedores, reintentos incluidos"
+)
+queue_duration = registry.histogram(
+    "sentiment_queue_seconds", "Espera en el limitador de cuota antes de enviar cada llamada"
+)
+requests_total = registry.counter("sentiment_requests_total", "Llamadas a proveedores por resultado")
+retries_total = registry.counter("sentiment_retries_total", "Reintentos de llamadas a proveedores")
+tokens_total = registry.counter("sentiment_tokens_total", "Tokens consumidos (prompt y completion)")
+cost_total = registry.counter("sentiment_cost_usd_total", "Coste estimado en USD")
+cache_lookups_total = registry.counter("sentiment_cache_lookups_total", "Consultas a la caché por resultado")
+parse_total = registry.counter("sentiment_parse_total", "Respuestas interpretadas por resultado del parsing")
+dedup_skipped_total = registry.counter(
+    "sentiment_dedup_skipped_total", "Reseñas casi duplicadas resueltas con el resultado de su representante"
+)
+lexicon_resolved_total = registry.counter(
+    "sentiment_lexicon_resolved_total", "Reseñas resueltas por el pre-clasificador local"
+)
+
+def estimate_cost(provider: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """
+    Estimar el coste en USD de una llamada
+    
+    Args:
+        provider (str): Proveedor de IA
+        prompt_tokens (int): Tokens de entrada
+        completion_tokens (int): Tokens de salida
+        
+    Returns:
+        float: Coste según los precios configurados (0 si el proveedor no tiene precio)
+    """
+    spec = providers.get(provider)
+    if spec is None:
+        return 0.0
+    return (prompt_tokens * spec.price_input_per_1k + completion_tokens * spec.price_output_per_1k) / 1000
+
+# Tokens del análisis en curso: lo abre cada análisis que se guarda en el
+# historial y `_record_call` suma ahí el uso de las llamadas que hace
+_usage_scope: contextvars.ContextVar = contextvars.ContextVar("usage_scope", default=None)
+
+@contextmanager
+def track_usage() -> Iterator[Dict[str, int]]:
+    """
+    Acumular los tokens de las llamadas hechas dentro del bloque
+    
+    Las tareas de asyncio heredan el acumulador; los hilos solo si se
+    lanzan con `contextvars.copy_context().run`.
+    
+    Yields:
+        Dict[str, int]: {"prompt_tokens", "completion_tokens"}, actualizado en el bloque
+    """
+    usage = {"prompt_tokens": 0, "completion_tokens": 0}
+    token = _usage_scope.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage_scope.reset(token)
+
+def _record_call(
+    provider: str,
+    duration: float,
+    queue_time: float,
+    usage: Optional[Tuple[int, int]] = None,
+    error: Optional[Exception] = None
+) -> None:
+    """
+    Registrar las métricas de una llamada a un proveedor
+    
+    Args:
+        provider (str): Proveedor de IA
+        duration (float): Segundos totales de la llamada
+        queue_time (float): Segundos esperando cupo en el limitador
+        usage (Optional[Tuple[int, int]]): Tokens (prompt, completion), si se conocen
+        error (Optional[Exception]): Error final, o None si la llamada tuvo éxito
+    """
+    if error is None:
+        status = "ok"
+    elif isinstance(error, ProviderRateLimitError):
+        status = "rate_limited"
+    elif isinstance(error, CircuitOpenError):
+        status = "circuit_open"
+    else:
+        status = "error"
+    requests_total.inc(provider=provider, status=status)
+    request_duration.observe(duration, provider=provider)
+    queue_duration.observe(queue_time, provider=provider)
+    if usage is not None:
+        prompt_tokens, completion_tokens = usage
+        tokens_total.inc(prompt_tokens, provider=provider, kind="prompt")
+        tokens_total.inc(completion_tokens, provider=provider, kind="completion")
+        cost_total.inc(estimate_cost(provider, prompt_tokens, completion_tokens), provider=provider)
+        scope = _usage_scope.get()
+        if scope is not None:
+            scope["prompt_tokens"] += prompt_tokens
+            scope["completion_tokens"] += completion_tokens
+
+def _usage_tokens(usage) -> Optional[Tuple[int, int]]:
+    """Extraer (prompt, completion) del objeto `usage` de una respuesta"""
+    if usage is None:
+        return None
+    return (getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0)
+
+def metrics_summary() -> Dict[str, Dict]:
+    """
+    Resumen de las métricas por proveedor para la interfaz
+    
+    Returns:
+        Dict[str, Dict]: Llamadas, errores, latencias p50/p95, espera media,
+            tokens, coste y aciertos de caché por proveedor
+    """
+    summary = {}
+    for labels in request_duration.label_sets():
+        provider = labels["provider"]
+        latency = request_duration.summary(provider=provider)
+        summary[provider] = {
+            "llamadas": int(latency["count"]),
+            "errores": int(sum(
+                value for key, value in requests_total.values().items()
+                if dict(key).get("provider") == provider and dict(key).get("status") != "ok"
+            )),
+            "p50_s": latency["p50"],
+            "p95_s": latency["p95"],
+            "espera_media_s": queue_duration.summary(provider=provider)["mean"],
+            "tokens": int(
+                tokens_total.value(provider=provider, kind="prompt")
+                + tokens_total.value(provider=provider, kind="completion")
+            ),
+            "coste_usd": cost_total.value(provider=provider),
+            "cache_hits": int(cache_lookups_total.value(provider=provider, result="hit")),
+            "cache_misses": int(cache_lookups_total.value(provider=provider, result="miss")),
+        }
+    return summary
+
+def _translate_provider_error(provider: str, error: Exception) -> Exception:
+    """
+    Traducir un 429 del SDK en ProviderRateLimitError y pausar el limitador
+    
+    Args:
+        provider (str): Proveedor que devolvió el error
+        error (Exception): Excepción del SDK
+        
+    Returns:
+        Exception: Error a propagar
+    """
+    if getattr(error, "status_code", None) == 429:
+        headers = getattr(getattr(error, "response", None), "headers", None)
+        rate_limiters[provider].on_rate_limited(headers)
+        return ProviderRateLimitError(str(error))
+    return error
+
+def _check_circuit(provider: str) -> None:
+    """Rechazar la llamada sin enviarla si el circuito del proveedor está abierto"""
+    if not circuit_breakers[provider].allow_request():
+        raise CircuitOpenError(
+            f"{provider} no disponible temporalmente tras fallos repetidos; "
+            f"se reintentará en {BREAKER_RECOVERY_SECONDS:.0f}s"
+        )
+
+def _retry_delay(provider: str, error: Exception, attempt: int) -> Optional[float]:
+    """
+    Registrar un fallo en el circuit breaker y decidir si reintentar
+    
+    Los 429 no cuentan como fallo del proveedor: ya los gestiona el limitador.
+    
+    Args:
+        provider (str): Proveedor que falló
+        error (Exception): Error ya traducido
+        attempt (int): Intento que acaba de fallar (desde 1)
+        
+    Returns:
+        Optional[float]: Segundos a esperar antes de reintentar, o None para propagar el error
+    """
+    breaker = circuit_breakers[provider]
+    retryable = is_retryable(error)
+    if retryable and not isinstance(error, ProviderRateLimitError):
+        breaker.record_failure()
+    else:
+        breaker.release()
+    
+    if not retryable or attempt >= retry_policy.max_attempts or breaker.state == CircuitBreaker.OPEN:
+        return None
+    
+    delay = retry_policy.delay(attempt)
+    logger.warning(
+        f"Error transitorio en {provider} (intento {attempt}/{retry_policy.max_attempts}): "
+        f"{str(error)}. Reintentando en {delay:.2f}s"
+    )
+    return delay
+
+def _default_cache() -> Optional[ResponseCache]:
+    """Crear la caché configurada en settings, o None si está deshabilitada"""
+    if not CACHE_ENABLED:
+        return None
+    try:
+        return ResponseCache(CACHE_PATH, max_entries=CACHE_MAX_ENTRIES, ttl_seconds=CACHE_TTL_SECONDS)
+    except Exception as e:
+        logger.error(f"Error inicializando la caché de respuestas: {str(e)}")
+        return None
+
+def _default_history() -> Optional[HistoryStore]:
+    """Crear el historial configurado en settings, o None si está deshabilitado"""
+    if not HISTORY_ENABLED:
+        return None
+    try:
+        return HistoryStore(HISTORY_PATH)
+    except Exception as e:
+        logger.error(f"Error inicializando el historial de análisis: {str(e)}")
+        return None
+
+def _default_router() -> LatencyRouter:
+    """Crear el enrutador de latencia configurado en settings"""
+    return LatencyRouter(
+        window_size=ROUTER_WINDOW_SIZE,
+        min_samples=ROUTER_MIN_SAMPLES,
+        max_error_rate=ROUTER_MAX_ERROR_RATE,
+        hedge_percentile=ROUTER_HEDGE_PERCENTILE,
+        default_hedge_seconds=ROUTER_DEFAULT_HEDGE_SECONDS,
+        max_sample_age=ROUTER_MAX_SAMPLE_AGE_SECONDS or None
+    )
+
 class SentimentAnalyzer:
     """
     Clase para análisis de sentimientos usando diferentes proveedores de IA
     """
     
-    def __init__(self):
-        """Inicializar el analizador con los clientes de IA"""
-        self.openai_client = None
-        self.groq_client = None
-        
-        # Inicializar OpenAI si hay API key
-        if OPENAI_API_KEY:
-            try:
-                openai.api_key = OPENAI_API_KEY
-                self.openai_client = openai
-                logger.info("Cliente OpenAI inicializado correctamente")
-            except Exception as e:
-                logger.error(f"Error inicializando OpenAI: {str(e)}")
+    def __init__(self, cache: Optional[ResponseCache] = None, history: Optional[HistoryStore] = None):
+        """
+        Inicializar el analizador con los clientes de IA
         
-        # Inicializar Groq si hay API key
-        if GROQ_API_KEY:
-            try:
-                self.groq_client = Groq(api_key=GROQ_API_KEY)
-                logger.info("Cliente Groq inicializado correctamente")
-            except Exception as e:
-                logger.error(f"Error inicializando Groq: {str(e)}")
+        Args:
+            cache (Optional[ResponseCache]): Caché de respuestas; por defecto
+                la configurada en settings
+            history (Optional[HistoryStore]): Historial de análisis; por
+                defecto el configurado en settings
+        """
+        # Clientes propios por proveedor; sin entrada se usa el compartido
+        # del proceso, que se crea en la primera llamada
+        self.clients: Dict[str, object] = {}
+        self.cache = cache if cache is not None else _default_cache()
+        self.history = history if history is not None else _default_history()
+        self.router = _default_router()
+        self.lexicon = LexiconClassifier() if LEXICON_ENABLED else None
+        self._hedge_executor = None
     
-    def analyze_with_openai(self, review_text: str) -> Dict:
+    def _build_messages(self, review_text: str) -> List[Dict]:
         """
-        Analizar sentimiento usando OpenAI GPT
+        Construir los mensajes del chat para una reseña
         
         Args:
             review_text (str): Texto de la reseña a analizar
             
         Returns:
-            Dict: Resultado del análisis de sentimientos
+            List[Dict]: Mensajes en formato chat completions
+        """
+        prompt = f"{SENTIMENT_ANALYSIS_PROMPT}\n{review_text}"
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def _cache_key(self, review_text: str, provider: str) -> Optional[str]:
+        """
+        Calcular la clave de caché para una reseña y proveedor
+        
+        Args:
+            review_text (str): Texto de la reseña
+            provider (str): Proveedor de IA
+            
+        Returns:
+            Optional[str]: Clave, o None si no hay caché o el proveedor es desconocido
+        """
+        spec = providers.get(provider.lower())
+        if self.cache is None or spec is None:
+            return None
+        return make_cache_key(provider, spec.model, PROMPT_VERSION, MODEL_TEMPERATURE, review_text)
+    
+    def _cache_get(self, cache_key: Optional[str], provider: str) -> Optional[Dict]:
+        """
+        Consultar la caché registrando el acierto o fallo en las métricas
+        
+        Args:
+            cache_key (Optional[str]): Clave de `_cache_key` (None si no hay caché)
+            provider (str): Proveedor al que corresponde la clave
+            
+        Returns:
+            Optional[Dict]: Resultado en caché, o None
+        """
+        if cache_key is None:
+            return None
+        cached = self.cache.get(cache_key)
+        cache_lookups_total.inc(provider=provider.lower(), result="miss" if cached is None else "hit")
+        if cached is not None:
+            logger.info(f"Resultado obtenido de caché para {provider}")
+        return cached
+    
+    def _store_in_cache(self, key: Optional[str], result: Dict) -> None:
+        """Guardar un resultado en caché, salvo los del parsing alternativo"""
+        if key is None or result.get("aspectos_positivos") == [FALLBACK_ASPECT]:
+            return
+        try:
+            self.cache.set(key, result)
+        except Exception as e:
+            logger.warning(f"No se pudo guardar en caché: {str(e)}")
+    
+    def _history_record(
+        self,
+        review_text: str,
+        result: Dict,
+        latency: Optional[float] = None,
+        usage: Optional[Dict[str, int]] = None,
+        product: Optional[str] = None,
+        provider: Optional[str] = None
+    ) -> Dict:
+        """Registro de `HistoryStore.add_many` para un resultado (proveedor por defecto el del resultado)"""
+        provider = result.get("proveedor") or provider
+        spec = providers.get(provider or "")
+        return {
+            "review": review_text,
+            "result": result,
+            "provider": provider,
+            "model": spec.model if spec is not None else None,
+            "latency": latency,
+            "prompt_tokens": usage["prompt_tokens"] if usage else 0,
+            "completion_tokens": usage["completion_tokens"] if usage else 0,
+            "product": product,
+        }
+    
+    def _record_history(self, records: List[Dict]) -> None:
+        """Guardar resultados en el historial sin que un fallo afecte al análisis"""
+        if self.history is None or not records:
+            return
+        try:
+            self.history.add_many(records)
+        except Exception as e:
+            logger.warning(f"No se pudo guardar en el historial: {str(e)}")
+    
+    def record_copies(self, copies: Iterable[Tuple[str, Optional[Dict]]], product: Optional[str] = None) -> None:
+        """
+        Guardar en el historial resultados copiados de una reseña casi idéntica
+        
+        Args:
+            copies (Iterable[Tuple[str, Optional[Dict]]]): (reseña, resultado de
+                su representante); se omiten las que no tienen resultado
+            product (Optional[str]): Etiqueta de producto para el historial
+        """
+        self._record_history([
+            self._history_record(review_text, result, 0.0, product=product)
+            for review_text, result in copies if result
+        ])
+    
+    def _classify_locally(self, reviews: List[str]) -> List[Optional[Dict]]:
+        """
+        Resolver con el léxico local las reseñas claramente polarizadas
+        
+        Args:
+            reviews (List[str]): Reseñas a pre-clasificar
+            
+        Returns:
+            List[Optional[Dict]]: Resultado local, o None si debe ir a la IA
+        """
+        if self.lexicon is None or not reviews:
+            return [None] * len(reviews)
+        results = self.lexicon.classify_batch(reviews, LEXICON_CONFIDENCE_THRESHOLD)
+        resolved = sum(result is not None for result in results)
+        if resolved:
+            lexicon_resolved_total.inc(resolved)
+            logger.info(f"Pre-clasificador local resolvió {resolved} de {len(reviews)} reseñas sin llamar a la IA")
+        return results
+    
+    def _group_duplicates(self, reviews: List[str]) -> Dict[int, List[int]]:
+        """
+        Agrupar las reseñas casi duplicadas de un lote
+        
+        Args:
+            reviews (List[str]): Reseñas del lote
+            
+        Returns:
+            Dict[int, List[int]]: Posición de cada representante (en orden) ->
+                posiciones del resto de miembros de su grupo
+        """
+        groups: Dict[int, List[int]] = {}
+        representatives = group_near_duplicates(reviews, DEDUP_THRESHOLD, DEDUP_NUM_PERM, DEDUP_SHINGLE_SIZE)
+        for index, representative in enumerate(representatives):
+            if representative == index:
+                groups[index] = []
+            else:
+                groups[representative].append(index)
+        skipped = len(reviews) - len(groups)
+        if skipped:
+            dedup_skipped_total.inc(skipped)
+            logger.info(f"Deduplicación: {skipped} de {len(reviews)} reseñas son casi duplicadas de otra del lote")
+        return groups
+    
+    def _expand_duplicates(
+        self,
+        item: Dict,
+        unique: List[int],
+        groups: Dict[int, List[int]],
+        reviews: List[str],
+        product: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Repartir el resultado de un representante entre los miembros de su grupo
+        
+        Las copias se guardan en el historial (el representante ya lo guardó
+        su propio análisis).
+        
+        Args:
+            item (Dict): Elemento del lote de representantes ("indice" relativo a `unique`)
+            unique (List[int]): Posición original de cada representante
+            groups (Dict[int, List[int]]): Grupos de `_group_duplicates`
+            reviews (List[str]): Reseñas originales
+            product (Optional[str]): Etiqueta de producto para el historial
+            
+        Returns:
+            List[Dict]: El elemento del representante y una copia por miembro,
+                con "duplicado_de" (None en el representante)
+        """
+        representative = unique[item["indice"]]
+        expanded = [{**item, "indice": representative, "duplicado_de": None}]
+        for member in groups[representative]:
+            copy = {
+                **item,
+                "indice": member,
+                "resena": reviews[member],
+                "resultado": dict(item["resultado"]) if item["resultado"] else None,
+                "duplicado_de": representative
+            }
+            if "latencia" in copy:
+                copy["latencia"] = 0.0
+            expanded.append(copy)
+        self.record_copies(((copy["resena"], copy["resultado"]) for copy in expanded[1:]), product)
+        return expanded
+    
+    def _analyze_deduplicated(
+        self,
+        reviews: List[str],
+        analyze_unique,
+        ordered: bool,
+        product: Optional[str] = None
+    ) -> Iterator[Dict]:
         """
-        if not self.openai_client or not OPENAI_API_KEY:
-            raise ValueError("OpenAI no está configurado correctamente")
+        Analizar solo un representante por grupo de casi duplicados
         
+        Args:
+            reviews (List[str]): Reseñas del lote
+            analyze_unique: Función que analiza una lista de reseñas y devuelve sus elementos
+            ordered (bool): Entregar en el orden de entrada
+            product (Optional[str]): Etiqueta de producto para el historial
+            
+        Yields:
+            Dict: Elementos de todas las reseñas, con "duplicado_de"
+        """
+        groups = self._group_duplicates(reviews)
+        unique = list(groups)
+        items = analyze_unique([reviews[i] for i in unique])
         try:
-            prompt = f"{SENTIMENT_ANALYSIS_PROMPT}\n{review_text}"
-            
-            response = self.openai_client.chat.completions.create(
-                model=OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": "Eres un experto analista de sentimientos."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=1000
-            )
+            if not ordered:
+                for item in items:
+                    yield from self._expand_duplicates(item, unique, groups, reviews, product)
+                return
+            
+            # Los miembros llegan junto a su representante: se retienen hasta su turno
+            pending: Dict[int, Dict] = {}
+            next_index = 0
+            for item in items:
+                for expanded in self._expand_duplicates(item, unique, groups, reviews, product):
+                    pending[expanded["indice"]] = expanded
+                while next_index in pending:
+                    yield pending.pop(next_index)
+                    next_index += 1
+        finally:
+            if hasattr(items, "close"):
+                items.close()
+    
+    def _resolve_client(self, provider: str) -> Tuple[object, str]:
+        """
+        Obtener el cliente síncrono y el modelo de un proveedor
+        
+        Args:
+            provider (str): Proveedor de IA en minúsculas
             
-            # Extraer y parsear la respuesta
-            content = response.choices[0].message.content
-            logger.info(f"Respuesta de OpenAI recibida: {len(content)} caracteres")
+        Returns:
+            Tuple[object, str]: Cliente y nombre del modelo
+        """
+        spec = get_provider(provider)
+        if not spec.configured:
+            raise ValueError(f"{spec.label} no está configurado correctamente")
+        client = self.clients.get(spec.name)
+        if client is None:
+            try:
+                client = spec.get_client()
+            except Exception as e:
+                logger.error(f"Error inicializando {spec.label}: {str(e)}")
+                raise ValueError(f"{spec.label} no está configurado correctamente")
+        return client, spec.model
+    
+    def _chat_completion(self, provider: str, messages: List[Dict], max_tokens: int, json_mode: bool = False) -> str:
+        """
+        Ejecutar una petición de chat respetando la cuota del proveedor
+        
+        Args:
+            provider (str): Proveedor registrado ("openai", "groq", "local"...)
+            messages (List[Dict]): Mensajes del chat
+            max_tokens (int): Máximo de tokens de la respuesta
+            json_mode (bool): Pedir salida JSON estructurada al proveedor
             
-            return self._parse_ai_response(content)
+        Returns:
+            str: Contenido de la respuesta
+        """
+        provider = provider.lower()
+        client, model = self._resolve_client(provider)
+        
+        extra_params = {"response_format": {"type": "json_object"}} if json_mode and providers[provider].json_mode else {}
+        limiter = rate_limiters[provider]
+        start_time = time.perf_counter()
+        queue_time = 0.0
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                _check_circuit(provider)
+            except CircuitOpenError as e:
+                _record_call(provider, time.perf_counter() - start_time, queue_time, error=e)
+                raise
+            # Un KeyboardInterrupt (u otra BaseException) esperando al limitador,
+            # a la respuesta o al reintento no debe dejar tomada la sonda half_open
+            probe_pending = True
+            try:
+                queue_time += limiter.acquire(estimate_request_tokens(messages, max_tokens))
+                try:
+                    raw_response = client.chat.completions.with_raw_response.create(
+                        model=model,
+                        messages=messages,
+                        temperature=MODEL_TEMPERATURE,
+                        max_tokens=max_tokens,
+                        **extra_params
+                    )
+                    break
+                except Exception as e:
+                    error = _translate_provider_error(provider, e)
+                    probe_pending = False
+                    delay = _retry_delay(provider, error, attempt)
+                    if delay is None:
+                        _record_call(provider, time.perf_counter() - start_time, queue_time, error=error)
+                        raise error
+                    retries_total.inc(provider=provider)
+                    time.sleep(delay)
+            except BaseException:
+                if probe_pending:
+                    circuit_breakers[provider].release()
+                raise
+        
+        circuit_breakers[provider].record_success()
+        limiter.observe(raw_response.headers)
+        response = raw_response.parse()
+        _record_call(provider, time.perf_counter() - start_time, queue_time, _usage_tokens(response.usage))
+        return response.choices[0].message.content
+    
+    def _chat_completion_stream(
+        self,
+        provider: str,
+        messages: List[Dict],
+        max_tokens: int,
+        json_mode: bool = False
+    ) -> Iterator[str]:
+        """
+        Ejecutar una petición de chat en streaming
+        
+        Los reintentos solo aplican al abrir la conexión: una vez recibidos
+        fragmentos, un corte se propaga al llamador.
+        
+        Args:
+            provider (str): Proveedor registrado ("openai", "groq", "local"...)
+            messages (List[Dict]): Mensajes del chat
+            max_tokens (int): Máximo de tokens de la respuesta
+            json_mode (bool): Pedir salida JSON estructurada al proveedor
             
+        Yields:
+            str: Fragmentos de texto a medida que llegan
+        """
+        provider = provider.lower()
+        client, model = self._resolve_client(provider)
+        
+        extra_params = {"response_format": {"type": "json_object"}} if json_mode and providers[provider].json_mode else {}
+        limiter = rate_limiters[provider]
+        start_time = time.perf_counter()
+        queue_time = 0.0
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                _check_circuit(provider)
+            except CircuitOpenError as e:
+                _record_call(provider, time.perf_counter() - start_time, queue_time, error=e)
+                raise
+            # Un KeyboardInterrupt (u otra BaseException) esperando al limitador,
+            # a la respuesta o al reintento no debe dejar tomada la sonda half_open
+            probe_pending = True
+            try:
+                queue_time += limiter.acquire(estimate_request_tokens(messages, max_tokens))
+                try:
+                    raw_response = client.chat.completions.with_raw_response.create(
+                        model=model,
+                        messages=messages,
+                        temperature=MODEL_TEMPERATURE,
+                        max_tokens=max_tokens,
+                        stream=True,
+                        **extra_params
+                    )
+                    break
+                except Exception as e:
+                    error = _translate_provider_error(provider, e)
+                    probe_pending = False
+                    delay = _retry_delay(provider, error, attempt)
+                    if delay is None:
+                        _record_call(provider, time.perf_counter() - start_time, queue_time, error=error)
+                        raise error
+                    retries_total.inc(provider=provider)
+                    time.sleep(delay)
+            except BaseException:
+                if probe_pending:
+                    circuit_breakers[provider].release()
+                raise
+        
+        limiter.observe(raw_response.headers)
+        stream = None
+        settled = False
+        usage = None
+        content_parts = []
+        try:
+            stream = raw_response.parse()
+            for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    usage = _usage_tokens(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    content_parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+            circuit_breakers[provider].record_success()
+            settled = True
         except Exception as e:
-            logger.error(f"Error en análisis con OpenAI: {str(e)}")
-            raise Exception(f"Error procesando con OpenAI: {str(e)}")
+            settled = True
+            circuit_breakers[provider].record_failure()
+            _record_call(provider, time.perf_counter() - start_time, queue_time, error=e)
+            raise Exception(f"Error procesando con {provider}: {str(e)}")
+        finally:
+            if stream is not None:
+                stream.close()
+            if not settled:
+                # El llamador abandonó el generador (GeneratorExit) o se
+                # interrumpió: sin veredicto, se libera la sonda half_open
+                circuit_breakers[provider].release()
+        if usage is None:
+            # Los fragmentos no traen `usage` salvo que se pida: se estima
+            usage = (estimate_request_tokens(messages, 0), estimate_tokens("".join(content_parts)))
+        _record_call(provider, time.perf_counter() - start_time, queue_time, usage)
     
-    def analyze_with_groq(self, review_text: str) -> Dict:
+    def analyze_with_provider(self, review_text: str, provider: str) -> Dict:
         """
-        Analizar sentimiento usando Groq
+        Analizar sentimiento con un proveedor registrado
         
         Args:
             review_text (str): Texto de la reseña a analizar
+            provider (str): Proveedor registrado ("openai", "groq", "local"...)
             
         Returns:
             Dict: Resultado del análisis de sentimientos
         """
-        if not self.groq_client or not GROQ_API_KEY:
-            raise ValueError("Groq no está configurado correctamente")
+        spec = get_provider(provider)
+        self._resolve_client(spec.name)
         
         try:
-            prompt = f"{SENTIMENT_ANALYSIS_PROMPT}\n{review_text}"
-            
-            response = self.groq_client.chat.completions.create(
-                model=GROQ_MODEL,
-                messages=[
-                    {"role": "system", "content": "Eres un experto analista de sentimientos."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=1000
+            content = self._chat_completion(
+                spec.name, self._build_messages(review_text), MODEL_MAX_TOKENS, json_mode=STRUCTURED_OUTPUT_ENABLED
             )
-            
-            # Extraer y parsear la respuesta
-            content = response.choices[0].message.content
-            logger.info(f"Respuesta de Groq recibida: {len(content)} caracteres")
+            logger.info(f"Respuesta de {spec.label} recibida: {len(content)} caracteres")
             
             return self._parse_ai_response(content)
             
+        except (ProviderRateLimitError, CircuitOpenError) as e:
+            logger.warning(f"{spec.label} no disponible: {str(e)}")
+            raise type(e)(f"Error procesando con {spec.label}: {str(e)}")
         except Exception as e:
-            logger.error(f"Error en análisis con Groq: {str(e)}")
-            raise Exception(f"Error procesando con Groq: {str(e)}")
+            logger.error(f"Error en análisis con {spec.label}: {str(e)}")
+            raise Exception(f"Error procesando con {spec.label}: {str(e)}")
+    
+    def analyze_with_openai(self, review_text: str) -> Dict:
+        """Analizar sentimiento usando OpenAI GPT (ver `analyze_with_provider`)"""
+        return self.analyze_with_provider(review_text, "openai")
+    
+    def analyze_with_groq(self, review_text: str) -> Dict:
+        """Analizar sentimiento usando Groq (ver `analyze_with_provider`)"""
+        return self.analyze_with_provider(review_text, "groq")
     
     def _parse_ai_response(self, content: str) -> Dict:
         """
-        Parsear la respuesta de la IA y extraer el JSON
+        Parsear la respuesta de la IA y validarla con `SentimentResult`
+        
+        Si el JSON está mal formado se repara; solo cuando la reparación
+        falla se recurre al parsing alternativo por palabras clave.
         
         Args:
             content (str): Respuesta de la IA
@@ -128,28 +1077,18 @@ class SentimentAnalyzer:
             Dict: Datos parseados del análisis
         """
         try:
-            # Buscar JSON en la respuesta
-            start_json = content.find('{')
-            end_json = content.rfind('}') + 1
-            
-            if start_json != -1 and end_json != 0:
-                json_str = content[start_json:end_json]
-                result = json.loads(json_str)
-                
-                # Validar estructura mínima
-                required_fields = ['sentimiento_general', 'puntuacion', 'resumen']
-                if all(field in result for field in required_fields):
-                    return result
-                else:
-                    logger.warning("Respuesta JSON incompleta, usando parsing alternativo")
-                    return self._fallback_parsing(content)
-            else:
-                logger.warning("No se encontró JSON válido, usando parsing alternativo")
-                return self._fallback_parsing(content)
-                
-        except json.JSONDecodeError as e:
-            logger.error(f"Error parseando JSON: {str(e)}")
+            result, outcome = parse_sentiment_result(content)
+        except ResultParseError as e:
+            logger.warning(f"Respuesta no interpretable ({str(e)}), usando parsing alternativo")
+            parse_stats.record("fallback")
+            parse_total.inc(outcome="fallback")
             return self._fallback_parsing(content)
+        
+        if outcome == "repaired":
+            logger.info("Respuesta JSON reparada")
+        parse_stats.record(outcome)
+        parse_total.inc(outcome=outcome)
+        return result.to_dict()
     
     def _fallback_parsing(self, content: str) -> Dict:
         """
@@ -184,53 +1123,1274 @@ class SentimentAnalyzer:
         return {
             "sentimiento_general": sentiment,
             "puntuacion": score,
-            "aspectos_positivos": ["Análisis automático - revisar manualmente"],
-            "aspectos_negativos": ["Análisis automático - revisar manualmente"],
+            "aspectos_positivos": [FALLBACK_ASPECT],
+            "aspectos_negativos": [FALLBACK_ASPECT],
             "recomendaciones": ["Revisar análisis manual por error en procesamiento"],
             "resumen": content[:200] + "..." if len(content) > 200 else content
         }
     
-    def analyze_sentiment(self, review_text: str, provider: str = "openai") -> Dict:
+    def analyze_sentiment(
+        self,
+        review_text: str,
+        provider: str = "openai",
+        use_lexicon: bool = True,
+        product: Optional[str] = None
+    ) -> Dict:
         """
         Método principal para análisis de sentimientos
         
+        El resultado se guarda en el historial con la latencia y los tokens
+        de todas las llamadas que hizo falta (fragmentos, cobertura...).
+        
         Args:
             review_text (str): Texto de la reseña
-            provider (str): Proveedor de IA ("openai" o "groq")
+            provider (str): Proveedor registrado o "auto"
+            use_lexicon (bool): Probar antes el pre-clasificador local
+            product (Optional[str]): Etiqueta de producto para el historial
             
         Returns:
-            Dict: Resultado del análisis
+            Dict: Resultado del análisis; "proveedor" indica quién respondió
+                ("lexico" si lo resolvió el pre-clasificador local)
         """
+        start_time = time.perf_counter()
+        with track_usage() as usage:
+            result = self._analyze_sentiment(review_text, provider, use_lexicon)
+        self._record_history([
+            self._history_record(review_text, result, time.perf_counter() - start_time, usage, product)
+        ])
+        return result
+    
+    def _analyze_sentiment(self, review_text: str, provider: str, use_lexicon: bool) -> Dict:
+        """Análisis de `analyze_sentiment` sin guardarlo en el historial"""
         if not review_text.strip():
             raise ValueError("El texto de la reseña no puede estar vacío")
         
+        if use_lexicon:
+            local_result = self._classify_locally([review_text])[0]
+            if local_result is not None:
+                return local_result
+        
+        if provider.lower() == "auto":
+            return self._analyze_auto(review_text)
+        
+        cache_key = self._cache_key(review_text, provider)
+        cached = self._cache_get(cache_key, provider)
+        if cached is not None:
+            return cached
+        
+        if self._is_long_review(review_text):
+            # No se registra en el router: varias peticiones distorsionarían su latencia
+            result = self._analyze_long(review_text, provider.lower())
+            result["proveedor"] = provider.lower()
+            self._store_in_cache(cache_key, result)
+            return result
+        
         logger.info(f"Iniciando análisis con {provider} para texto de {len(review_text)} caracteres")
         
+        start_time = time.perf_counter()
         try:
-            if provider.lower() == "openai":
-                return self.analyze_with_openai(review_text)
-            elif provider.lower() == "groq":
-                return self.analyze_with_groq(review_text)
-            else:
-                raise ValueError(f"Proveedor {provider} no soportado. Use 'openai' o 'groq'")
+            result = self.analyze_with_provider(review_text, provider)
+            
+            self.router.record(provider, time.perf_counter() - start_time, True)
+            result["proveedor"] = provider.lower()
+            self._store_in_cache(cache_key, result)
+            return result
                 
         except Exception as e:
+            if provider.lower() in providers:
+                self.router.record(provider, time.perf_counter() - start_time, False)
             logger.error(f"Error en análisis de sentimientos: {str(e)}")
             raise e
     
-    def get_available_providers(self) -> list:
+    def analyze_sentiment_stream(
+        self,
+        review_text: str,
+        provider: str = "openai",
+        product: Optional[str] = None
+    ) -> Iterator[Dict]:
         """
-        Obtener lista de proveedores disponibles
+        Analizar una reseña entregando los campos a medida que el modelo los emite
+        
+        Cada elemento es el resultado acumulado hasta el momento con
+        "parcial": True; el último es el resultado completo y validado (el
+        mismo que devolvería `analyze_sentiment`). Los aciertos de caché y
+        del pre-clasificador local se entregan directamente como final.
+        
+        Args:
+            review_text (str): Texto de la reseña
+            provider (str): Proveedor registrado o "auto"
+            product (Optional[str]): Etiqueta de producto para el historial
+            
+        Yields:
+            Dict: Resultados parciales y, al final, el resultado completo
+        """
+        if not review_text.strip():
+            raise ValueError("El texto de la reseña no puede estar vacío")
+        
+        stream_start = time.perf_counter()
+        local_result = self._classify_locally([review_text])[0]
+        if local_result is not None:
+            self._record_history([self._history_record(review_text, local_result, 0.0, product=product)])
+            yield local_result
+            return
+        
+        provider = provider.lower()
+        if provider == "auto":
+            candidates = [p.lower() for p in self.get_available_providers()]
+            if not candidates:
+                raise ValueError("No hay proveedores de IA configurados")
+            cached = self._cached_result(review_text, candidates)
+            if cached is not None:
+                self._record_history([
+                    self._history_record(review_text, cached, time.perf_counter() - stream_start, product=product)
+                ])
+                yield cached
+                return
+            # En streaming no hay cobertura: se usa el proveedor más rápido
+            provider = self.router.choose(candidates)
+        
+        cache_key = self._cache_key(review_text, provider)
+        cached = self._cache_get(cache_key, provider)
+        if cached is not None:
+            self._record_history([
+                self._history_record(review_text, cached, time.perf_counter() - stream_start, product=product)
+            ])
+            yield cached
+            return
+        
+        if self._is_long_review(review_text):
+            # Las reseñas largas se analizan por fragmentos: solo hay resultado final
+            yield self.analyze_sentiment(review_text, provider, use_lexicon=False, product=product)
+            return
+        
+        logger.info(f"Iniciando análisis en streaming con {provider} para texto de {len(review_text)} caracteres")
+        parser = IncrementalJSONParser()
+        chunks = []
+        start_time = time.perf_counter()
+        try:
+            for chunk in self._chat_completion_stream(
+                provider, self._build_messages(review_text), MODEL_MAX_TOKENS, json_mode=STRUCTURED_OUTPUT_ENABLED
+            ):
+                chunks.append(chunk)
+                if parser.feed(chunk):
+                    yield {**parser.fields, "parcial": True}
+        except Exception as e:
+            if provider in providers:
+                self.router.record(provider, time.perf_counter() - start_time, False)
+            logger.error(f"Error en análisis de sentimientos: {str(e)}")
+            raise
+        
+        self.router.record(provider, time.perf_counter() - start_time, True)
+        content = "".join(chunks)
+        logger.info(f"Respuesta en streaming de {provider} recibida: {len(content)} caracteres")
+        
+        result = self._parse_ai_response(content)
+        result["proveedor"] = provider
+        self._store_in_cache(cache_key, result)
+        # El uso exacto no siempre llega en streaming: se guarda la estimación
+        messages = self._build_messages(review_text)
+        usage = {
+            "prompt_tokens": estimate_request_tokens(messages, 0),
+            "completion_tokens": estimate_tokens(content)
+        }
+        self._record_history([
+            self._history_record(review_text, result, time.perf_counter() - stream_start, usage, product)
+        ])
+        yield result
+    
+    def _is_long_review(self, review_text: str) -> bool:
+        """Indicar si la reseña supera el límite de tokens de una sola petición"""
+        return estimate_tokens(review_text) > LONG_REVIEW_TOKEN_LIMIT
+    
+    def _chunk_review(self, review_text: str) -> List[str]:
+        """
+        Dividir una reseña larga en fragmentos analizables
         
+        Args:
+            review_text (str): Texto de la reseña
+            
         Returns:
-            list: Lista de proveedores configurados
+            List[str]: Como mucho `LONG_REVIEW_MAX_CHUNKS` fragmentos
         """
-        providers = []
-        if self.openai_client and OPENAI_API_KEY:
-            providers.append("OpenAI")
-        if self.groq_client and GROQ_API_KEY:
-            providers.append("Groq")
-        return providers
-
-# Instancia global del analizador
-analyzer = SentimentAnalyzer()
\ No newline at end of file
+        chunks = chunk_text(review_text, LONG_REVIEW_CHUNK_TOKENS, estimate_tokens)
+        selected = select_chunks(chunks, LONG_REVIEW_MAX_CHUNKS)
+        if len(selected) < len(chunks):
+            logger.warning(
+                f"Reseña de {len(chunks)} fragmentos: se analizan {len(selected)} repartidos por el texto"
+            )
+        logger.info(
+            f"Reseña larga ({estimate_tokens(review_text)} tokens estimados) dividida en {len(selected)} fragmentos"
+        )
+        return selected
+    
+    def _analyze_chunk(self, chunk: str, provider: str) -> Dict:
+        """
+        Analizar un fragmento de una reseña larga
+        
+        Args:
+            chunk (str): Fragmento de la reseña
+            provider (str): Proveedor de IA
+            
+        Returns:
+            Dict: Resultado del fragmento
+        """
+        try:
+            content = self._chat_completion(
+                provider, self._build_messages(chunk), LONG_REVIEW_CHUNK_OUTPUT_TOKENS,
+                json_mode=STRUCTURED_OUTPUT_ENABLED
+            )
+        except (ProviderRateLimitError, CircuitOpenError) as e:
+            raise type(e)(f"Error procesando con {provider}: {str(e)}")
+        except Exception as e:
+            raise Exception(f"Error procesando con {provider}: {str(e)}")
+        return self._parse_ai_response(content)
+    
+    def _merge_chunk_results(
+        self,
+        chunks: List[str],
+        results: List[Optional[Dict]],
+        errors: List[Exception]
+    ) -> Tuple[Dict, Optional[List[Dict]]]:
+        """
+        Combinar los resultados de los fragmentos (fase reduce)
+        
+        Los fragmentos que fallaron o cayeron en el parsing alternativo se
+        ignoran mientras quede alguno válido.
+        
+        Args:
+            chunks (List[str]): Fragmentos analizados
+            results (List[Optional[Dict]]): Resultado de cada fragmento (None si falló)
+            errors (List[Exception]): Errores de los fragmentos fallidos
+            
+        Returns:
+            Tuple[Dict, Optional[List[Dict]]]: Resultado combinado y, si hay
+                varios resúmenes que unificar, los mensajes para pedirlo
+        """
+        valid = [
+            (chunk, result) for chunk, result in zip(chunks, results)
+            if result is not None and result.get("aspectos_positivos") != [FALLBACK_ASPECT]
+        ]
+        if not valid:
+            fallback = next((result for result in results if result is not None), None)
+            if fallback is None:
+                raise errors[0]
+            return fallback, None
+        
+        if errors:
+            logger.warning(f"{len(errors)} de {len(chunks)} fragmentos fallaron; se combinan los restantes")
+        
+        merged = merge_results([result for _, result in valid], [estimate_tokens(chunk) for chunk, _ in valid])
+        summaries = [result["resumen"] for _, result in valid if result.get("resumen")]
+        if len(summaries) < 2:
+            return merged, None
+        
+        body = "\n".join(f"{i}. {summary}" for i, summary in enumerate(summaries, 1))
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": f"{LONG_REVIEW_SUMMARY_PROMPT}\n{body}"}
+        ]
+        return merged, messages
+    
+    def _analyze_long(self, review_text: str, provider: str) -> Dict:
+        """
+        Analizar una reseña larga por fragmentos en paralelo (map-reduce)
+        
+        Cada fragmento se analiza por separado; las puntuaciones se promedian
+        según el tamaño de cada fragmento, los aspectos se unen sin repetidos
+        y una última petición breve unifica los resúmenes.
+        
+        Args:
+            review_text (str): Texto de la reseña
+            provider (str): Proveedor registrado
+            
+        Returns:
+            Dict: Resultado combinado
+        """
+        self._resolve_client(provider)
+        chunks = self._chunk_review(review_text)
+        results: List[Optional[Dict]] = [None] * len(chunks)
+        errors = []
+        
+        workers = max(1, min(BATCH_MAX_CONCURRENCY, len(chunks)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sentiment-chunk") as executor:
+            # Con el contexto copiado, los tokens de cada fragmento cuentan para el análisis
+            futures = {
+                executor.submit(contextvars.copy_context().run, self._analyze_chunk, chunk, provider): i
+                for i, chunk in enumerate(chunks)
+            }
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    errors.append(e)
+        
+        merged, summary_messages = self._merge_chunk_results(chunks, results, errors)
+        if summary_messages:
+            try:
+                merged["resumen"] = self._chat_completion(provider, summary_messages, LONG_REVIEW_SUMMARY_TOKENS).strip()
+            except Exception as e:
+                logger.warning(f"No se pudo unificar el resumen ({str(e)}), se usan los resúmenes por fragmento")
+        return merged
+    
+    def _cached_result(self, review_text: str, providers: List[str]) -> Optional[Dict]:
+        """Buscar en caché el resultado de cualquiera de los proveedores"""
+        for provider in providers:
+            cached = self._cache_get(self._cache_key(review_text, provider), provider)
+            if cached is not None:
+                return cached
+        return None
+    
+    def _get_hedge_executor(self) -> ThreadPoolExecutor:
+        """Pool persistente para las peticiones de cobertura"""
+        if self._hedge_executor is None:
+            self._hedge_executor = ThreadPoolExecutor(
+                max_workers=2 * BATCH_MAX_CONCURRENCY,
+                thread_name_prefix="sentiment-hedge"
+            )
+        return self._hedge_executor
+    
+    def _analyze_auto(self, review_text: str) -> Dict:
+        """
+        Enviar la reseña al proveedor sano más rápido, con cobertura opcional
+        
+        Si el primario no responde antes de su p95 (o falla), se lanza la
+        misma petición al otro proveedor y se usa la primera respuesta
+        válida. La petición perdedora termina en segundo plano y su
+        resultado también queda en caché.
+        
+        Args:
+            review_text (str): Texto de la reseña
+            
+        Returns:
+            Dict: Resultado del análisis con el proveedor que respondió
+        """
+        candidates = [p.lower() for p in self.get_available_providers()]
+        if not candidates:
+            raise ValueError("No hay proveedores de IA configurados")
+        
+        cached = self._cached_result(review_text, candidates)
+        if cached is not None:
+            return cached
+        
+        primary = self.router.choose(candidates)
+        others = [p for p in candidates if p != primary]
+        logger.info(f"Enrutado automático hacia {primary}")
+        
+        if not others:
+            return self._analyze_sentiment(review_text, primary, use_lexicon=False)
+        
+        if not ROUTER_HEDGE_ENABLED:
+            try:
+                return self._analyze_sentiment(review_text, primary, use_lexicon=False)
+            except Exception as e:
+                logger.warning(f"{primary} falló ({str(e)}), reintentando con {others[0]}")
+                return self._analyze_sentiment(review_text, others[0], use_lexicon=False)
+        
+        executor = self._get_hedge_executor()
+        deadline = self.router.hedge_deadline(primary)
+        futures = {
+            executor.submit(contextvars.copy_context().run, self._analyze_sentiment, review_text, primary, False): primary
+        }
+        done, _ = wait(futures, timeout=deadline, return_when=FIRST_COMPLETED)
+        
+        if not done or next(iter(done)).exception() is not None:
+            logger.info(f"Cobertura: lanzando {others[0]} tras {deadline:.2f}s sin respuesta válida de {primary}")
+            futures[executor.submit(
+                contextvars.copy_context().run, self._analyze_sentiment, review_text, others[0], False
+            )] = others[0]
+        
+        errors = []
+        for future in as_completed(futures):
+            try:
+                return future.result()
+            except Exception as e:
+                errors.append(f"{futures[future]}: {str(e)}")
+        raise Exception(f"Todos los proveedores fallaron: {'; '.join(errors)}")
+    
+    def analyze_batch(
+        self,
+        reviews: Iterable[str],
+        provider: str = "openai",
+        max_concurrency: int = BATCH_MAX_CONCURRENCY,
+        ordered: bool = False,
+        dedup: bool = DEDUP_ENABLED,
+        product: Optional[str] = None,
+        cancel_event: Optional[threading.Event] = None
+    ) -> Iterator[Dict]:
+        """
+        Analizar varias reseñas en paralelo con un pool de hilos acotado
+        
+        Cada reseña pasa por `analyze_sentiment`, por lo que se reutilizan
+        los mismos caminos de OpenAI/Groq y `_parse_ai_response`. Un error
+        en una reseña no detiene el lote: se reporta en su propio elemento.
+        
+        Args:
+            reviews (Iterable[str]): Reseñas a analizar
+            provider (str): Proveedor registrado
+            max_concurrency (int): Máximo de peticiones simultáneas
+            ordered (bool): Si es True, se entregan en el orden de entrada;
+                si es False, a medida que se completan
+            dedup (bool): Analizar una sola reseña por grupo de casi duplicados
+                y repartir su resultado al resto
+            product (Optional[str]): Etiqueta de producto para el historial
+            cancel_event (Optional[threading.Event]): Al activarse no se lanzan
+                las reseñas pendientes y solo se entregan las que ya estaban en
+                curso; las no lanzadas (y sus casi duplicadas) no aparecen
+            
+        Yields:
+            Dict: {"indice", "resena", "resultado", "error", "latencia"} por
+                cada reseña; "indice" es la posición en la entrada y
+                "latencia" los segundos que tardó su análisis. Con `dedup`,
+                además "duplicado_de": posición del representante cuyo
+                resultado se copió (None si se analizó la propia reseña)
+        """
+        reviews = list(reviews)
+        if not reviews:
+            return
+        
+        if dedup and len(reviews) > 1:
+            yield from self._analyze_deduplicated(
+                reviews,
+                lambda unique: self.analyze_batch(
+                    unique, provider, max_concurrency, ordered, dedup=False, product=product, cancel_event=cancel_event
+                ),
+                ordered,
+                product
+            )
+            return
+        
+        max_concurrency = max(1, min(max_concurrency, len(reviews)))
+        logger.info(f"Iniciando lote de {len(reviews)} reseñas con {provider} (concurrencia {max_concurrency})")
+        
+        def _analyze_item(index: int, review_text: str) -> Dict:
+            item = {"indice": index, "resena": review_text, "resultado": None, "error": None}
+            start_time = time.perf_counter()
+            try:
+                item["resultado"] = self.analyze_sentiment(review_text, provider, use_lexicon=False, product=product)
+            except Exception as e:
+                item["error"] = str(e)
+            item["latencia"] = time.perf_counter() - start_time
+            return item
+        
+        # El léxico se evalúa de una vez sobre todo el lote
+        local_results = self._classify_locally(reviews)
+        local_items = {
+            i: {"indice": i, "resena": reviews[i], "resultado": result, "error": None, "latencia": 0.0}
+            for i, result in enumerate(local_results) if result is not None
+        }
+        self._record_history([
+            self._history_record(item["resena"], item["resultado"], 0.0, product=product)
+            for item in local_items.values()
+        ])
+        
+        with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="sentiment") as executor:
+            futures = {
+                i: executor.submit(_analyze_item, i, text)
+                for i, text in enumerate(reviews) if i not in local_items
+            }
+            def _stop_if_cancelled():
+                if cancel_event is not None and cancel_event.is_set():
+                    for future in futures.values():
+                        future.cancel()
+            
+            try:
+                if ordered:
+                    for i in range(len(reviews)):
+                        _stop_if_cancelled()
+                        if i in local_items:
+                            yield local_items[i]
+                        elif not futures[i].cancelled():
+                            yield futures[i].result()
+                else:
+                    yield from local_items.values()
+                    for future in as_completed(futures.values()):
+                        _stop_if_cancelled()
+                        if not future.cancelled():
+                            yield future.result()
+            finally:
+                # Si el consumidor abandona el generador, no lanzar lo pendiente
+                for future in futures.values():
+                    future.cancel()
+    
+    def _build_packs(self, items: List[Tuple[int, str]], token_budget: int) -> List[List[Tuple[int, str]]]:
+        """
+        Agrupar reseñas en paquetes que respeten el presupuesto de tokens
+        
+        Cada paquete cuenta el prompt una sola vez, más el texto de cada
+        reseña y la salida esperada por reseña. Una reseña que por sí sola
+        excede el presupuesto queda en un paquete propio.
+        
+        Args:
+            items (List[Tuple[int, str]]): Pares (índice, reseña)
+            token_budget (int): Tokens totales (entrada + salida) por petición
+            
+        Returns:
+            List[List[Tuple[int, str]]]: Paquetes de reseñas
+        """
+        base_cost = estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(PACKED_SENTIMENT_ANALYSIS_PROMPT)
+        packs = []
+        current = []
+        current_cost = base_cost
+        
+        for index, review_text in items:
+            cost = estimate_tokens(review_text) + PACK_OUTPUT_TOKENS_PER_REVIEW + 4
+            if current and (current_cost + cost > token_budget or len(current) >= PACK_MAX_REVIEWS):
+                packs.append(current)
+                current = []
+                current_cost = base_cost
+            current.append((index, review_text))
+            current_cost += cost
+        
+        if current:
+            packs.append(current)
+        return packs
+    
+    def _parse_packed_response(self, content: str, expected_ids: Iterable[int]) -> Dict[int, Dict]:
+        """
+        Separar la respuesta empaquetada en resultados por reseña
+        
+        Se intenta primero leer el array completo; si está truncado o mal
+        formado se recuperan uno a uno los objetos JSON válidos. Los que no
+        tengan "id" esperado o campos obligatorios se descartan.
+        
+        Args:
+            content (str): Respuesta de la IA
+            expected_ids (Iterable[int]): Identificadores enviados en el paquete
+            
+        Returns:
+            Dict[int, Dict]: Resultados válidos indexados por id
+        """
+        expected_ids = set(expected_ids)
+        candidates = []
+        
+        start_json = content.find('[')
+        end_json = content.rfind(']') + 1
+        try:
+            if start_json == -1 or end_json == 0:
+                raise json.JSONDecodeError("No se encontró un array JSON", content, 0)
+            parsed = json.loads(content[start_json:end_json])
+            if not isinstance(parsed, list):
+                raise json.JSONDecodeError("La respuesta no es un array", content, start_json)
+            candidates = parsed
+        except json.JSONDecodeError:
+            decoder = json.JSONDecoder()
+            position = content.find('{')
+            while position != -1:
+                try:
+                    obj, end = decoder.raw_decode(content, position)
+                    candidates.append(obj)
+                    position = content.find('{', end)
+                except json.JSONDecodeError:
+                    position = content.find('{', position + 1)
+        
+        results = {}
+        for obj in candidates:
+            if not isinstance(obj, dict):
+                continue
+            try:
+                item_id = int(obj.pop("id"))
+            except (KeyError, TypeError, ValueError):
+                continue
+            if item_id not in expected_ids:
+                continue
+            try:
+                results[item_id] = SentimentResult.from_dict(obj).to_dict()
+            except ResultParseError:
+                continue
+        return results
+    
+    def _analyze_pack(self, pack: List[Tuple[int, str]], provider: str) -> Dict[int, Dict]:
+        """
+        Analizar un paquete de reseñas en una sola petición
+        
+        Args:
+            pack (List[Tuple[int, str]]): Pares (índice, reseña)
+            provider (str): Proveedor de IA
+            
+        Returns:
+            Dict[int, Dict]: Resultados válidos indexados por índice de entrada
+        """
+        local_ids = {local_id: index for local_id, (index, _) in enumerate(pack, 1)}
+        body = "\n\n".join(f"[{local_id}] {review_text}" for local_id, (_, review_text) in enumerate(pack, 1))
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": f"{PACKED_SENTIMENT_ANALYSIS_PROMPT}\n{body}"}
+        ]
+        max_tokens = PACK_OUTPUT_TOKENS_PER_REVIEW * len(pack) + 50
+        
+        content = self._chat_completion(provider, messages, max_tokens)
+        logger.info(f"Respuesta empaquetada de {provider} recibida: {len(content)} caracteres para {len(pack)} reseñas")
+        
+        parsed = self._parse_packed_response(content, local_ids.keys())
+        return {local_ids[local_id]: result for local_id, result in parsed.items()}
+    
+    def analyze_packed(
+        self,
+        reviews: Iterable[str],
+        provider: str = "openai",
+        token_budget: int = PACK_TOKEN_BUDGET,
+        max_concurrency: int = BATCH_MAX_CONCURRENCY,
+        max_attempts: int = PACK_MAX_ATTEMPTS,
+        dedup: bool = DEDUP_ENABLED,
+        product: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Analizar muchas reseñas cortas enviando varias en cada petición
+        
+        El prompt se envía una vez por paquete en lugar de una vez por
+        reseña. Las reseñas que falten o vengan mal formadas en la respuesta
+        se reencolan en nuevos paquetes; tras `max_attempts` rondas se
+        analizan individualmente con `analyze_sentiment`.
+        
+        Args:
+            reviews (Iterable[str]): Reseñas a analizar
+            provider (str): Proveedor registrado o "auto"; con
+                "auto" se elige un único proveedor para todo el lote
+            token_budget (int): Tokens totales (entrada + salida) por petición
+            max_concurrency (int): Máximo de paquetes en vuelo
+            max_attempts (int): Rondas empaquetadas antes de ir una a una
+            dedup (bool): Analizar una sola reseña por grupo de casi duplicados
+            product (Optional[str]): Etiqueta de producto para el historial
+            
+        Returns:
+            List[Dict]: {"indice", "resena", "resultado", "error"} en el orden de
+                entrada ("duplicado_de" con `dedup`, como en `analyze_batch`)
+        """
+        reviews = list(reviews)
+        if dedup and len(reviews) > 1:
+            return list(self._analyze_deduplicated(
+                reviews,
+                lambda unique: self.analyze_packed(
+                    unique, provider, token_budget, max_concurrency, max_attempts, dedup=False, product=product
+                ),
+                ordered=True,
+                product=product
+            ))
+        if provider.lower() == "auto":
+            provider = self.router.choose([p.lower() for p in self.get_available_providers()])
+        items = [{"indice": i, "resena": text, "resultado": None, "error": None} for i, text in enumerate(reviews)]
+        pending = []
+        cache_keys = {}
+        records = []
+        
+        local_results = self._classify_locally(reviews)
+        
+        for item in items:
+            if not item["resena"].strip():
+                item["error"] = "El texto de la reseña no puede estar vacío"
+                continue
+            if local_results[item["indice"]] is not None:
+                item["resultado"] = local_results[item["indice"]]
+                records.append(self._history_record(item["resena"], item["resultado"], 0.0, product=product))
+                continue
+            key = self._cache_key(item["resena"], provider)
+            cached = self._cache_get(key, provider)
+            if cached is not None:
+                item["resultado"] = cached
+                records.append(self._history_record(item["resena"], cached, 0.0, product=product, provider=provider))
+            else:
+                cache_keys[item["indice"]] = key
+                pending.append((item["indice"], item["resena"]))
+        
+        def _tracked_pack(pack: List[Tuple[int, str]]) -> Tuple[Dict[int, Dict], Dict[str, int], float]:
+            start_time = time.perf_counter()
+            with track_usage() as usage:
+                results = self._analyze_pack(pack, provider)
+            return results, usage, time.perf_counter() - start_time
+        
+        for attempt in range(1, max_attempts + 1):
+            if not pending:
+                break
+            packs = self._build_packs(pending, token_budget)
+            logger.info(f"Ronda {attempt}: {len(pending)} reseñas en {len(packs)} paquetes con {provider}")
+            
+            workers = max(1, min(max_concurrency, len(packs)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sentiment-pack") as executor:
+                futures = {executor.submit(_tracked_pack, pack): pack for pack in packs}
+                for future in as_completed(futures):
+                    try:
+                        results, usage, latency = future.result()
+                    except Exception as e:
+                        logger.error(f"Error en paquete de {len(futures[future])} reseñas: {str(e)}")
+                        continue
+                    # Latencia y tokens del paquete se reparten entre sus reseñas
+                    share = len(futures[future])
+                    usage = {name: tokens // share for name, tokens in usage.items()}
+                    for index, result in results.items():
+                        result["proveedor"] = provider.lower()
+                        items[index]["resultado"] = result
+                        self._store_in_cache(cache_keys.get(index), result)
+                        records.append(self._history_record(
+                            items[index]["resena"], result, latency / share, usage, product, provider
+                        ))
+            
+            pending = [(index, text) for index, text in pending if items[index]["resultado"] is None]
+        
+        if pending:
+            logger.warning(f"{len(pending)} reseñas sin resultado empaquetado, analizando individualmente")
+            for item in self.analyze_batch(
+                [text for _, text in pending], provider, max_concurrency, dedup=False, product=product
+            ):
+                index = pending[item["indice"]][0]
+                items[index]["resultado"] = item["resultado"]
+                items[index]["error"] = item["error"]
+        
+        self._record_history(records)
+        return items
+    
+    def _configured_providers(self) -> list:
+        """
+        Obtener los proveedores configurados (API key o URL propia)
+        
+        Returns:
+            list: Lista de proveedores configurados
+        """
+        return [spec.label for spec in providers.values() if spec.configured]
+    
+    def get_provider_health(self) -> Dict[str, str]:
+        """
+        Obtener el estado del circuit breaker de cada proveedor configurado
+        
+        Returns:
+            Dict[str, str]: "closed", "open" o "half_open" por proveedor
+        """
+        return {provider: circuit_breakers[provider.lower()].state for provider in self._configured_providers()}
+    
+    def get_available_providers(self) -> list:
+        """
+        Obtener lista de proveedores disponibles
+        
+        Un proveedor configurado cuyo circuito está abierto no se considera
+        disponible hasta que pase a half_open.
+        
+        Returns:
+            list: Lista de proveedores configurados y sanos
+        """
+        return [
+            provider for provider, state in self.get_provider_health().items()
+            if state != CircuitBreaker.OPEN
+        ]
+
+class AsyncSentimentAnalyzer(SentimentAnalyzer):
+    """
+    Variante asíncrona del analizador basada en los clientes asíncronos de cada proveedor
+    
+    Hereda de `SentimentAnalyzer` la construcción de mensajes, el parsing
+    y el fallback; solo cambian las llamadas a los proveedores. Un semáforo
+    limita las peticiones en vuelo y cancelar la tarea que espera cancela
+    la petición HTTP subyacente.
+    """
+    
+    def __init__(
+        self,
+        max_concurrency: int = ASYNC_MAX_CONCURRENCY,
+        cache: Optional[ResponseCache] = None,
+        history: Optional[HistoryStore] = None
+    ):
+        """
+        Inicializar los clientes asíncronos de IA
+        
+        Args:
+            max_concurrency (int): Máximo de peticiones simultáneas
+            cache (Optional[ResponseCache]): Caché de respuestas; por defecto
+                la configurada en settings
+            history (Optional[HistoryStore]): Historial de análisis; por
+                defecto el configurado en settings
+        """
+        # Caché, historial, router y léxico como en el analizador síncrono;
+        # sus clientes (`self.clients`) solo se usan en los caminos síncronos
+        super().__init__(cache, history)
+        # Se crean en la primera llamada a cada proveedor
+        self.async_clients: Dict[str, object] = {}
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore = None
+        self._semaphore_loop = None
+        self._writer = None
+        self._writer_lock = threading.Lock()
+    
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Obtener el semáforo asociado al event loop actual"""
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+    
+    def _get_writer(self) -> ThreadPoolExecutor:
+        """Hilo único que guarda en caché e historial sin bloquear el event loop"""
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sentiment-writer")
+        return self._writer
+    
+    @staticmethod
+    def _in_event_loop() -> bool:
+        """Si la llamada ocurre dentro de un event loop en ejecución"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        return True
+    
+    def _store_in_cache(self, key: Optional[str], result: Dict) -> None:
+        """
+        Guardar en caché; dentro del event loop, en el hilo de escritura
+        
+        Cada escritura en SQLite bloquearía todas las corrutinas en curso,
+        así que desde el event loop se encola y no se espera.
+        """
+        if key is None:
+            return
+        if not self._in_event_loop():
+            super()._store_in_cache(key, result)
+            return
+        self._get_writer().submit(super()._store_in_cache, key, result)
+    
+    def _record_history(self, records: List[Dict]) -> None:
+        """Guardar en el historial; dentro del event loop, en el hilo de escritura"""
+        if self.history is None or not records:
+            return
+        if not self._in_event_loop():
+            super()._record_history(records)
+            return
+        self._get_writer().submit(super()._record_history, records)
+    
+    async def _acache_get(self, cache_key: Optional[str], provider: str) -> Optional[Dict]:
+        """`_cache_get` en un hilo para no bloquear el event loop"""
+        if cache_key is None:
+            return None
+        return await asyncio.to_thread(self._cache_get, cache_key, provider)
+    
+    async def _acached_result(self, review_text: str, providers: List[str]) -> Optional[Dict]:
+        """`_cached_result` en un hilo para no bloquear el event loop"""
+        if self.cache is None:
+            return None
+        return await asyncio.to_thread(self._cached_result, review_text, providers)
+    
+    def flush(self) -> None:
+        """Esperar a que terminen las escrituras encoladas en caché e historial"""
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.shutdown(wait=True)
+    
+    def _resolve_async_client(self, provider: str) -> Tuple[object, str]:
+        """Versión asíncrona de `_resolve_client`"""
+        spec = get_provider(provider)
+        if not spec.configured:
+            raise ValueError(f"{spec.label} no está configurado correctamente")
+        client = self.async_clients.get(spec.name)
+        if client is None:
+            try:
+                client = self.async_clients[spec.name] = spec.create_async_client()
+                logger.info(f"Cliente asíncrono {spec.label} inicializado correctamente")
+            except Exception as e:
+                logger.error(f"Error inicializando {spec.label} asíncrono: {str(e)}")
+                raise ValueError(f"{spec.label} no está configurado correctamente")
+        return client, spec.model
+    
+    async def _achat_completion(self, provider: str, messages: List[Dict], max_tokens: int, json_mode: bool = False) -> str:
+        """
+        Versión asíncrona de `_chat_completion` con los clientes asíncronos
+        
+        Args:
+            provider (str): Proveedor registrado ("openai", "groq", "local"...)
+            messages (List[Dict]): Mensajes del chat
+            max_tokens (int): Máximo de tokens de la respuesta
+            json_mode (bool): Pedir salida JSON estructurada al proveedor
+            
+        Returns:
+            str: Contenido de la respuesta
+        """
+        provider = provider.lower()
+        client, model = self._resolve_async_client(provider)
+        
+        extra_params = {"response_format": {"type": "json_object"}} if json_mode and providers[provider].json_mode else {}
+        limiter = rate_limiters[provider]
+        start_time = time.perf_counter()
+        queue_time = 0.0
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                _check_circuit(provider)
+            except CircuitOpenError as e:
+                _record_call(provider, time.perf_counter() - start_time, queue_time, error=e)
+                raise
+            # Una cancelación (p. ej. un timeout del llamador) puede llegar
+            # esperando al limitador, a la respuesta o al reintento; si aún no
+            # hay veredicto hay que liberar la sonda half_open reservada
+            probe_pending = True
+            try:
+                queue_time += await limiter.aacquire(estimate_request_tokens(messages, max_tokens))
+                try:
+                    raw_response = await client.chat.completions.with_raw_response.create(
+                        model=model,
+                        messages=messages,
+                        temperature=MODEL_TEMPERATURE,
+                        max_tokens=max_tokens,
+                        **extra_params
+                    )
+                    break
+                except Exception as e:
+                    error = _translate_provider_error(provider, e)
+                    probe_pending = False
+                    delay = _retry_delay(provider, error, attempt)
+                    if delay is None:
+                        _record_call(provider, time.perf_counter() - start_time, queue_time, error=error)
+                        raise error
+                    retries_total.inc(provider=provider)
+                    await asyncio.sleep(delay)
+            except BaseException:
+                if probe_pending:
+                    circuit_breakers[provider].release()
+                raise
+        
+        circuit_breakers[provider].record_success()
+        limiter.observe(raw_response.headers)
+        response = raw_response.parse()
+        if inspect.isawaitable(response):
+            # El SDK de OpenAI devuelve una respuesta "legacy" con parse()
+            # síncrono; el de Groq, una AsyncAPIResponse con parse() asíncrono
+            response = await response
+        _record_call(provider, time.perf_counter() - start_time, queue_time, _usage_tokens(response.usage))
+        return response.choices[0].message.content
+    
+    async def aanalyze_with_provider(self, review_text: str, provider: str) -> Dict:
+        """
+        Analizar sentimiento con un proveedor registrado de forma asíncrona
+        
+        Args:
+            review_text (str): Texto de la reseña a analizar
+            provider (str): Proveedor registrado ("openai", "groq", "local"...)
+            
+        Returns:
+            Dict: Resultado del análisis de sentimientos
+        """
+        spec = get_provider(provider)
+        self._resolve_async_client(spec.name)
+        
+        try:
+            content = await self._achat_completion(
+                spec.name, self._build_messages(review_text), MODEL_MAX_TOKENS, json_mode=STRUCTURED_OUTPUT_ENABLED
+            )
+            logger.info(f"Respuesta de {spec.label} recibida: {len(content)} caracteres")
+            
+            return self._parse_ai_response(content)
+            
+        except (ProviderRateLimitError, CircuitOpenError) as e:
+            logger.warning(f"{spec.label} no disponible: {str(e)}")
+            raise type(e)(f"Error procesando con {spec.label}: {str(e)}")
+        except Exception as e:
+            logger.error(f"Error en análisis con {spec.label}: {str(e)}")
+            raise Exception(f"Error procesando con {spec.label}: {str(e)}")
+    
+    async def aanalyze_with_openai(self, review_text: str) -> Dict:
+        """Analizar sentimiento usando OpenAI GPT de forma asíncrona (ver `aanalyze_with_provider`)"""
+        return await self.aanalyze_with_provider(review_text, "openai")
+    
+    async def aanalyze_with_groq(self, review_text: str) -> Dict:
+        """Analizar sentimiento usando Groq de forma asíncrona (ver `aanalyze_with_provider`)"""
+        return await self.aanalyze_with_provider(review_text, "groq")
+    
+    async def aanalyze_sentiment(
+        self,
+        review_text: str,
+        provider: str = "openai",
+        use_lexicon: bool = True,
+        product: Optional[str] = None
+    ) -> Dict:
+        """
+        Método principal asíncrono para análisis de sentimientos
+        
+        Args:
+            review_text (str): Texto de la reseña
+            provider (str): Proveedor registrado o "auto"
+            use_lexicon (bool): Probar antes el pre-clasificador local
+            product (Optional[str]): Etiqueta de producto para el historial
+            
+        Returns:
+            Dict: Resultado del análisis; "proveedor" indica quién respondió
+                ("lexico" si lo resolvió el pre-clasificador local)
+        """
+        start_time = time.perf_counter()
+        with track_usage() as usage:
+            result = await self._aanalyze_sentiment(review_text, provider, use_lexicon)
+        self._record_history([
+            self._history_record(review_text, result, time.perf_counter() - start_time, usage, product)
+        ])
+        return result
+    
+    async def _aanalyze_sentiment(self, review_text: str, provider: str, use_lexicon: bool) -> Dict:
+        """Análisis de `aanalyze_sentiment` sin guardarlo en el historial"""
+        if not review_text.strip():
+            raise ValueError("El texto de la reseña no puede estar vacío")
+        
+        if use_lexicon:
+            local_result = self._classify_locally([review_text])[0]
+            if local_result is not None:
+                return local_result
+        
+        if provider.lower() == "auto":
+            return await self._aanalyze_auto(review_text)
+        
+        cache_key = self._cache_key(review_text, provider)
+        cached = await self._acache_get(cache_key, provider)
+        if cached is not None:
+            return cached
+        
+        if self._is_long_review(review_text):
+            # Cada fragmento toma su propio hueco del semáforo
+            result = await self._aanalyze_long(review_text, provider.lower())
+            result["proveedor"] = provider.lower()
+            self._store_in_cache(cache_key, result)
+            return result
+        
+        async with self._get_semaphore():
+            logger.info(f"Iniciando análisis con {provider} para texto de {len(review_text)} caracteres")
+            start_time = time.perf_counter()
+            try:
+                result = await self.aanalyze_with_provider(review_text, provider)
+            except Exception:
+                if provider.lower() in providers:
+                    self.router.record(provider, time.perf_counter() - start_time, False)
+                raise
+            self.router.record(provider, time.perf_counter() - start_time, True)
+        
+        result["proveedor"] = provider.lower()
+        self._store_in_cache(cache_key, result)
+        return result
+    
+    async def _aanalyze_chunk(self, chunk: str, provider: str) -> Dict:
+        """Versión asíncrona de `_analyze_chunk`"""
+        async with self._get_semaphore():
+            try:
+                content = await self._achat_completion(
+                    provider, self._build_messages(chunk), LONG_REVIEW_CHUNK_OUTPUT_TOKENS,
+                    json_mode=STRUCTURED_OUTPUT_ENABLED
+                )
+            except (ProviderRateLimitError, CircuitOpenError) as e:
+                raise type(e)(f"Error procesando con {provider}: {str(e)}")
+            except Exception as e:
+                raise Exception(f"Error procesando con {provider}: {str(e)}")
+        return self._parse_ai_response(content)
+    
+    async def _aanalyze_long(self, review_text: str, provider: str) -> Dict:
+        """
+        Versión asíncrona de `_analyze_long`
+        
+        Args:
+            review_text (str): Texto de la reseña
+            provider (str): Proveedor registrado
+            
+        Returns:
+            Dict: Resultado combinado
+        """
+        self._resolve_async_client(provider)
+        chunks = self._chunk_review(review_text)
+        outcomes = await asyncio.gather(
+            *(self._aanalyze_chunk(chunk, provider) for chunk in chunks), return_exceptions=True
+        )
+        results = [None if isinstance(outcome, BaseException) else outcome for outcome in outcomes]
+        errors = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+        
+        merged, summary_messages = self._merge_chunk_results(chunks, results, errors)
+        if summary_messages:
+            try:
+                async with self._get_semaphore():
+                    content = await self._achat_completion(provider, summary_messages, LONG_REVIEW_SUMMARY_TOKENS)
+                merged["resumen"] = content.strip()
+            except Exception as e:
+                logger.warning(f"No se pudo unificar el resumen ({str(e)}), se usan los resúmenes por fragmento")
+        return merged
+    
+    async def _aanalyze_auto(self, review_text: str) -> Dict:
+        """
+        Versión asíncrona del enrutado automático con cobertura
+        
+        A diferencia de la versión síncrona, la petición perdedora se cancela.
+        
+        Args:
+            review_text (str): Texto de la reseña
+            
+        Returns:
+            Dict: Resultado del análisis con el proveedor que respondió
+        """
+        candidates = [p.lower() for p in self.get_available_providers()]
+        if not candidates:
+            raise ValueError("No hay proveedores de IA configurados")
+        
+        cached = await self._acached_result(review_text, candidates)
+        if cached is not None:
+            return cached
+        
+        primary = self.router.choose(candidates)
+        others = [p for p in candidates if p != primary]
+        logger.info(f"Enrutado automático hacia {primary}")
+        
+        if not others:
+            return await self._aanalyze_sentiment(review_text, primary, use_lexicon=False)
+        
+        tasks = {asyncio.ensure_future(self._aanalyze_sentiment(review_text, primary, use_lexicon=False)): primary}
+        try:
+            if ROUTER_HEDGE_ENABLED:
+                deadline = self.router.hedge_deadline(primary)
+                done, _ = await asyncio.wait(tasks, timeout=deadline)
+            else:
+                done, _ = await asyncio.wait(tasks)
+            
+            if not done or next(iter(done)).exception() is not None:
+                logger.info(f"Cobertura: lanzando {others[0]} sin respuesta válida de {primary}")
+                tasks[asyncio.ensure_future(
+                    self._aanalyze_sentiment(review_text, others[0], use_lexicon=False)
+                )] = others[0]
+            
+            errors = []
+            for next_done in asyncio.as_completed(list(tasks)):
+                try:
+                    return await next_done
+                except Exception as e:
+                    errors.append(str(e))
+            raise Exception(f"Todos los proveedores fallaron: {'; '.join(errors)}")
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def aanalyze_batch(
+        self,
+        reviews: Iterable[str],
+        provider: str = "openai",
+        dedup: bool = DEDUP_ENABLED,
+        product: Optional[str] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        Analizar varias reseñas concurrentemente dentro del event loop
+        
+        Los elementos tienen la misma forma que en `analyze_batch` y se
+        entregan a medida que se completan. Si el consumidor deja de iterar
+        o se cancela, las tareas pendientes se cancelan.
+        
+        Args:
+            reviews (Iterable[str]): Reseñas a analizar
+            provider (str): Proveedor registrado
+            dedup (bool): Analizar una sola reseña por grupo de casi duplicados
+            product (Optional[str]): Etiqueta de producto para el historial
+            
+        Yields:
+            Dict: {"indice", "resena", "resultado", "error", "latencia"} por
+                cada reseña ("duplicado_de" con `dedup`)
+        """
+        async def _analyze_item(index: int, review_text: str) -> Dict:
+            item = {"indice": index, "resena": review_text, "resultado": None, "error": None}
+            start_time = time.perf_counter()
+            try:
+                item["resultado"] = await self.aanalyze_sentiment(
+                    review_text, provider, use_lexicon=False, product=product
+                )
+            except Exception as e:
+                item["error"] = str(e)
+            item["latencia"] = time.perf_counter() - start_time
+            return item
+        
+        reviews = list(reviews)
+        if dedup and len(reviews) > 1:
+            # Agrupar es CPU: en un hilo para no bloquear el event loop
+            groups = await asyncio.get_running_loop().run_in_executor(None, self._group_duplicates, reviews)
+            unique = list(groups)
+            items = self.aanalyze_batch([reviews[i] for i in unique], provider, dedup=False, product=product)
+            try:
+                async for item in items:
+                    for expanded in self._expand_duplicates(item, unique, groups, reviews, product):
+                        yield expanded
+            finally:
+                await items.aclose()
+            return
+        
+        local_results = self._classify_locally(reviews)
+        self._record_history([
+            self._history_record(reviews[i], result, 0.0, product=product)
+            for i, result in enumerate(local_results) if result is not None
+        ])
+        for i, result in enumerate(local_results):
+            if result is not None:
+                yield {"indice": i, "resena": reviews[i], "resultado": result, "error": None, "latencia": 0.0}
+        
+        tasks = [
+            asyncio.ensure_future(_analyze_item(i, text))
+            for i, text in enumerate(reviews) if local_results[i] is None
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+# Instancia global del analizador, creada en el primer uso (ver get_analyzer)
+_analyzer: Optional[SentimentAnalyzer] = None
+_analyzer_lock = threading.Lock()
+
+def get_analyzer() -> SentimentAnalyzer:
+    """
+    Obtener la instancia global del analizador
+    
+    Se crea en la primera llamada para que importar el módulo no abra la
+    caché ni prepare nada que una ejecución concreta quizá no use.
+    
+    Returns:
+        SentimentAnalyzer: Instancia compartida por todo el proceso
+    """
+    global _analyzer
+    if _analyzer is None:
+        with _analyzer_lock:
+            if _analyzer is None:
+                _analyzer = SentimentAnalyzer()
+    return _analyzer
+
+def __getattr__(name: str):
+    # Compatibilidad con `from utils.ai_analyzer import analyzer`
+    if name == "analyzer":
+        return get_analyzer()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def _collect_circuit_state():
+    """Estado de cada circuito: 0 cerrado, 1 sondeando, 2 abierto"""
+    levels = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+    return [
+        ("sentiment_circuit_state", {"provider": provider}, levels[breaker.state])
+        for provider, breaker in circuit_breakers.items()
+    ]
+
+def _collect_cache_entries():
+    """Entradas en la caché del analizador global (si ya existe)"""
+    if _analyzer is None or _analyzer.cache is None:
+        return []
+    return [("sentiment_cache_entries", {}, _analyzer.cache.stats()["entries"])]
+
+def _collect_cache_hit_ratio():
+    """Tasa de aciertos de la caché del analizador global (si ya existe)"""
+    if _analyzer is None or _analyzer.cache is None:
+        return []
+    return [("sentiment_cache_hit_ratio", {}, _analyzer.cache.stats()["hit_rate"])]
+
+def _collect_router_latency():
+    """Latencia p95 de la ventana del router por proveedor"""
+    if _analyzer is None:
+        return []
+    return [
+        ("sentiment_router_p95_seconds", {"provider": provider}, stats["p95"])
+        for provider, stats in _analyzer.router.snapshot().items()
+        if stats["p95"] is not None
+    ]
+
+registry.register_collector(
+    "sentiment_circuit_state", "Estado del circuit breaker (0 cerrado, 1 half_open, 2 abierto)", _collect_circuit_state
+)
+registry.register_collector("sentiment_cache_entries", "Entradas en la caché de respuestas", _collect_cache_entries)
+registry.register_collector(
+    "sentiment_cache_hit_ratio", "Tasa de aciertos de la caché de respuestas", _collect_cache_hit_ratio
+)
+registry.register_collector(
+    "sentiment_router_p95_seconds", "Latencia p95 reciente vista por el router", _collect_router_latency
+)
@@ -0,0 +1,298 @@
+"""
+Servicio HTTP (ASGI) de análisis de sentimientos
+
+Uso:
+    python -m utils.api --port 8000
+    uvicorn utils.api:app --port 8000
+
+Endpoints:
+    POST /analyze        {"review": "...", "provider": "auto", "product": null}
+    POST /analyze/batch  {"reviews": ["..."], "provider": "auto", "product": null, "dedup": true}
+                         Respuesta NDJSON: una línea por reseña a medida que se completa
+    GET  /health         Proveedores y peticiones en curso
+    GET  /metrics        Métricas en formato Prometheus
+
+Usa `AsyncSentimentAnalyzer`, así que un solo proceso atiende muchas
+peticiones sin un hilo por cada una; el semáforo del analizador limita las
+llamadas simultáneas a los proveedores. Delante hay un cupo de peticiones
+en curso: sin hueco libre se responde 429 de inmediato (con Retry-After) en
+lugar de encolar, para que el cliente o el balanceador reparta la carga.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from config.settings import (
+    API_BATCH_MAX_REVIEWS,
+    API_DEFAULT_PROVIDER,
+    API_HOST,
+    API_MAX_CONCURRENT_REQUESTS,
+    API_PORT,
+    API_REQUEST_TIMEOUT_SECONDS,
+    DEDUP_ENABLED,
+)
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+api_requests_total = registry.counter("sentiment_api_requests_total", "Peticiones HTTP por endpoint y código")
+api_request_duration = registry.histogram(
+    "sentiment_api_request_duration_seconds", "Duración de las peticiones HTTP (hasta la última línea en NDJSON)"
+)
+
+
+class RequestGate:
+    """
+    Cupo de peticiones en curso sin cola de espera
+
+    Todas las peticiones se atienden en el mismo event loop, así que el
+    contador no necesita lock.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.in_flight = 0
+
+    def try_acquire(self) -> bool:
+        """Ocupar un hueco; False si no queda ninguno"""
+        if self.in_flight >= self.limit:
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self) -> None:
+        """Liberar un hueco"""
+        self.in_flight -= 1
+
+
+class ApiError(Exception):
+    """Error de la petición con su código HTTP"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _error_response(status: int, message: str, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    return JSONResponse({"error": message}, status_code=status, headers=headers)
+
+
+async def _read_json(request: Request) -> Dict:
+    """Cuerpo JSON de la petición (un objeto)"""
+    try:
+        body = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise ApiError(400, "El cuerpo debe ser JSON válido")
+    if not isinstance(body, dict):
+        raise ApiError(400, "El cuerpo debe ser un objeto JSON")
+    return body
+
+
+def _product(body: Dict) -> Optional[str]:
+    """Etiqueta de producto opcional del cuerpo"""
+    product = body.get("product")
+    if product is not None and not isinstance(product, str):
+        raise ApiError(400, "'product' debe ser un texto")
+    return product or None
+
+
+def create_app(
+    analyzer=None,
+    max_concurrent_requests: int = API_MAX_CONCURRENT_REQUESTS,
+    request_timeout: float = API_REQUEST_TIMEOUT_SECONDS,
+    batch_max_reviews: int = API_BATCH_MAX_REVIEWS
+) -> Starlette:
+    """
+    Crear la aplicación ASGI
+
+    Args:
+        analyzer: Instancia de AsyncSentimentAnalyzer; por defecto se crea
+            una al arrancar el servidor
+        max_concurrent_requests (int): Peticiones en curso antes de responder 429
+            (un lote ocupa un solo hueco mientras se transmite)
+        request_timeout (float): Segundos máximos por petición (504 o, en
+            NDJSON, una última línea con el error)
+        batch_max_reviews (int): Reseñas máximas por lote (413 si se supera)
+
+    Returns:
+        Starlette: Aplicación lista para uvicorn
+    """
+    gate = RequestGate(max_concurrent_requests)
+    state = {"analyzer": analyzer}
+
+    def _resolve_provider(body: Dict) -> str:
+        provider = body.get("provider") or API_DEFAULT_PROVIDER
+        if not isinstance(provider, str):
+            raise ApiError(400, "'provider' debe ser un texto")
+        available = [name.lower() for name in state["analyzer"].get_available_providers()]
+        if not available:
+            raise ApiError(503, "No hay proveedores de IA disponibles")
+        if provider.lower() != "auto" and provider.lower() not in available:
+            raise ApiError(400, f"Proveedor no disponible: {provider} (disponibles: auto, {', '.join(available)})")
+        return provider.lower()
+
+    def _saturated(endpoint: str) -> JSONResponse:
+        api_requests_total.inc(endpoint=endpoint, status="429")
+        return _error_response(429, "Servicio saturado, reintenta más tarde", {"Retry-After": "1"})
+
+    async def analyze(request: Request) -> Response:
+        if not gate.try_acquire():
+            return _saturated("/analyze")
+        start_time = time.perf_counter()
+        status = 200
+        try:
+            body = await _read_json(request)
+            review = body.get("review")
+            if not isinstance(review, str) or not review.strip():
+                raise ApiError(400, "'review' debe ser un texto no vacío")
+            provider = _resolve_provider(body)
+            product = _product(body)
+            try:
+                result = await asyncio.wait_for(
+                    state["analyzer"].aanalyze_sentiment(review, provider, product=product),
+                    request_timeout
+                )
+            except asyncio.TimeoutError:
+                raise ApiError(504, f"El análisis superó {request_timeout:g}s")
+            except ValueError as e:
+                raise ApiError(400, str(e))
+            except Exception as e:
+                logger.error(f"Error en /analyze: {str(e)}")
+                raise ApiError(502, str(e))
+            return JSONResponse(result)
+        except ApiError as e:
+            status = e.status
+            return _error_response(e.status, str(e))
+        finally:
+            gate.release()
+            api_requests_total.inc(endpoint="/analyze", status=str(status))
+            api_request_duration.observe(time.perf_counter() - start_time, endpoint="/analyze")
+
+    async def analyze_batch(request: Request) -> Response:
+        if not gate.try_acquire():
+            return _saturated("/analyze/batch")
+        start_time = time.perf_counter()
+        try:
+            body = await _read_json(request)
+            reviews = body.get("reviews")
+            if not isinstance(reviews, list) or not all(isinstance(review, str) for review in reviews):
+                raise ApiError(400, "'reviews' debe ser una lista de textos")
+            if not reviews:
+                raise ApiError(400, "'reviews' no puede estar vacía")
+            if len(reviews) > batch_max_reviews:
+                raise ApiError(413, f"Máximo {batch_max_reviews} reseñas por lote")
+            provider = _resolve_provider(body)
+            dedup = body.get("dedup", DEDUP_ENABLED)
+            if not isinstance(dedup, bool):
+                raise ApiError(400, "'dedup' debe ser true o false")
+            product = _product(body)
+        except ApiError as e:
+            gate.release()
+            api_requests_total.inc(endpoint="/analyze/batch", status=str(e.status))
+            return _error_response(e.status, str(e))
+
+        async def _lines() -> AsyncIterator[bytes]:
+            items = state["analyzer"].aanalyze_batch(reviews, provider, dedup=dedup, product=product)
+            deadline = time.monotonic() + request_timeout
+            sent = 0
+            try:
+                while True:
+                    try:
+                        item = await asyncio.wait_for(items.__anext__(), max(0.0, deadline - time.monotonic()))
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        yield _ndjson({
+                            "error": f"El lote superó {request_timeout:g}s",
+                            "pendientes": len(reviews) - sent
+                        })
+                        break
+                    sent += 1
+                    yield _ndjson(item)
+            finally:
+                # Si el cliente se desconecta, cerrar el lote cancela las reseñas pendientes
+                await items.aclose()
+                gate.release()
+                api_requests_total.inc(endpoint="/analyze/batch", status="200")
+                api_request_duration.observe(time.perf_counter() - start_time, endpoint="/analyze/batch")
+
+        return StreamingResponse(_lines(), media_type="application/x-ndjson")
+
+    async def health(request: Request) -> Response:
+        analyzer = state["analyzer"]
+        return JSONResponse({
+            "proveedores": analyzer.get_provider_health(),
+            "disponibles": analyzer.get_available_providers(),
+            "peticiones_en_curso": gate.in_flight,
+            "max_peticiones": gate.limit,
+        })
+
+    async def metrics(request: Request) -> Response:
+        return PlainTextResponse(registry.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette):
+        if state["analyzer"] is None:
+            from utils.ai_analyzer import AsyncSentimentAnalyzer
+            state["analyzer"] = AsyncSentimentAnalyzer()
+        registry.register_collector(
+            "sentiment_api_requests_in_flight",
+            "Peticiones HTTP en curso",
+            lambda: [("sentiment_api_requests_in_flight", {}, gate.in_flight)]
+        )
+        logger.info(
+            f"API lista: máximo {gate.limit} peticiones en curso, límite de {request_timeout:g}s por petición"
+        )
+        yield
+        # Caché e historial se escriben en un hilo aparte: no perder lo encolado
+        await asyncio.to_thread(state["analyzer"].flush)
+
+    return Starlette(
+        routes=[
+            Route("/analyze", analyze, methods=["POST"]),
+            Route("/analyze/batch", analyze_batch, methods=["POST"]),
+            Route("/health", health, methods=["GET"]),
+            Route("/metrics", metrics, methods=["GET"]),
+        ],
+        lifespan=lifespan,
+    )
+
+
+def _ndjson(payload: Dict) -> bytes:
+    """Una línea NDJSON"""
+    return (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+app = create_app()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Arrancar el servicio con uvicorn"""
+    parser = argparse.ArgumentParser(description="Servicio HTTP de análisis de sentimientos")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--max-concurrent", type=int, default=API_MAX_CONCURRENT_REQUESTS, help="Peticiones en curso antes de responder 429")
+    parser.add_argument("--timeout", type=float, default=API_REQUEST_TIMEOUT_SECONDS, help="Segundos máximos por petición")
+    args = parser.parse_args(argv)
+
+    try:
+        import uvicorn
+    except ImportError:
+        raise ImportError("El servicio HTTP requiere uvicorn: pip install uvicorn")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    uvicorn.run(create_app(max_concurrent_requests=args.max_concurrent, request_timeout=args.timeout), host=args.host, port=args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
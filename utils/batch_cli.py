@@ -0,0 +1,326 @@
+"""
+Línea de comandos para análisis masivo de reseñas desde archivos CSV/JSONL
+
+Uso:
+    python -m utils.batch_cli entrada.csv salida.jsonl --column review
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from itertools import islice
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from config.settings import BATCH_MAX_CONCURRENCY, DEDUP_NUM_PERM, DEDUP_SHINGLE_SIZE, DEDUP_THRESHOLD
+from utils.dedup import NearDuplicateIndex
+
+
+def iter_reviews(input_path: str, column: str) -> Iterator[str]:
+    """
+    Leer reseñas de un archivo CSV o JSONL sin cargarlo completo en memoria
+
+    Args:
+        input_path (str): Ruta del archivo de entrada
+        column (str): Columna (CSV) o clave (JSONL) con el texto de la reseña
+
+    Yields:
+        str: Texto de cada reseña, en orden de aparición; las líneas JSONL
+            inválidas o que no son un objeto dan una reseña vacía, que se
+            escribe como fila con error sin detener la ejecución
+    """
+    if input_path.lower().endswith((".jsonl", ".ndjson")):
+        with open(input_path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    record = None
+                if not isinstance(record, dict):
+                    print(f"Línea {line_number}: no es un objeto JSON, se trata como reseña vacía", file=sys.stderr)
+                    yield ""
+                    continue
+                yield str(record.get(column) or "")
+    else:
+        csv.field_size_limit(sys.maxsize)
+        with open(input_path, encoding="utf-8-sig", newline="") as f:
+            reader = csv.DictReader(f)
+            if column not in (reader.fieldnames or []):
+                raise ValueError(f"La columna '{column}' no existe en {input_path}")
+            for row in reader:
+                yield row.get(column) or ""
+
+
+def load_checkpoint(checkpoint_path: str, input_path: str) -> Tuple[int, int]:
+    """
+    Leer el punto de control de una ejecución anterior
+
+    Args:
+        checkpoint_path (str): Ruta del archivo de control
+        input_path (str): Archivo de entrada de la ejecución actual
+
+    Returns:
+        Tuple[int, int]: Filas ya procesadas y bytes válidos en la salida
+    """
+    if not os.path.exists(checkpoint_path):
+        return 0, 0
+    with open(checkpoint_path, encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("input") != os.path.abspath(input_path):
+        raise ValueError(f"El punto de control {checkpoint_path} pertenece a otro archivo de entrada")
+    return state["rows_done"], state["output_bytes"]
+
+
+def save_checkpoint(checkpoint_path: str, input_path: str, rows_done: int, output_bytes: int) -> None:
+    """Guardar el punto de control de forma atómica"""
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "input": os.path.abspath(input_path),
+            "rows_done": rows_done,
+            "output_bytes": output_bytes
+        }, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, checkpoint_path)
+
+
+class RunDuplicates:
+    """
+    Grupos de casi duplicados de toda la ejecución, no solo de cada bloque
+
+    Las reseñas de plantilla se repiten a lo largo de exportaciones de
+    millones de filas: un único `NearDuplicateIndex` recibe todas las filas
+    en orden (su posición es el número de fila) y solo las que abren un
+    grupo nuevo se analizan. Del resto se copia el resultado del
+    representante, que se relee de la salida por su desplazamiento en bytes
+    en lugar de guardarlo en memoria.
+    """
+
+    def __init__(self):
+        self.index = NearDuplicateIndex(DEDUP_THRESHOLD, DEDUP_NUM_PERM, DEDUP_SHINGLE_SIZE)
+        # Fila de cada representante -> byte donde empieza su registro en la salida
+        self.offsets: Dict[int, int] = {}
+
+    def restore(self, out: BinaryIO, output_bytes: int, batch_size: int = 1024) -> int:
+        """
+        Reconstruir el índice con los registros ya escritos (al reanudar)
+
+        Args:
+            out (BinaryIO): Archivo de salida abierto en lectura
+            output_bytes (int): Bytes válidos según el punto de control
+            batch_size (int): Registros que se añaden al índice a la vez
+
+        Returns:
+            int: Filas reconstruidas
+        """
+        out.seek(0)
+        texts: List[str] = []
+        offsets: List[int] = []
+        while out.tell() < output_bytes:
+            offsets.append(out.tell())
+            texts.append(json.loads(out.readline())["resena"])
+            if len(texts) >= batch_size:
+                self._restore_batch(texts, offsets)
+                texts, offsets = [], []
+        self._restore_batch(texts, offsets)
+        return len(self.index)
+
+    def _restore_batch(self, texts: List[str], offsets: List[int]) -> None:
+        first_row = len(self.index)
+        for position, representative in enumerate(self.index.add_many(texts)):
+            if representative == first_row + position:
+                self.offsets[representative] = offsets[position]
+
+    def assign(self, chunk: List[str]) -> List[int]:
+        """Fila del representante de cada reseña del bloque (la suya si abre un grupo)"""
+        return self.index.add_many(chunk)
+
+    def lookup(self, out: BinaryIO, row: int) -> Dict:
+        """Releer de la salida el registro de un representante ya escrito"""
+        position = out.tell()
+        out.seek(self.offsets[row])
+        record = json.loads(out.readline())
+        out.seek(position)
+        return record
+
+
+def analyze_chunk(
+    analyzer,
+    reviews: List[str],
+    provider: str,
+    concurrency: int,
+    packed: bool,
+    dedup: bool = True,
+    product: Optional[str] = None
+) -> List[Dict]:
+    """
+    Analizar un bloque de reseñas manteniendo el orden de entrada
+
+    Args:
+        analyzer: Instancia de SentimentAnalyzer
+        reviews (List[str]): Reseñas del bloque
+        provider (str): Proveedor de IA
+        concurrency (int): Peticiones simultáneas
+        packed (bool): Usar el modo empaquetado
+        dedup (bool): Analizar una sola reseña por grupo de casi duplicados del bloque
+            (`run` deduplica la ejecución completa con `RunDuplicates` y lo desactiva)
+        product (Optional[str]): Etiqueta de producto para el historial
+
+    Returns:
+        List[Dict]: {"indice", "resena", "resultado", "error"} por reseña
+    """
+    if packed:
+        return analyzer.analyze_packed(reviews, provider, max_concurrency=concurrency, dedup=dedup, product=product)
+    return list(analyzer.analyze_batch(
+        reviews, provider, max_concurrency=concurrency, ordered=True, dedup=dedup, product=product
+    ))
+
+
+def run(args: argparse.Namespace) -> int:
+    """
+    Ejecutar el análisis masivo con escritura incremental y reanudación
+
+    Args:
+        args (argparse.Namespace): Argumentos de la línea de comandos
+
+    Returns:
+        int: Código de salida del proceso
+    """
+    from utils.ai_analyzer import get_analyzer
+
+    analyzer = get_analyzer()
+    checkpoint_path = f"{args.output}.checkpoint"
+    if args.no_resume and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    rows_done, output_bytes = load_checkpoint(checkpoint_path, args.input)
+    if rows_done:
+        print(f"Reanudando desde la fila {rows_done}", file=sys.stderr)
+
+    reviews = iter_reviews(args.input, args.column)
+    skipped = sum(1 for _ in islice(reviews, rows_done))
+    if skipped < rows_done:
+        print("El archivo de entrada tiene menos filas que el punto de control", file=sys.stderr)
+        return 1
+
+    if rows_done and not os.path.exists(args.output):
+        print(f"Falta el archivo de salida {args.output}; usa --no-resume para empezar de cero", file=sys.stderr)
+        return 1
+
+    mode = "r+b" if rows_done else "w+b"
+    start_time = time.perf_counter()
+    processed = 0
+    errors = 0
+    reused = 0
+
+    with open(args.output, mode) as out:
+        duplicates = None
+        if not args.no_dedup:
+            duplicates = RunDuplicates()
+            if rows_done:
+                restored = duplicates.restore(out, output_bytes)
+                if restored != rows_done:
+                    print(f"La salida tiene {restored} filas y el punto de control {rows_done}", file=sys.stderr)
+                    return 1
+
+        # Descartar lo escrito después del último punto de control
+        out.seek(output_bytes)
+        out.truncate()
+
+        while True:
+            chunk = list(islice(reviews, args.chunk_size))
+            if not chunk:
+                break
+
+            if duplicates is not None:
+                representatives = duplicates.assign(chunk)
+            else:
+                representatives = list(range(rows_done, rows_done + len(chunk)))
+            new_rows = [i for i, representative in enumerate(representatives) if representative == rows_done + i]
+            items = analyze_chunk(
+                analyzer, [chunk[i] for i in new_rows], args.provider, args.concurrency, args.packed, False, args.product
+            ) if new_rows else []
+            analyzed = {rows_done + new_rows[item["indice"]]: item for item in items}
+
+            copies = []
+            for i, representative in enumerate(representatives):
+                row = rows_done + i
+                if representative == row:
+                    item = analyzed[row]
+                    record = {"fila": row, "resena": chunk[i], "resultado": item["resultado"], "error": item["error"]}
+                    if duplicates is not None:
+                        duplicates.offsets[row] = out.tell()
+                else:
+                    source = analyzed.get(representative) or duplicates.lookup(out, representative)
+                    record = {
+                        "fila": row,
+                        "resena": chunk[i],
+                        "resultado": source["resultado"],
+                        "error": source["error"],
+                        "duplicado_de": representative
+                    }
+                    copies.append((chunk[i], source["resultado"]))
+                errors += record["error"] is not None
+                out.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+            analyzer.record_copies(copies, args.product)
+            reused += len(copies)
+            out.flush()
+            os.fsync(out.fileno())
+
+            rows_done += len(chunk)
+            processed += len(chunk)
+            save_checkpoint(checkpoint_path, args.input, rows_done, out.tell())
+
+            elapsed = time.perf_counter() - start_time
+            print(
+                f"Filas: {rows_done} | errores: {errors} | duplicadas: {reused} | {processed / elapsed:.2f} reseñas/s",
+                file=sys.stderr
+            )
+
+    elapsed = time.perf_counter() - start_time
+    rate = processed / elapsed if elapsed else 0.0
+    print(f"Completado: {processed} reseñas en {elapsed:.1f}s ({rate:.2f} reseñas/s), {errors} errores", file=sys.stderr)
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Construir el parser de argumentos de la línea de comandos"""
+    parser = argparse.ArgumentParser(
+        prog="python -m utils.batch_cli",
+        description="Análisis masivo de sentimientos para archivos CSV o JSONL"
+    )
+    parser.add_argument("input", help="Archivo de entrada (.csv o .jsonl)")
+    parser.add_argument("output", help="Archivo de salida (.jsonl)")
+    parser.add_argument("--column", default="review", help="Columna o clave con el texto de la reseña")
+    parser.add_argument(
+        "--provider", type=str.lower, default="openai", help="Proveedor registrado (openai, groq, local...) o auto"
+    )
+    parser.add_argument("--chunk-size", type=int, default=200, help="Reseñas por bloque de escritura")
+    parser.add_argument("--concurrency", type=int, default=BATCH_MAX_CONCURRENCY, help="Peticiones simultáneas")
+    parser.add_argument("--packed", action="store_true", help="Enviar varias reseñas por petición")
+    parser.add_argument(
+        "--no-dedup", action="store_true", help="Analizar también las reseñas casi duplicadas de otras filas"
+    )
+    parser.add_argument("--product", help="Etiqueta de producto con la que se guardan los análisis en el historial")
+    parser.add_argument("--no-resume", action="store_true", help="Ignorar el punto de control y empezar de cero")
+    return parser
+
+
+def main(argv: List[str] = None) -> int:
+    """Punto de entrada de la línea de comandos"""
+    args = build_parser().parse_args(argv)
+    try:
+        return run(args)
+    except KeyboardInterrupt:
+        print("Interrumpido: ejecuta el mismo comando para reanudar", file=sys.stderr)
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""
+Caché persistente de respuestas de análisis de sentimientos
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Cada cuántas escrituras se vuelve a contar la tabla: otros procesos que
+# comparten el archivo desajustan el contador en memoria
+_RECOUNT_EVERY = 1000
+
+
+def normalize_review_text(review_text: str) -> str:
+    """
+    Normalizar el texto de una reseña para usarlo como clave de caché
+
+    Args:
+        review_text (str): Texto original de la reseña
+
+    Returns:
+        str: Texto en forma NFC con espacios colapsados
+    """
+    text = unicodedata.normalize("NFC", review_text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def make_cache_key(provider: str, model: str, prompt_version: str, temperature: float, review_text: str) -> str:
+    """
+    Construir la clave de caché direccionada por contenido
+
+    Args:
+        provider (str): Proveedor de IA
+        model (str): Modelo usado por el proveedor
+        prompt_version (str): Huella del prompt de análisis
+        temperature (float): Temperatura de muestreo
+        review_text (str): Texto de la reseña (se normaliza aquí)
+
+    Returns:
+        str: Hash SHA-256 en hexadecimal
+    """
+    payload = json.dumps(
+        [provider.lower(), model, prompt_version, temperature, normalize_review_text(review_text)],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Caché de resultados respaldada por SQLite con expulsión LRU y TTL
+
+    Es segura para usarse desde varios hilos: todas las operaciones pasan
+    por una única conexión protegida con un lock. El número de entradas se
+    lleva en memoria para no recorrer la tabla en cada escritura.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000, ttl_seconds: int = 7 * 24 * 3600):
+        """
+        Abrir (o crear) la base de datos de la caché
+
+        Args:
+            path (str): Ruta del archivo SQLite (":memory:" para pruebas)
+            max_entries (int): Número máximo de entradas antes de expulsar
+            ttl_seconds (int): Vida máxima de una entrada en segundos
+        """
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory and path != ":memory:":
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+        self._entries = self._count()
+        self._writes = 0
+
+    def _count(self) -> int:
+        """Contar las entradas de la tabla (recorre el índice: solo de vez en cuando)"""
+        return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Obtener un resultado de la caché
+
+        Args:
+            key (str): Clave generada con `make_cache_key`
+
+        Returns:
+            Optional[Dict]: Resultado guardado o None si no existe o expiró
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            value, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._entries -= 1
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+
+        return json.loads(value)
+
+    def set(self, key: str, result: Dict) -> None:
+        """
+        Guardar un resultado y expulsar las entradas menos usadas si hace falta
+
+        Args:
+            key (str): Clave generada con `make_cache_key`
+            result (Dict): Resultado del análisis
+        """
+        now = time.time()
+        value = json.dumps(result, ensure_ascii=False)
+        with self._lock:
+            exists = self._conn.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            if exists is None:
+                self._entries += 1
+            self._writes += 1
+            if self._writes % _RECOUNT_EVERY == 0:
+                self._entries = self._count()
+            overflow = self._entries - self.max_entries
+            if overflow > 0:
+                cursor = self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?)",
+                    (overflow,)
+                )
+                self._entries -= cursor.rowcount
+                self.evictions += cursor.rowcount
+
+    def purge_expired(self) -> int:
+        """
+        Eliminar todas las entradas cuyo TTL ha vencido
+
+        Returns:
+            int: Número de entradas eliminadas
+        """
+        if not self.ttl_seconds:
+            return 0
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            self._entries -= cursor.rowcount
+            return cursor.rowcount
+
+    def clear(self) -> None:
+        """Vaciar la caché y reiniciar los contadores"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._entries = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict:
+        """
+        Obtener estadísticas de uso de la caché
+
+        Returns:
+            Dict: Entradas, aciertos, fallos, expulsiones y tasa de aciertos
+        """
+        with self._lock:
+            entries = self._entries
+        total = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0
+        }
@@ -0,0 +1,156 @@
+"""
+División de reseñas largas en fragmentos y combinación de sus resultados
+"""
+import re
+import unicodedata
+from typing import Callable, Dict, List, Sequence
+
+# Fin de oración: puntuación final seguida de espacio, o saltos de línea
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?…])\s+|\n{1,}")
+_ASPECT_KEY_RE = re.compile(r"[^a-z0-9 ]+")
+
+MAX_MERGED_ASPECTS = 10
+MAX_MERGED_RECOMMENDATIONS = 5
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Separar un texto en oraciones
+
+    Args:
+        text (str): Texto a separar
+
+    Returns:
+        List[str]: Oraciones sin espacios sobrantes
+    """
+    return [sentence.strip() for sentence in _SENTENCE_END_RE.split(text) if sentence.strip()]
+
+
+def chunk_text(text: str, max_tokens: int, count_tokens: Callable[[str], int]) -> List[str]:
+    """
+    Dividir un texto en fragmentos de como máximo `max_tokens`, en límites de oración
+
+    Las oraciones se acumulan en orden hasta llenar el fragmento; una
+    oración que por sí sola excede el máximo se corta por palabras.
+
+    Args:
+        text (str): Texto a dividir
+        max_tokens (int): Tokens máximos por fragmento
+        count_tokens (Callable[[str], int]): Estimador de tokens
+
+    Returns:
+        List[str]: Fragmentos en el orden del texto
+    """
+    # Los costes se suman por pieza: sobreestima un poco y evita recontar
+    pieces = []
+    for sentence in split_sentences(text):
+        if count_tokens(sentence) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        words = []
+        words_cost = 0
+        for word in sentence.split():
+            cost = count_tokens(word)
+            if words and words_cost + cost > max_tokens:
+                pieces.append(" ".join(words))
+                words = []
+                words_cost = 0
+            words.append(word)
+            words_cost += cost
+        if words:
+            pieces.append(" ".join(words))
+
+    chunks = []
+    current = []
+    current_cost = 0
+    for piece in pieces:
+        cost = count_tokens(piece)
+        if current and current_cost + cost > max_tokens:
+            chunks.append(" ".join(current))
+            current = []
+            current_cost = 0
+        current.append(piece)
+        current_cost += cost
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def select_chunks(chunks: List[str], max_chunks: int) -> List[str]:
+    """
+    Elegir como mucho `max_chunks` fragmentos repartidos por todo el texto
+
+    Mantiene acotado el número de peticiones (y la latencia) para textos
+    arbitrariamente largos, conservando el primero y el último fragmento.
+
+    Args:
+        chunks (List[str]): Fragmentos en orden
+        max_chunks (int): Máximo de fragmentos a analizar
+
+    Returns:
+        List[str]: Fragmentos elegidos, en orden
+    """
+    if len(chunks) <= max_chunks:
+        return chunks
+    if max_chunks <= 1:
+        return chunks[:1]
+    step = (len(chunks) - 1) / (max_chunks - 1)
+    return [chunks[round(i * step)] for i in range(max_chunks)]
+
+
+def _aspect_key(aspect: str) -> str:
+    """Clave para detectar aspectos repetidos (minúsculas, sin tildes ni puntuación)"""
+    text = unicodedata.normalize("NFKD", aspect.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(_ASPECT_KEY_RE.sub(" ", text).split())
+
+
+def _dedupe(items: Sequence[str], limit: int) -> List[str]:
+    """Quitar repetidos conservando el orden de aparición"""
+    seen = set()
+    unique = []
+    for item in items:
+        key = _aspect_key(item)
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(item)
+            if len(unique) >= limit:
+                break
+    return unique
+
+
+def merge_results(results: Sequence[Dict], weights: Sequence[float]) -> Dict:
+    """
+    Combinar los resultados de los fragmentos de una reseña
+
+    La puntuación es la media ponderada por el tamaño de cada fragmento y
+    el sentimiento se deduce de ella con los mismos umbrales que
+    `SentimentResult`. Aspectos y recomendaciones se unen sin repetidos.
+    El resumen es la unión de los resúmenes; el analizador lo sustituye
+    por uno unificado cuando puede.
+
+    Args:
+        results (Sequence[Dict]): Resultados por fragmento, en orden
+        weights (Sequence[float]): Peso positivo de cada fragmento (p. ej. sus tokens)
+
+    Returns:
+        Dict: Resultado combinado con la estructura habitual
+    """
+    score = sum(r["puntuacion"] * w for r, w in zip(results, weights)) / sum(weights)
+    score = int(min(10, max(1, round(score))))
+    sentiment = "Positivo" if score >= 7 else "Negativo" if score <= 4 else "Neutral"
+
+    return {
+        "sentimiento_general": sentiment,
+        "puntuacion": score,
+        "aspectos_positivos": _dedupe(
+            [a for r in results for a in r.get("aspectos_positivos", [])], MAX_MERGED_ASPECTS
+        ),
+        "aspectos_negativos": _dedupe(
+            [a for r in results for a in r.get("aspectos_negativos", [])], MAX_MERGED_ASPECTS
+        ),
+        "recomendaciones": _dedupe(
+            [rec for r in results for rec in r.get("recomendaciones", [])], MAX_MERGED_RECOMMENDATIONS
+        ),
+        "resumen": " ".join(r["resumen"] for r in results if r.get("resumen")),
+    }
@@ -0,0 +1,290 @@
+"""
+Detección de reseñas casi duplicadas con MinHash y LSH
+
+Las exportaciones de marketplaces repiten reseñas copiadas o de plantilla
+que solo cambian en la puntuación o el nombre del producto. Cada reseña se
+normaliza, se parte en shingles de caracteres y se resume en una firma
+MinHash; el índice LSH (bandas de la firma) solo compara cada reseña con
+los representantes que comparten alguna banda, así que el coste crece de
+forma casi lineal con el número de reseñas.
+
+Un cambio de una palabra puede invertir el sentimiento ("buena" por
+"mala") sin bajar mucho la similitud, así que además se exige que las dos
+reseñas usen las mismas palabras de polaridad y negación del léxico.
+"""
+import hashlib
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from utils.lexicon import INTENSIFIERS, LEXICON_WEIGHTS, NEGATIONS
+
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+_SHIFT = np.uint64(32)
+_ROLLING_BASE = np.uint64(1000003)
+# Shingles permutados a la vez: la matriz temporal ocupa num_perm * bloque *
+# 8 bytes (16 MB con 64 permutaciones) sea cual sea el tamaño del lote
+_SHINGLE_BLOCK = 32768
+
+_NON_WORD_RE = re.compile(r"[\W_]+")
+# Diacríticos combinables que deja NFKD al separar las letras acentuadas
+_COMBINING_RE = re.compile("[\u0300-\u036f]")
+
+_POLARITY_WORDS = frozenset(LEXICON_WEIGHTS) | NEGATIONS | frozenset(INTENSIFIERS)
+
+
+def normalize_text(text: str) -> str:
+    """Pasar a minúsculas, quitar tildes y puntuación, y colapsar espacios"""
+    text = text.lower()
+    if not text.isascii():
+        text = _COMBINING_RE.sub("", unicodedata.normalize("NFKD", text))
+    return _NON_WORD_RE.sub(" ", text).strip()
+
+
+def shingle_hashes(text: str, size: int) -> np.ndarray:
+    """
+    Hashes de los shingles de `size` caracteres de un texto normalizado
+
+    El hash polinómico se calcula vectorizado sobre los códigos de los
+    caracteres, sin crear las subcadenas.
+
+    Args:
+        text (str): Texto ya normalizado
+        size (int): Caracteres por shingle
+
+    Returns:
+        np.ndarray: Hashes de 32 bits (uint64); los repetidos no afectan al mínimo
+    """
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    size = max(1, min(size, len(codes)))
+    count = len(codes) - size + 1
+    hashes = np.zeros(count, dtype=np.uint64)
+    for offset in range(size):
+        hashes = hashes * _ROLLING_BASE + codes[offset:offset + count]
+    return (hashes ^ (hashes >> _SHIFT)) & _MAX_HASH
+
+
+def polarity_key(text: str) -> Tuple[str, ...]:
+    """Palabras de polaridad, negación e intensidad de un texto normalizado, en orden"""
+    return tuple(word for word in text.split() if word in _POLARITY_WORDS)
+
+
+@lru_cache(maxsize=None)
+def lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    Elegir bandas y filas por banda para un umbral de similitud
+
+    Minimiza la suma de falsos positivos (pares por debajo del umbral que
+    comparten banda) y falsos negativos (pares por encima que no la
+    comparten), integrando la curva de probabilidad 1 - (1 - s^r)^b.
+
+    Args:
+        threshold (float): Similitud de Jaccard a partir de la que se agrupa
+        num_perm (int): Longitud de la firma MinHash
+
+    Returns:
+        Tuple[int, int]: (bandas, filas por banda)
+    """
+    similarity, step = np.linspace(0.0, 1.0, 201, retstep=True)
+    below = similarity <= threshold
+    best, best_error = (1, num_perm), float("inf")
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        probability = 1.0 - (1.0 - similarity ** rows) ** bands
+        error = (probability[below].sum() + (1.0 - probability[~below]).sum()) * step
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class NearDuplicateIndex:
+    """
+    Índice incremental de representantes para agrupar reseñas casi duplicadas
+
+    Cada reseña añadida se asigna al primer representante cuya similitud
+    estimada supera el umbral o pasa a ser un representante nuevo. Solo se
+    guardan las firmas de los representantes, de modo que la memoria crece
+    con el número de reseñas distintas y no con el total. Las reseñas que
+    coinciden tras normalizar se resuelven sin calcular la firma.
+    """
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = 64, shingle_size: int = 5, seed: int = 1):
+        """
+        Args:
+            threshold (float): Similitud de Jaccard mínima para agrupar (0-1)
+            num_perm (int): Funciones hash de la firma MinHash
+            shingle_size (int): Caracteres por shingle
+            seed (int): Semilla de las funciones hash (resultados reproducibles)
+        """
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError("El umbral de similitud debe estar entre 0 y 1")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+
+        # Hash multiplicativo (a * x + b) >> 32 con a impar: la aritmética
+        # módulo 2^64 de uint64 evita la división de la forma (a * x + b) % p
+        generator = np.random.RandomState(seed)
+        self._a = generator.randint(0, 2 ** 63, size=(num_perm, 1), dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = generator.randint(0, 2 ** 63, size=(num_perm, 1), dtype=np.uint64)
+
+        self._size = 0
+        # Resumen del texto normalizado -> representante (no se guarda el texto)
+        self._exact: Dict[bytes, int] = {}
+        self._signatures: Dict[int, np.ndarray] = {}
+        self._polarity: Dict[int, Tuple[str, ...]] = {}
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def representatives(self) -> int:
+        """Número de grupos distintos"""
+        return len(set(self._exact.values()))
+
+    def signatures(self, normalized: List[str]) -> np.ndarray:
+        """
+        Firmas MinHash de varios textos normalizados a la vez
+
+        Los shingles de todos los textos se concatenan y se permutan por
+        bloques de `_SHINGLE_BLOCK`, de modo que la memoria temporal no
+        depende del número ni de la longitud de los textos. En cada bloque
+        el mínimo de cada tramo de texto se obtiene con `np.minimum.reduceat`
+        y se combina con el de bloques anteriores (un texto largo puede
+        repartirse entre varios).
+
+        Args:
+            normalized (List[str]): Textos devueltos por `normalize_text` (no vacíos)
+
+        Returns:
+            np.ndarray: Matriz (textos, `num_perm`) de mínimos (uint32)
+        """
+        hashes = [shingle_hashes(text, self.shingle_size) for text in normalized]
+        owners = np.repeat(np.arange(len(hashes)), [len(h) for h in hashes])
+        hashes = np.concatenate(hashes)
+        signatures = np.full((len(normalized), self.num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+        for start in range(0, len(hashes), _SHINGLE_BLOCK):
+            block_owners = owners[start:start + _SHINGLE_BLOCK]
+            permuted = ((self._a * hashes[start:start + _SHINGLE_BLOCK] + self._b) >> _SHIFT).astype(np.uint32)
+            # Inicio de cada tramo de un mismo texto dentro del bloque
+            starts = np.flatnonzero(np.r_[True, block_owners[1:] != block_owners[:-1]])
+            texts = block_owners[starts]
+            signatures[texts] = np.minimum(signatures[texts], np.minimum.reduceat(permuted, starts, axis=1).T)
+        return signatures
+
+    def _band_keys(self, signature: np.ndarray) -> Iterable[Tuple[int, bytes]]:
+        """Clave de cada banda de la firma"""
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def _assign(self, position: int, digest: bytes, normalized: str, signature: Optional[np.ndarray]) -> int:
+        """Buscar el representante de un texto nuevo o registrarlo como tal"""
+        # Sin letras ni números no hay shingles útiles: solo se agrupan iguales
+        if signature is None:
+            self._exact[digest] = position
+            return position
+
+        polarity = polarity_key(normalized)
+        keys = list(self._band_keys(signature))
+        seen = set()
+        for band, key in keys:
+            for candidate in self._buckets[band].get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                if self._polarity[candidate] != polarity:
+                    continue
+                if np.mean(self._signatures[candidate] == signature) >= self.threshold:
+                    self._exact[digest] = candidate
+                    return candidate
+
+        self._exact[digest] = position
+        self._signatures[position] = signature
+        self._polarity[position] = polarity
+        for band, key in keys:
+            self._buckets[band].setdefault(key, []).append(position)
+        return position
+
+    def _add_batch(self, texts: List[str]) -> List[int]:
+        """Añadir un bloque de textos calculando juntas las firmas que faltan"""
+        normalized = [normalize_text(text) for text in texts]
+        digests = [hashlib.blake2b(text.encode("utf-8"), digest_size=12).digest() for text in normalized]
+
+        # Solo necesitan firma los textos que no coinciden con uno ya visto
+        missing: Dict[bytes, str] = {}
+        for text, digest in zip(normalized, digests):
+            if text and digest not in self._exact:
+                missing.setdefault(digest, text)
+        signatures = dict(zip(missing, self.signatures(list(missing.values())))) if missing else {}
+
+        representatives = []
+        for text, digest in zip(normalized, digests):
+            position = self._size
+            self._size += 1
+            representative = self._exact.get(digest)
+            if representative is None:
+                representative = self._assign(position, digest, text, signatures.get(digest))
+            representatives.append(representative)
+        return representatives
+
+    def add_many(self, texts: Iterable[str], batch_size: int = 1024) -> List[int]:
+        """
+        Añadir reseñas en orden y obtener el representante de cada una
+
+        Args:
+            texts (Iterable[str]): Textos de las reseñas
+            batch_size (int): Textos cuyas firmas se calculan juntas
+
+        Returns:
+            List[int]: Para cada texto, la posición (en orden de inserción) de
+                la reseña que representa su grupo; los nuevos apuntan a sí mismos
+        """
+        representatives: List[int] = []
+        batch: List[str] = []
+        for text in texts:
+            batch.append(text)
+            if len(batch) >= batch_size:
+                representatives.extend(self._add_batch(batch))
+                batch = []
+        if batch:
+            representatives.extend(self._add_batch(batch))
+        return representatives
+
+    def add(self, text: str) -> int:
+        """
+        Añadir una reseña y obtener su representante
+
+        Args:
+            text (str): Texto de la reseña
+
+        Returns:
+            int: Posición de la reseña que representa su grupo
+        """
+        return self._add_batch([text])[0]
+
+
+def group_near_duplicates(
+    texts: Iterable[str],
+    threshold: float = 0.85,
+    num_perm: int = 64,
+    shingle_size: int = 5
+) -> List[int]:
+    """
+    Asignar a cada texto el representante de su grupo de casi duplicados
+
+    Args:
+        texts (Iterable[str]): Reseñas en orden
+        threshold (float): Similitud de Jaccard mínima para agrupar
+        num_perm (int): Funciones hash de la firma MinHash
+        shingle_size (int): Caracteres por shingle
+
+    Returns:
+        List[int]: Para cada posición, la posición de su representante (la
+            primera aparición del grupo); los representantes apuntan a sí mismos
+    """
+    return NearDuplicateIndex(threshold, num_perm, shingle_size).add_many(texts)
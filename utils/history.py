@@ -0,0 +1,591 @@
+"""
+Historial persistente de análisis de sentimientos
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utils.cache import normalize_review_text
+
+logger = logging.getLogger(__name__)
+
+# Columnas devueltas por las consultas (el resultado completo va en "resultado")
+RECORD_COLUMNS = (
+    "id", "creado", "hash_resena", "resena", "producto", "proveedor", "modelo",
+    "sentimiento", "puntuacion", "latencia", "tokens_prompt", "tokens_completion",
+)
+
+DAY_SECONDS = 86400
+
+# Campos del índice de texto completo, con su peso en la relevancia (BM25):
+# una coincidencia en un aspecto o en el resumen pesa más que en la reseña
+SEARCH_FIELDS = {
+    "resena": 1.0,
+    "aspectos_positivos": 3.0,
+    "aspectos_negativos": 3.0,
+    "resumen": 2.0,
+}
+
+_SEARCH_TERM_RE = re.compile(r"\w+")
+# Los prefijos más cortos abarcan demasiados términos del índice
+_MIN_PREFIX = 3
+
+_COLUMNS = """
+    analyses.id, created_at, review_hash, review, product, provider, model,
+    sentiment, score, latency, prompt_tokens, completion_tokens, result
+"""
+_SELECT = f"SELECT {_COLUMNS} FROM analyses"
+
+
+def review_hash(review_text: str) -> str:
+    """
+    Huella de una reseña, estable ante cambios de espacios y forma Unicode
+
+    Args:
+        review_text (str): Texto de la reseña
+
+    Returns:
+        str: Hash SHA-256 en hexadecimal
+    """
+    return hashlib.sha256(normalize_review_text(review_text).encode("utf-8")).hexdigest()
+
+
+def match_query(text: str, prefix: bool = True) -> str:
+    """
+    Convertir texto libre en una consulta FTS5 segura
+
+    Cada palabra se entrecomilla (los operadores y la puntuación del
+    usuario no se interpretan) y todas deben aparecer.
+
+    Args:
+        text (str): Texto buscado
+        prefix (bool): Aceptar palabras que empiecen por cada término de al
+            menos `_MIN_PREFIX` caracteres ("envi" encuentra "envío")
+
+    Returns:
+        str: Expresión para MATCH ("" si no hay palabras)
+    """
+    terms = _SEARCH_TERM_RE.findall(text)
+    return " ".join(
+        f'"{term}"*' if prefix and len(term) >= _MIN_PREFIX else f'"{term}"' for term in terms
+    )
+
+
+def _row_to_record(row: Tuple) -> Dict:
+    """Convertir una fila de `_SELECT` en un registro con el resultado decodificado"""
+    record = dict(zip(RECORD_COLUMNS, row[:-1]))
+    record["resultado"] = json.loads(row[-1])
+    return record
+
+
+class HistoryStore:
+    """
+    Historial de análisis respaldado por SQLite en modo WAL
+
+    Cada análisis guarda la reseña, su hash, el proveedor, el modelo, la
+    latencia, los tokens y el resultado completo. Los índices por fecha,
+    sentimiento, puntuación y producto permiten filtrar cientos de miles de
+    filas sin recorrer la tabla, y un trigger mantiene un resumen diario
+    (por producto, proveedor y sentimiento) del que salen los informes.
+    Otro trigger añade cada análisis a un índice FTS5 sobre la reseña, los
+    aspectos y el resumen, que `search` consulta ordenando por relevancia.
+    Como `ResponseCache`, usa una única conexión protegida con un lock y es
+    segura entre hilos.
+    """
+
+    def __init__(self, path: str):
+        """
+        Abrir (o crear) la base de datos del historial
+
+        Args:
+            path (str): Ruta del archivo SQLite (":memory:" para pruebas)
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory and path != ":memory:":
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS analyses (
+                id INTEGER PRIMARY KEY,
+                created_at REAL NOT NULL,
+                review_hash TEXT NOT NULL,
+                review TEXT NOT NULL,
+                product TEXT,
+                provider TEXT,
+                model TEXT,
+                sentiment TEXT,
+                score INTEGER,
+                latency REAL,
+                prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                completion_tokens INTEGER NOT NULL DEFAULT 0,
+                result TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_created ON analyses(created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_sentiment ON analyses(sentiment, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_score ON analyses(score, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_product ON analyses(product, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_review ON analyses(review_hash)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS analyses_daily (
+                day INTEGER NOT NULL,
+                product TEXT NOT NULL,
+                provider TEXT NOT NULL,
+                sentiment TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                score_sum INTEGER NOT NULL,
+                score_count INTEGER NOT NULL,
+                latency_sum REAL NOT NULL,
+                latency_count INTEGER NOT NULL,
+                prompt_tokens INTEGER NOT NULL,
+                completion_tokens INTEGER NOT NULL,
+                PRIMARY KEY (day, product, provider, sentiment)
+            )
+        """)
+        self._conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_analyses_daily AFTER INSERT ON analyses BEGIN
+                INSERT INTO analyses_daily VALUES (
+                    CAST(NEW.created_at / {DAY_SECONDS} AS INTEGER), COALESCE(NEW.product, ''),
+                    COALESCE(NEW.provider, ''), COALESCE(NEW.sentiment, ''), 1,
+                    COALESCE(NEW.score, 0), NEW.score IS NOT NULL,
+                    COALESCE(NEW.latency, 0), NEW.latency IS NOT NULL,
+                    NEW.prompt_tokens, NEW.completion_tokens
+                )
+                ON CONFLICT (day, product, provider, sentiment) DO UPDATE SET
+                    total = total + 1,
+                    score_sum = score_sum + excluded.score_sum,
+                    score_count = score_count + excluded.score_count,
+                    latency_sum = latency_sum + excluded.latency_sum,
+                    latency_count = latency_count + excluded.latency_count,
+                    prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                    completion_tokens = completion_tokens + excluded.completion_tokens;
+            END
+        """)
+        self.search_enabled = self._create_search_index()
+
+    def _create_search_index(self) -> bool:
+        """
+        Crear el índice de texto completo y rellenarlo con el historial existente
+
+        Returns:
+            bool: False si el SQLite instalado no incluye FTS5
+        """
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'analyses_fts'"
+        ).fetchone() is not None
+        columns = ", ".join(SEARCH_FIELDS)
+        # Los aspectos se indexan unidos en un solo texto; sin tildes, "envio" encuentra "envío"
+        values = """
+            NEW.review,
+            (SELECT group_concat(value, ' · ') FROM json_each(NEW.result, '$.aspectos_positivos')),
+            (SELECT group_concat(value, ' · ') FROM json_each(NEW.result, '$.aspectos_negativos')),
+            json_extract(NEW.result, '$.resumen')
+        """
+        try:
+            self._conn.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS analyses_fts USING fts5("
+                f"{columns}, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Búsqueda de texto completo no disponible: {str(e)}")
+            return False
+        self._conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_analyses_fts AFTER INSERT ON analyses BEGIN
+                INSERT INTO analyses_fts (rowid, {columns}) VALUES (NEW.id, {values});
+            END
+        """)
+        if not exists:
+            # Historial creado antes que el índice: se indexa una vez
+            self._conn.execute(
+                f"INSERT INTO analyses_fts (rowid, {columns}) "
+                f"SELECT NEW.id, {values} FROM analyses AS NEW"
+            )
+        return True
+
+    @staticmethod
+    def _row(
+        review: str,
+        result: Dict,
+        provider: Optional[str] = None,
+        model: Optional[str] = None,
+        latency: Optional[float] = None,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        product: Optional[str] = None,
+        created_at: Optional[float] = None
+    ) -> Tuple:
+        """Fila de `analyses` para un análisis"""
+        return (
+            time.time() if created_at is None else created_at,
+            review_hash(review),
+            review,
+            product or None,
+            provider or result.get("proveedor"),
+            model,
+            result.get("sentimiento_general"),
+            result.get("puntuacion"),
+            latency,
+            prompt_tokens or 0,
+            completion_tokens or 0,
+            json.dumps(result, ensure_ascii=False),
+        )
+
+    def add(self, review: str, result: Dict, **fields) -> int:
+        """
+        Guardar un análisis
+
+        Args:
+            review (str): Texto de la reseña
+            result (Dict): Resultado del analizador
+            **fields: provider, model, latency, prompt_tokens,
+                completion_tokens, product y created_at (todos opcionales)
+
+        Returns:
+            int: Identificador del registro
+        """
+        row = self._row(review, result, **fields)
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO analyses (created_at, review_hash, review, product, provider, model, sentiment, "
+                "score, latency, prompt_tokens, completion_tokens, result) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                row
+            )
+            return cursor.lastrowid
+
+    def add_many(self, records: Iterable[Dict]) -> int:
+        """
+        Guardar varios análisis en una sola transacción
+
+        Args:
+            records (Iterable[Dict]): {"review", "result"} más los campos
+                opcionales de `add`
+
+        Returns:
+            int: Registros guardados
+        """
+        rows = [self._row(**record) for record in records]
+        if not rows:
+            return 0
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO analyses (created_at, review_hash, review, product, provider, model, sentiment, "
+                    "score, latency, prompt_tokens, completion_tokens, result) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    @staticmethod
+    def _where(
+        prefix: str = "WHERE",
+        sentiment: Optional[str] = None,
+        product: Optional[str] = None,
+        provider: Optional[str] = None,
+        min_score: Optional[int] = None,
+        max_score: Optional[int] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        review_hash: Optional[str] = None
+    ) -> Tuple[str, List]:
+        """Cláusula WHERE y parámetros para los filtros indicados"""
+        conditions, params = [], []
+        for column, value in (
+            ("sentiment", sentiment), ("product", product), ("provider", provider), ("review_hash", review_hash)
+        ):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if min_score is not None:
+            conditions.append("score >= ?")
+            params.append(min_score)
+        if max_score is not None:
+            conditions.append("score <= ?")
+            params.append(max_score)
+        if since is not None:
+            conditions.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("created_at < ?")
+            params.append(until)
+        return (f"{prefix} {' AND '.join(conditions)}" if conditions else ""), params
+
+    def query(self, limit: int = 50, offset: int = 0, **filters) -> List[Dict]:
+        """
+        Consultar análisis, del más reciente al más antiguo
+
+        Args:
+            limit (int): Registros por página
+            offset (int): Registros a saltar
+            **filters: sentiment, product, provider, min_score, max_score,
+                since, until (epoch en segundos) y review_hash
+
+        Returns:
+            List[Dict]: Registros con las columnas de `RECORD_COLUMNS` y "resultado"
+        """
+        where, params = self._where(**filters)
+        with self._lock:
+            rows = self._conn.execute(
+                f"{_SELECT} {where} ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        return [_row_to_record(row) for row in rows]
+
+    def get(self, record_id: int) -> Optional[Dict]:
+        """Obtener un registro por su identificador"""
+        with self._lock:
+            row = self._conn.execute(f"{_SELECT} WHERE id = ?", (record_id,)).fetchone()
+        return _row_to_record(row) if row else None
+
+    def count(self, **filters) -> int:
+        """Número de análisis que cumplen los filtros de `query`"""
+        where, params = self._where(**filters)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM analyses {where}", params).fetchone()[0]
+
+    def report(self, **filters) -> Dict:
+        """
+        Agregados del historial para los filtros de `query`
+
+        Si los filtros son de producto, proveedor, sentimiento y días
+        completos (UTC), se calcula sobre el resumen diario en lugar de
+        recorrer los análisis.
+
+        Returns:
+            Dict: Total, puntuación y latencia medias, tokens y conteo por sentimiento
+        """
+        since, until = filters.get("since"), filters.get("until")
+        from_daily = (
+            not {name for name, value in filters.items() if value is not None}
+            - {"sentiment", "product", "provider", "since", "until"}
+            and all(bound is None or bound % DAY_SECONDS == 0 for bound in (since, until))
+        )
+        if from_daily:
+            conditions, params = [], []
+            for column in ("sentiment", "product", "provider"):
+                if filters.get(column) is not None:
+                    conditions.append(f"{column} = ?")
+                    params.append(filters[column])
+            if since is not None:
+                conditions.append("day >= ?")
+                params.append(int(since // DAY_SECONDS))
+            if until is not None:
+                conditions.append("day < ?")
+                params.append(int(until // DAY_SECONDS))
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            sql = (
+                "SELECT sentiment, SUM(total), SUM(score_sum), SUM(score_count), SUM(latency_sum), "
+                f"SUM(latency_count), SUM(prompt_tokens), SUM(completion_tokens) FROM analyses_daily {where} "
+                "GROUP BY sentiment"
+            )
+        else:
+            where, params = self._where(**filters)
+            sql = (
+                "SELECT COALESCE(sentiment, ''), COUNT(*), COALESCE(SUM(score), 0), COUNT(score), "
+                "COALESCE(SUM(latency), 0), COUNT(latency), SUM(prompt_tokens), SUM(completion_tokens) "
+                f"FROM analyses {where} GROUP BY sentiment"
+            )
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        totals = [sum(row[i] for row in rows) for i in range(1, 8)]
+        total, score_sum, score_count, latency_sum, latency_count, prompt, completion = totals
+        return {
+            "total": total,
+            "puntuacion_media": score_sum / score_count if score_count else None,
+            "latencia_media": latency_sum / latency_count if latency_count else None,
+            "tokens_prompt": prompt,
+            "tokens_completion": completion,
+            "por_sentimiento": {row[0]: row[1] for row in rows if row[0]},
+        }
+
+    def _search_clause(self, text: str, fields: Optional[Iterable[str]], **filters) -> Tuple[str, List]:
+        """FROM ... WHERE de una búsqueda de texto completo con los filtros de `query`"""
+        if not self.search_enabled:
+            raise RuntimeError("La búsqueda requiere un SQLite con FTS5")
+        match = match_query(text)
+        fields = list(fields or ())
+        unknown = set(fields) - set(SEARCH_FIELDS)
+        if unknown:
+            raise ValueError(f"Campos de búsqueda desconocidos: {', '.join(sorted(unknown))}")
+        if match and fields:
+            match = f"{{{' '.join(fields)}}} : ({match})"
+        where, params = self._where("AND", **filters)
+        # CROSS JOIN fija el orden: primero el índice FTS y luego cada análisis
+        # encontrado; al revés, SQLite repetiría la búsqueda por cada fila filtrada
+        return (
+            f"FROM analyses_fts CROSS JOIN analyses ON analyses.id = analyses_fts.rowid WHERE analyses_fts MATCH ? {where}",
+            [match] + params
+        )
+
+    def search(
+        self,
+        text: str,
+        fields: Optional[Iterable[str]] = None,
+        limit: int = 20,
+        offset: int = 0,
+        **filters
+    ) -> List[Dict]:
+        """
+        Buscar análisis por palabras, del más relevante al menos relevante
+
+        Args:
+            text (str): Palabras buscadas (todas deben aparecer; se aceptan prefijos)
+            fields (Optional[Iterable[str]]): Campos de `SEARCH_FIELDS` donde
+                buscar; por defecto todos
+            limit (int): Resultados por página
+            offset (int): Resultados a saltar
+            **filters: Filtros de `query` (sentimiento, producto, fechas...)
+
+        Returns:
+            List[Dict]: Registros de `query` con "relevancia" (mayor es mejor)
+                y "fragmento" (texto con las coincidencias entre ** **)
+        """
+        if not match_query(text):
+            return []
+        clause, params = self._search_clause(text, fields, **filters)
+        weights = ", ".join(str(weight) for weight in SEARCH_FIELDS.values())
+        # Fragmento de la columna con la mejor coincidencia (-1), de hasta 16 palabras
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS}, bm25(analyses_fts, {weights}) AS rank, "
+                f"snippet(analyses_fts, -1, '**', '**', '…', 16) {clause} "
+                "ORDER BY rank LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        records = []
+        for row in rows:
+            record = _row_to_record(row[:-2])
+            record["relevancia"] = -row[-2]
+            record["fragmento"] = row[-1]
+            records.append(record)
+        return records
+
+    def search_count(self, text: str, fields: Optional[Iterable[str]] = None, **filters) -> int:
+        """Número de análisis que encuentra `search` con los mismos argumentos"""
+        if not match_query(text):
+            return 0
+        clause, params = self._search_clause(text, fields, **filters)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) {clause}", params).fetchone()[0]
+
+    def products(self) -> List[str]:
+        """Etiquetas de producto presentes en el historial"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT product FROM analyses WHERE product IS NOT NULL ORDER BY product"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def iter_records(self, batch_size: int = 10000, **filters) -> Iterator[List[Dict]]:
+        """
+        Recorrer los análisis en bloques por identificador (sin OFFSET)
+
+        Args:
+            batch_size (int): Registros por bloque
+            **filters: Filtros de `query`
+
+        Yields:
+            List[Dict]: Bloques de registros en orden de inserción
+        """
+        where, params = self._where(**filters)
+        where = f"{where} AND id > ?" if where else "WHERE id > ?"
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"{_SELECT} {where} ORDER BY id LIMIT ?", params + [last_id, batch_size]
+                ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield [_row_to_record(row) for row in rows]
+
+    def export_parquet(self, path: str, batch_size: int = 10000, **filters) -> int:
+        """
+        Exportar el historial a Parquet (requiere pyarrow)
+
+        Se escribe por bloques, así que la memoria no depende del tamaño
+        del historial. Las listas del resultado se guardan como listas de
+        textos y el resto del resultado queda en la columna "resultado" (JSON).
+
+        Args:
+            path (str): Archivo de salida
+            batch_size (int): Registros por grupo de filas
+            **filters: Filtros de `query`
+
+        Returns:
+            int: Registros exportados
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("La exportación a Parquet requiere pyarrow: pip install pyarrow")
+
+        schema = pa.schema([
+            ("id", pa.int64()),
+            ("creado", pa.timestamp("ms", tz="UTC")),
+            ("hash_resena", pa.string()),
+            ("resena", pa.string()),
+            ("producto", pa.dictionary(pa.int32(), pa.string())),
+            ("proveedor", pa.dictionary(pa.int8(), pa.string())),
+            ("modelo", pa.dictionary(pa.int8(), pa.string())),
+            ("sentimiento", pa.dictionary(pa.int8(), pa.string())),
+            ("puntuacion", pa.int8()),
+            ("latencia", pa.float32()),
+            ("tokens_prompt", pa.int32()),
+            ("tokens_completion", pa.int32()),
+            ("aspectos_positivos", pa.list_(pa.string())),
+            ("aspectos_negativos", pa.list_(pa.string())),
+            ("recomendaciones", pa.list_(pa.string())),
+            ("resumen", pa.string()),
+            ("resultado", pa.string()),
+        ])
+
+        exported = 0
+        with pq.ParquetWriter(path, schema) as writer:
+            for records in self.iter_records(batch_size, **filters):
+                columns = {name: [record[name] for record in records] for name in RECORD_COLUMNS}
+                columns["creado"] = [int(created * 1000) for created in columns["creado"]]
+                for name in ("aspectos_positivos", "aspectos_negativos", "recomendaciones", "resumen"):
+                    columns[name] = [record["resultado"].get(name) for record in records]
+                columns["resultado"] = [json.dumps(record["resultado"], ensure_ascii=False) for record in records]
+                writer.write_table(pa.table(
+                    {field.name: pa.array(columns[field.name]).cast(field.type) for field in schema},
+                    schema=schema
+                ))
+                exported += len(records)
+        logger.info(f"Historial exportado a {path}: {exported} registros")
+        return exported
+
+    def clear(self) -> None:
+        """Borrar todo el historial"""
+        with self._lock:
+            self._conn.execute("DELETE FROM analyses")
+            self._conn.execute("DELETE FROM analyses_daily")
+            if self.search_enabled:
+                self._conn.execute("DELETE FROM analyses_fts")
+
+    def close(self) -> None:
+        """Cerrar la conexión"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,479 @@
+"""
+Trabajos en segundo plano para análisis por lotes largos
+
+Streamlit re-ejecuta el script en cada interacción, así que un lote
+analizado dentro de la página bloquea la sesión y se pierde si se recarga
+la pestaña. Aquí los lotes se envían a un pool de hilos propio del proceso,
+compartido por todas las sesiones, que limita cuántos trabajos corren a la
+vez. El estado, el progreso y los resultados parciales de cada trabajo se
+guardan en SQLite: la interfaz los consulta periódicamente y un trabajo
+cancelado o interrumpido se reanuda analizando solo las reseñas que faltan.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set
+
+from config.settings import DEDUP_ENABLED, JOBS_FLUSH_SECONDS, JOBS_MAX_CONCURRENT, JOBS_PATH
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "en_cola"
+RUNNING = "en_curso"
+COMPLETED = "completado"
+CANCELLED = "cancelado"
+FAILED = "fallido"
+# En cola o en curso cuando el proceso terminó: se puede reanudar
+INTERRUPTED = "interrumpido"
+
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+RESUMABLE_STATUSES = (CANCELLED, FAILED, INTERRUPTED)
+
+_JOB_COLUMNS = (
+    "id", "creado", "actualizado", "estado", "proveedor", "producto", "dedup",
+    "total", "completadas", "errores", "duplicadas", "mensaje",
+)
+
+
+class JobStore:
+    """
+    Estado y resultados de los trabajos, en SQLite en modo WAL
+
+    Como `HistoryStore`, usa una única conexión protegida con un lock y es
+    segura entre hilos. Los cambios de estado son transiciones atómicas
+    (solo se aplican si el trabajo está en uno de los estados de origen),
+    de modo que cancelar, reanudar y el propio trabajo no se pisan.
+    """
+
+    def __init__(self, path: str):
+        """
+        Abrir (o crear) la base de datos de trabajos
+
+        Args:
+            path (str): Ruta del archivo SQLite (":memory:" para pruebas)
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory and path != ":memory:":
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                status TEXT NOT NULL,
+                provider TEXT NOT NULL,
+                product TEXT,
+                dedup INTEGER NOT NULL,
+                total INTEGER NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0,
+                errors INTEGER NOT NULL DEFAULT 0,
+                duplicates INTEGER NOT NULL DEFAULT 0,
+                message TEXT,
+                reviews TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs(created_at)")
+        # `seq` da el orden de llegada: la interfaz pide solo los resultados nuevos
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS job_items (
+                seq INTEGER PRIMARY KEY,
+                job_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                review TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                latency REAL,
+                duplicate_of INTEGER,
+                UNIQUE (job_id, position)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_job_items_seq ON job_items(job_id, seq)")
+
+    def create(self, reviews: List[str], provider: str, product: Optional[str] = None, dedup: bool = True) -> str:
+        """
+        Registrar un trabajo en cola
+
+        Args:
+            reviews (List[str]): Reseñas a analizar
+            provider (str): Proveedor de IA
+            product (Optional[str]): Etiqueta de producto para el historial
+            dedup (bool): Analizar una sola reseña por grupo de casi duplicados
+
+        Returns:
+            str: Identificador del trabajo
+        """
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, created_at, updated_at, status, provider, product, dedup, total, reviews) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, now, now, QUEUED, provider, product or None, int(dedup), len(reviews),
+                 json.dumps(reviews, ensure_ascii=False))
+            )
+        return job_id
+
+    def transition(
+        self,
+        job_id: str,
+        from_statuses: Iterable[str],
+        status: str,
+        message: Optional[str] = None
+    ) -> bool:
+        """
+        Cambiar el estado de un trabajo si está en alguno de los estados de origen
+
+        Returns:
+            bool: True si se aplicó el cambio
+        """
+        from_statuses = list(from_statuses)
+        placeholders = ", ".join("?" for _ in from_statuses)
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET status = ?, message = ?, updated_at = ? WHERE id = ? AND status IN ({placeholders})",
+                [status, message, time.time(), job_id] + from_statuses
+            )
+        return cursor.rowcount > 0
+
+    def interrupt_active(self) -> int:
+        """
+        Marcar como interrumpidos los trabajos que quedaron en cola o en curso
+
+        Returns:
+            int: Trabajos marcados
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE status IN (?, ?)",
+                (INTERRUPTED, time.time()) + ACTIVE_STATUSES
+            )
+        return cursor.rowcount
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Obtener el estado de un trabajo"""
+        jobs = self._select("WHERE id = ?", (job_id,))
+        return jobs[0] if jobs else None
+
+    def list_jobs(self, limit: int = 20) -> List[Dict]:
+        """Trabajos más recientes primero"""
+        return self._select("ORDER BY created_at DESC LIMIT ?", (limit,))
+
+    def _select(self, clause: str, params: tuple) -> List[Dict]:
+        """Filas de `jobs` como diccionarios con las claves de `_JOB_COLUMNS`"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, created_at, updated_at, status, provider, product, dedup, total, done, errors, "
+                f"duplicates, message FROM jobs {clause}",
+                params
+            ).fetchall()
+        jobs = [dict(zip(_JOB_COLUMNS, row)) for row in rows]
+        for job in jobs:
+            job["dedup"] = bool(job["dedup"])
+        return jobs
+
+    def reviews(self, job_id: str) -> List[str]:
+        """Reseñas de entrada de un trabajo"""
+        with self._lock:
+            row = self._conn.execute("SELECT reviews FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def done_positions(self, job_id: str) -> Set[int]:
+        """Posiciones de entrada que ya tienen resultado o error"""
+        with self._lock:
+            rows = self._conn.execute("SELECT position FROM job_items WHERE job_id = ?", (job_id,)).fetchall()
+        return {row[0] for row in rows}
+
+    def add_items(self, job_id: str, items: List[Dict]) -> None:
+        """
+        Guardar resultados de `analyze_batch` y actualizar el progreso en una transacción
+
+        Args:
+            job_id (str): Identificador del trabajo
+            items (List[Dict]): Elementos con "indice" ya referido a la entrada del trabajo
+        """
+        if not items:
+            return
+        rows = [
+            (
+                job_id,
+                item["indice"],
+                item["resena"],
+                json.dumps(item["resultado"], ensure_ascii=False) if item["resultado"] is not None else None,
+                item["error"],
+                item.get("latencia"),
+                item.get("duplicado_de"),
+            )
+            for item in items
+        ]
+        errors = sum(item["error"] is not None for item in items)
+        duplicates = sum(item.get("duplicado_de") is not None for item in items)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO job_items (job_id, position, review, result, error, latency, duplicate_of) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._conn.execute(
+                    "UPDATE jobs SET done = done + ?, errors = errors + ?, duplicates = duplicates + ?, "
+                    "updated_at = ? WHERE id = ?",
+                    (len(rows), errors, duplicates, time.time(), job_id)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def items(self, job_id: str, offset: int = 0, limit: int = -1) -> List[Dict]:
+        """
+        Resultados de un trabajo en orden de llegada
+
+        Args:
+            job_id (str): Identificador del trabajo
+            offset (int): Resultados ya leídos (para pedir solo los nuevos)
+            limit (int): Máximo de resultados (-1 sin límite)
+
+        Returns:
+            List[Dict]: Elementos con la forma de `analyze_batch`
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT position, review, result, error, latency, duplicate_of FROM job_items "
+                "WHERE job_id = ? ORDER BY seq LIMIT ? OFFSET ?",
+                (job_id, limit, offset)
+            ).fetchall()
+        return [
+            {
+                "indice": position,
+                "resena": review,
+                "resultado": json.loads(result) if result is not None else None,
+                "error": error,
+                "latencia": latency,
+                "duplicado_de": duplicate_of,
+            }
+            for position, review, result, error, latency, duplicate_of in rows
+        ]
+
+    def close(self) -> None:
+        """Cerrar la conexión"""
+        with self._lock:
+            self._conn.close()
+
+
+class JobManager:
+    """
+    Pool de trabajos en segundo plano compartido por todas las sesiones
+
+    Cada trabajo recorre `analyze_batch` en un hilo del pool (que ya reparte
+    las reseñas entre sus propios hilos); el tamaño del pool es el máximo de
+    trabajos simultáneos del proceso y el resto espera en cola. Los
+    resultados se guardan por tandas cada `JOBS_FLUSH_SECONDS`. Al cancelar,
+    las peticiones en vuelo terminan y sus resultados también se guardan.
+    """
+
+    def __init__(self, analyzer=None, store: Optional[JobStore] = None, max_jobs: int = JOBS_MAX_CONCURRENT):
+        """
+        Args:
+            analyzer: Instancia de SentimentAnalyzer; por defecto la global
+            store (Optional[JobStore]): Almacén de trabajos; por defecto el de settings
+            max_jobs (int): Trabajos ejecutándose a la vez
+        """
+        if analyzer is None:
+            from utils.ai_analyzer import get_analyzer
+            analyzer = get_analyzer()
+        self.analyzer = analyzer
+        self.store = store if store is not None else JobStore(JOBS_PATH)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_jobs), thread_name_prefix="sentiment-job")
+        self._cancel_events: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+        # Los hilos del proceso anterior ya no existen (cada base de datos de
+        # trabajos debe usarla un solo proceso)
+        interrupted = self.store.interrupt_active()
+        if interrupted:
+            logger.warning(f"{interrupted} trabajos quedaron sin terminar y se marcan como interrumpidos")
+
+    def submit(
+        self,
+        reviews: List[str],
+        provider: str,
+        product: Optional[str] = None,
+        dedup: bool = DEDUP_ENABLED
+    ) -> str:
+        """
+        Encolar un lote de reseñas
+
+        Args:
+            reviews (List[str]): Reseñas a analizar
+            provider (str): Proveedor de IA
+            product (Optional[str]): Etiqueta de producto para el historial
+            dedup (bool): Analizar una sola reseña por grupo de casi duplicados
+
+        Returns:
+            str: Identificador del trabajo
+        """
+        job_id = self.store.create(list(reviews), provider, product, dedup)
+        self._start(job_id)
+        logger.info(f"Trabajo {job_id} encolado: {len(reviews)} reseñas con {provider}")
+        return job_id
+
+    def _start(self, job_id: str) -> None:
+        """Enviar un trabajo en cola al pool"""
+        with self._lock:
+            self._cancel_events[job_id] = threading.Event()
+        self._executor.submit(self._run, job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancelar un trabajo en cola o en curso
+
+        Un trabajo en curso termina las peticiones que ya están en vuelo,
+        guarda sus resultados y pasa a cancelado.
+
+        Returns:
+            bool: False si el trabajo no estaba activo
+        """
+        if self.store.transition(job_id, (QUEUED,), CANCELLED):
+            with self._lock:
+                self._cancel_events.pop(job_id, None)
+            return True
+        with self._lock:
+            event = self._cancel_events.get(job_id)
+        if event is None:
+            return False
+        event.set()
+        return True
+
+    def resume(self, job_id: str) -> bool:
+        """
+        Reanudar un trabajo cancelado, fallido o interrumpido
+
+        Solo se analizan las reseñas que aún no tienen resultado.
+
+        Returns:
+            bool: False si el trabajo no se puede reanudar
+        """
+        if not self.store.transition(job_id, RESUMABLE_STATUSES, QUEUED):
+            return False
+        self._start(job_id)
+        logger.info(f"Trabajo {job_id} reanudado")
+        return True
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Estado de un trabajo"""
+        return self.store.get(job_id)
+
+    def list_jobs(self, limit: int = 20) -> List[Dict]:
+        """Trabajos más recientes primero"""
+        return self.store.list_jobs(limit)
+
+    def items(self, job_id: str, offset: int = 0, limit: int = -1) -> List[Dict]:
+        """Resultados de un trabajo en orden de llegada (ver `JobStore.items`)"""
+        return self.store.items(job_id, offset, limit)
+
+    def _run(self, job_id: str) -> None:
+        """Ejecutar un trabajo en un hilo del pool"""
+        # Cancelado mientras esperaba en cola, o ya lo ejecuta otro hilo tras reanudarlo
+        if not self.store.transition(job_id, (QUEUED,), RUNNING):
+            return
+        with self._lock:
+            cancel = self._cancel_events.setdefault(job_id, threading.Event())
+        try:
+            job = self.store.get(job_id)
+            reviews = self.store.reviews(job_id)
+            done = self.store.done_positions(job_id)
+            pending = [position for position in range(len(reviews)) if position not in done]
+            self._analyze(job, [(position, reviews[position]) for position in pending], cancel)
+
+            job = self.store.get(job_id)
+            if job["completadas"] >= job["total"]:
+                self.store.transition(job_id, (RUNNING,), COMPLETED)
+                logger.info(f"Trabajo {job_id} completado: {job['total']} reseñas, {job['errores']} errores")
+            else:
+                self.store.transition(job_id, (RUNNING,), CANCELLED)
+                logger.info(f"Trabajo {job_id} cancelado con {job['completadas']} de {job['total']} reseñas")
+        except Exception as e:
+            logger.error(f"Error en el trabajo {job_id}: {str(e)}")
+            self.store.transition(job_id, (RUNNING,), FAILED, str(e))
+        finally:
+            with self._lock:
+                if self._cancel_events.get(job_id) is cancel:
+                    del self._cancel_events[job_id]
+
+    def _analyze(self, job: Dict, pending: List[tuple], cancel: threading.Event) -> None:
+        """
+        Analizar las reseñas pendientes guardando los resultados por tandas
+
+        Args:
+            job (Dict): Estado del trabajo
+            pending (List[tuple]): Pares (posición en la entrada, reseña)
+            cancel (threading.Event): Señal de cancelación
+        """
+        if not pending:
+            return
+        positions = [position for position, _ in pending]
+        batch = self.analyzer.analyze_batch(
+            [review for _, review in pending],
+            job["proveedor"],
+            dedup=job["dedup"],
+            product=job["producto"],
+            cancel_event=cancel
+        )
+        buffer: List[Dict] = []
+        last_flush = time.monotonic()
+        try:
+            for item in batch:
+                # Los índices de `analyze_batch` son relativos a las pendientes
+                item["indice"] = positions[item["indice"]]
+                if item.get("duplicado_de") is not None:
+                    item["duplicado_de"] = positions[item["duplicado_de"]]
+                buffer.append(item)
+                if time.monotonic() - last_flush >= JOBS_FLUSH_SECONDS:
+                    self.store.add_items(job["id"], buffer)
+                    buffer = []
+                    last_flush = time.monotonic()
+        finally:
+            batch.close()
+            self.store.add_items(job["id"], buffer)
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Cancelar los trabajos activos y detener el pool"""
+        with self._lock:
+            events = list(self._cancel_events.values())
+        for event in events:
+            event.set()
+        self._executor.shutdown(wait=wait)
+
+
+# Gestor global, creado en el primer uso (ver get_job_manager)
+_manager: Optional[JobManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """
+    Obtener el gestor de trabajos del proceso
+
+    Returns:
+        JobManager: Instancia compartida por todas las sesiones
+    """
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = JobManager()
+    return _manager
@@ -0,0 +1,237 @@
+"""
+Pre-clasificador local de sentimientos basado en léxico (español/inglés)
+
+Resuelve sin llamar a la IA las reseñas claramente polarizadas. El cálculo
+se hace vectorizado con NumPy sobre todos los tokens del lote a la vez.
+"""
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Pesos de polaridad (claves en minúsculas y sin tildes)
+LEXICON_WEIGHTS = {
+    # Español - positivos
+    "excelente": 3.0, "excelentes": 3.0, "increible": 3.0, "increibles": 3.0,
+    "perfecto": 3.0, "perfecta": 3.0, "maravilloso": 3.0, "maravillosa": 3.0,
+    "espectacular": 3.0, "fantastico": 3.0, "fantastica": 3.0, "genial": 2.5,
+    "encanta": 2.5, "encanto": 2.5, "recomiendo": 2.5, "recomendado": 2.5,
+    "recomendable": 2.5, "bueno": 1.5, "buena": 1.5, "buenos": 1.5, "buenas": 1.5,
+    "bien": 1.0, "rapido": 1.5, "rapida": 1.5, "atento": 1.5, "atenta": 1.5,
+    "amable": 1.5, "satisfecho": 2.0, "satisfecha": 2.0, "contento": 2.0,
+    "contenta": 2.0, "feliz": 2.0, "supero": 2.0, "superaron": 2.0,
+    "util": 1.0, "comodo": 1.5, "comoda": 1.5, "facil": 1.0, "bonito": 1.5,
+    "bonita": 1.5, "duradero": 1.5, "resistente": 1.5, "eficiente": 1.5,
+    "funciona": 1.0, "cumple": 1.0, "justo": 0.5, "volvere": 1.5, "gracias": 1.0,
+    # Español - negativos
+    "terrible": -3.0, "horrible": -3.0, "pesimo": -3.0, "pesima": -3.0,
+    "malisimo": -3.0, "malisima": -3.0, "fatal": -3.0, "estafa": -3.0,
+    "basura": -3.0, "decepcionado": -2.5, "decepcionada": -2.5, "decepcion": -2.5,
+    "decepcionante": -2.5, "malo": -2.0, "mala": -2.0, "malos": -2.0, "malas": -2.0,
+    "mal": -1.5, "danado": -2.0, "danada": -2.0, "roto": -2.0, "rota": -2.0,
+    "defectuoso": -2.5, "defectuosa": -2.5, "insatisfecho": -2.5,
+    "insatisfecha": -2.5, "lento": -1.5, "lenta": -1.5, "tarde": -1.0,
+    "caro": -1.0, "cara": -0.5, "queja": -1.5, "quejas": -1.5, "devolver": -1.5,
+    "devolucion": -1.0, "perdi": -1.5, "problema": -1.5, "problemas": -1.5,
+    "falla": -2.0, "fallo": -2.0, "incomodo": -1.5, "incomoda": -1.5,
+    "mejorar": -0.5, "peor": -2.5,
+    # Inglés - positivos
+    "excellent": 3.0, "amazing": 3.0, "awesome": 3.0, "perfect": 3.0,
+    "wonderful": 3.0, "fantastic": 3.0, "outstanding": 3.0, "love": 2.5,
+    "loved": 2.5, "great": 2.5, "recommend": 2.5, "recommended": 2.5,
+    "good": 1.5, "nice": 1.5, "fast": 1.5, "quick": 1.5, "happy": 2.0,
+    "satisfied": 2.0, "helpful": 1.5, "friendly": 1.5, "easy": 1.0,
+    "comfortable": 1.5, "durable": 1.5, "works": 1.0, "beautiful": 2.0,
+    "worth": 1.5,
+    # Inglés - negativos
+    "awful": -3.0, "worst": -3.0, "useless": -3.0,
+    "scam": -3.0, "garbage": -3.0, "disappointed": -2.5, "disappointing": -2.5,
+    "bad": -2.0, "poor": -2.0, "broken": -2.0, "damaged": -2.0,
+    "defective": -2.5, "slow": -1.5, "late": -1.0, "expensive": -1.0,
+    "refund": -1.5, "return": -1.0, "problem": -1.5, "problems": -1.5,
+    "unhappy": -2.5, "waste": -2.5, "hate": -2.5, "cheap": -1.0,
+}
+
+# Palabras que invierten la polaridad de las siguientes
+NEGATIONS = {
+    "no", "ni", "sin", "nunca", "jamas", "tampoco", "nada",
+    "not", "never", "without", "dont", "doesnt", "didnt", "isnt", "wasnt", "cant", "wont",
+}
+
+# Multiplicadores de la palabra siguiente
+INTENSIFIERS = {
+    "muy": 1.5, "super": 1.5, "realmente": 1.5, "totalmente": 1.5,
+    "completamente": 1.5, "absolutamente": 1.75, "bastante": 1.25, "demasiado": 1.5,
+    "extremadamente": 1.75, "sumamente": 1.75, "tan": 1.25, "definitivamente": 1.5,
+    "very": 1.5, "really": 1.5, "extremely": 1.75, "totally": 1.5, "absolutely": 1.75,
+    "so": 1.25, "highly": 1.5, "definitely": 1.5,
+    "poco": 0.5, "algo": 0.75, "slightly": 0.5, "somewhat": 0.75, "bit": 0.75,
+}
+
+NEGATION_WINDOW = 3
+NEGATION_FACTOR = -0.8
+
+_TOKEN_RE = re.compile(r"[a-z]+")
+
+
+def _tokenize(text: str) -> List[str]:
+    """Pasar a minúsculas, quitar tildes y apóstrofes, y separar en palabras"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).replace("'", "")
+    return _TOKEN_RE.findall(text)
+
+
+class LexiconClassifier:
+    """
+    Clasificador de polaridad por léxico ponderado con negación e intensificadores
+
+    Cada término suma su peso, multiplicado por el intensificador que lo
+    precede y atenuado e invertido si hay una negación en las
+    `NEGATION_WINDOW` palabras anteriores. La confianza combina qué tan
+    unánime es la polaridad con cuánta evidencia hay.
+    """
+
+    def __init__(self, strength_scale: float = 4.0, min_hits: int = 2):
+        """
+        Args:
+            strength_scale (float): Evidencia (suma de pesos) a partir de la
+                cual la confianza se aproxima a su máximo
+            min_hits (int): Términos del léxico necesarios para decidir
+        """
+        self.strength_scale = strength_scale
+        self.min_hits = min_hits
+
+    def score_batch(self, texts: Iterable[str]) -> Dict[str, np.ndarray]:
+        """
+        Calcular polaridad, confianza y puntuación de un lote de textos
+
+        Args:
+            texts (Iterable[str]): Textos a puntuar
+
+        Returns:
+            Dict[str, np.ndarray]: Arrays por texto con "polarity" (-1..1),
+                "confidence" (0..1), "score" (1..10), "hits" y los datos por
+                token ("token_doc", "token_contrib", "token_negated",
+                "tokens") para extraer aspectos
+        """
+        tokenized = [_tokenize(text) for text in texts]
+        n_docs = len(tokenized)
+        lengths = np.fromiter((len(tokens) for tokens in tokenized), dtype=np.int64, count=n_docs)
+        tokens = [token for doc_tokens in tokenized for token in doc_tokens]
+        doc = np.repeat(np.arange(n_docs), lengths)
+
+        weights = np.fromiter((LEXICON_WEIGHTS.get(t, 0.0) for t in tokens), dtype=np.float64, count=len(tokens))
+        negation = np.fromiter((t in NEGATIONS for t in tokens), dtype=bool, count=len(tokens))
+        intensity = np.fromiter((INTENSIFIERS.get(t, 1.0) for t in tokens), dtype=np.float64, count=len(tokens))
+
+        # Negación en alguna de las palabras anteriores del mismo documento
+        negated = np.zeros(len(tokens), dtype=bool)
+        for k in range(1, NEGATION_WINDOW + 1):
+            if len(tokens) > k:
+                negated[k:] |= negation[:-k] & (doc[k:] == doc[:-k])
+
+        # Intensificador inmediatamente anterior
+        multiplier = np.ones(len(tokens), dtype=np.float64)
+        if len(tokens) > 1:
+            same_doc = doc[1:] == doc[:-1]
+            multiplier[1:] = np.where(same_doc, intensity[:-1], 1.0)
+
+        contrib = weights * multiplier * np.where(negated, NEGATION_FACTOR, 1.0)
+
+        positive = np.bincount(doc, weights=np.clip(contrib, 0, None), minlength=n_docs)
+        negative = np.bincount(doc, weights=np.clip(-contrib, 0, None), minlength=n_docs)
+        hits = np.bincount(doc, weights=(weights != 0).astype(np.float64), minlength=n_docs)
+
+        strength = positive + negative
+        polarity = np.divide(positive - negative, strength, out=np.zeros(n_docs), where=strength > 0)
+        evidence = 1.0 - np.exp(-strength / self.strength_scale)
+        confidence = np.where(hits >= self.min_hits, np.abs(polarity) * evidence, 0.0)
+        score = np.clip(np.rint(5.5 + 4.5 * polarity * evidence), 1, 10).astype(np.int64)
+
+        return {
+            "polarity": polarity,
+            "confidence": confidence,
+            "score": score,
+            "hits": hits.astype(np.int64),
+            "token_doc": doc,
+            "token_contrib": contrib,
+            "token_negated": negated,
+            "tokens": tokens,
+        }
+
+    def classify_batch(self, texts: Iterable[str], threshold: float) -> List[Optional[Dict]]:
+        """
+        Clasificar un lote devolviendo solo los resultados confiables
+
+        Args:
+            texts (Iterable[str]): Textos a clasificar
+            threshold (float): Confianza mínima para aceptar el resultado local
+
+        Returns:
+            List[Optional[Dict]]: Resultado con el formato del analizador, o
+                None para los textos que deben ir a la IA
+        """
+        scores = self.score_batch(texts)
+        confident = np.flatnonzero(scores["confidence"] >= threshold)
+        results: List[Optional[Dict]] = [None] * len(scores["confidence"])
+        if not len(confident):
+            return results
+
+        # Términos que aportaron polaridad, agrupados por documento
+        aspects = {int(i): ([], []) for i in confident}
+        for position in np.flatnonzero(scores["token_contrib"] != 0):
+            entry = aspects.get(int(scores["token_doc"][position]))
+            if entry is not None:
+                term = scores["tokens"][position]
+                if scores["token_negated"][position]:
+                    term = f"no {term}"
+                target = entry[0] if scores["token_contrib"][position] > 0 else entry[1]
+                if term not in target:
+                    target.append(term)
+
+        for i in confident:
+            i = int(i)
+            results[i] = self._build_result(
+                int(scores["score"][i]), float(scores["confidence"][i]), *aspects[i]
+            )
+        return results
+
+    def classify(self, text: str, threshold: float) -> Optional[Dict]:
+        """
+        Clasificar un único texto
+
+        Args:
+            text (str): Texto a clasificar
+            threshold (float): Confianza mínima para aceptar el resultado local
+
+        Returns:
+            Optional[Dict]: Resultado local o None si debe ir a la IA
+        """
+        return self.classify_batch([text], threshold)[0]
+
+    def _build_result(self, score: int, confidence: float, positives: List[str], negatives: List[str]) -> Dict:
+        """Construir un resultado con la misma estructura que el de la IA"""
+        if score >= 7:
+            sentiment = "Positivo"
+            recommendation = "Mantener los puntos fuertes mencionados por el cliente"
+        elif score <= 4:
+            sentiment = "Negativo"
+            recommendation = "Contactar al cliente y atender los problemas mencionados"
+        else:
+            sentiment = "Neutral"
+            recommendation = "Revisar la reseña para identificar oportunidades de mejora"
+
+        return {
+            "sentimiento_general": sentiment,
+            "puntuacion": score,
+            "aspectos_positivos": positives,
+            "aspectos_negativos": negatives,
+            "recomendaciones": [recommendation],
+            "resumen": (
+                f"Clasificación local por léxico (confianza {confidence:.2f}): "
+                f"{len(positives)} términos positivos y {len(negatives)} negativos."
+            ),
+            "proveedor": "lexico",
+            "confianza": round(confidence, 3)
+        }
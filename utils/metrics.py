@@ -0,0 +1,294 @@
+"""
+Registro de métricas en proceso con exposición en formato Prometheus
+"""
+import bisect
+import logging
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Límites (en segundos) pensados para llamadas a LLM: de 10 ms a 1 min
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    """Clave hashable y ordenada para un conjunto de etiquetas"""
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    """Escapar un valor de etiqueta (barra invertida, comillas y saltos de línea)"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    """Formatear etiquetas como {a="1",b="2"}"""
+    parts = [f'{name}="{_escape(value)}"' for name, value in labels]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    """Formatear un valor numérico como lo espera Prometheus"""
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Contador monótono con etiquetas"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        """Incrementar el contador para unas etiquetas"""
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        """Valor actual para unas etiquetas exactas"""
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+    def values(self) -> Dict[LabelKey, float]:
+        """Copia de todos los valores por etiquetas"""
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self) -> List[str]:
+        """Líneas de exposición"""
+        return [
+            f"{self.name}{_format_labels(key)} {_format_value(value)}"
+            for key, value in sorted(self.values().items())
+        ]
+
+
+class _HistogramSeries:
+    """Conteos por cubo, suma y total de una combinación de etiquetas"""
+
+    __slots__ = ("counts", "total", "sum")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.total = 0
+        self.sum = 0.0
+
+
+class Histogram:
+    """Histograma de cubos fijos con etiquetas"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, _HistogramSeries] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        """Registrar una observación"""
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _HistogramSeries(len(self.buckets) + 1)
+            series.counts[index] += 1
+            series.total += 1
+            series.sum += value
+
+    def summary(self, **labels) -> Dict[str, float]:
+        """
+        Resumen de una serie: total, media y cuantiles estimados por interpolación
+
+        Returns:
+            Dict[str, float]: "count", "mean", "p50", "p95" y "p99" (0 si no hay datos)
+        """
+        with self._lock:
+            series = self._series.get(_label_key(labels))
+            if series is None or not series.total:
+                return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0}
+            counts = list(series.counts)
+            total, total_sum = series.total, series.sum
+
+        def _quantile(q: float) -> float:
+            rank = q * total
+            cumulative = 0
+            for i, count in enumerate(counts):
+                if cumulative + count >= rank and count:
+                    lower = self.buckets[i - 1] if i > 0 else 0.0
+                    # El último cubo (+Inf) no tiene límite: se usa el mayor finito
+                    upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                    return lower + (upper - lower) * (rank - cumulative) / count
+                cumulative += count
+            return self.buckets[-1]
+
+        return {
+            "count": total,
+            "mean": total_sum / total,
+            "p50": _quantile(0.50),
+            "p95": _quantile(0.95),
+            "p99": _quantile(0.99),
+        }
+
+    def label_sets(self) -> List[Dict[str, str]]:
+        """Combinaciones de etiquetas con observaciones"""
+        with self._lock:
+            return [dict(key) for key in self._series]
+
+    def samples(self) -> List[str]:
+        """Líneas de exposición (cubos acumulados, _sum y _count)"""
+        with self._lock:
+            series_items = sorted(
+                (key, list(series.counts), series.sum, series.total) for key, series in self._series.items()
+            )
+        lines = []
+        for key, counts, total_sum, total in series_items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(key + (('le', _format_value(bound)),))} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total_sum)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {total}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas del proceso
+
+    Además de contadores e histogramas admite recolectores: funciones que
+    devuelven muestras de tipo gauge en el momento de exponerlas (estado de
+    la caché, circuit breakers, etc.).
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._collectors: List[Tuple[str, str, Callable[[], Iterable[Sample]]]] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, description: str) -> Counter:
+        """Obtener (o crear) un contador"""
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Counter(name, description)
+            return metric
+
+    def histogram(self, name: str, description: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        """Obtener (o crear) un histograma"""
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Histogram(name, description, buckets)
+            return metric
+
+    def register_collector(self, name: str, description: str, collect: Callable[[], Iterable[Sample]]) -> None:
+        """
+        Registrar un gauge calculado al exponer
+
+        Args:
+            name (str): Nombre de la métrica
+            description (str): Texto de ayuda
+            collect (Callable[[], Iterable[Sample]]): Devuelve tuplas (nombre, etiquetas, valor)
+        """
+        with self._lock:
+            self._collectors = [c for c in self._collectors if c[0] != name]
+            self._collectors.append((name, description, collect))
+
+    def render_prometheus(self) -> str:
+        """
+        Exponer todas las métricas en formato de texto de Prometheus
+
+        Returns:
+            str: Documento de exposición (versión 0.0.4)
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        for name, description, collect in collectors:
+            try:
+                samples = list(collect())
+            except Exception as e:
+                logger.warning(f"Error recolectando la métrica {name}: {str(e)}")
+                continue
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} gauge")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{_format_labels(_label_key(labels))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> Optional[ThreadingHTTPServer]:
+    """
+    Servir `/metrics` en un hilo en segundo plano (una sola vez por proceso)
+
+    Streamlit re-ejecuta el script en cada interacción, así que las llamadas
+    siguientes devuelven el servidor ya arrancado.
+
+    Args:
+        port (int): Puerto de escucha (0 = no arrancar)
+        host (str): Interfaz de escucha
+
+    Returns:
+        Optional[ThreadingHTTPServer]: Servidor, o None si está deshabilitado o falló
+    """
+    global _server
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+                _server.daemon_threads = True
+                threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+                logger.info(f"Métricas Prometheus disponibles en http://{host}:{port}/metrics")
+            except OSError as e:
+                logger.error(f"No se pudo arrancar el servidor de métricas en el puerto {port}: {str(e)}")
+                return None
+        return _server
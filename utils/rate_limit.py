@@ -0,0 +1,214 @@
+"""
+Limitador de tasa en el cliente por proveedor (peticiones y tokens por minuto)
+"""
+import asyncio
+import re
+import threading
+import time
+from typing import Mapping, Optional
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+class ProviderRateLimitError(Exception):
+    """El proveedor rechazó la petición por exceder su cuota (HTTP 429)"""
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Convertir una duración de cabecera ("1s", "6m0s", "20ms", "2") a segundos
+
+    Args:
+        value (Optional[str]): Valor de la cabecera
+
+    Returns:
+        Optional[float]: Segundos, o None si no se puede interpretar
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def _header_int(headers: Mapping[str, str], name: str) -> Optional[int]:
+    """Leer una cabecera entera, tolerando ausencias y valores inválidos"""
+    try:
+        return int(float(headers.get(name)))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Cubo de tokens con reservas: quien pide más de lo disponible queda en
+    deuda y recibe el tiempo que debe esperar, lo que reparte el cupo en
+    orden de llegada sin necesidad de reintentar.
+    """
+
+    def __init__(self, per_minute: float):
+        """
+        Args:
+            per_minute (float): Capacidad y ritmo de recarga por minuto
+        """
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        """Recargar según el tiempo transcurrido"""
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """
+        Reservar `amount` unidades
+
+        Args:
+            amount (float): Unidades a consumir (se limita a la capacidad)
+            now (float): Instante actual (time.monotonic)
+
+        Returns:
+            float: Segundos a esperar antes de usar la reserva
+        """
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+        return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def sync_remaining(self, remaining: float, now: float) -> None:
+        """Alinear el nivel con lo que el servidor informa como disponible"""
+        self._refill(now)
+        self.level = min(self.level, remaining)
+
+    def set_capacity(self, per_minute: float) -> None:
+        """Ajustar la capacidad a la cuota real informada por el servidor"""
+        if per_minute > 0 and per_minute != self.capacity:
+            self.capacity = float(per_minute)
+            self.rate = self.capacity / 60.0
+            self.level = min(self.level, self.capacity)
+
+
+class ProviderRateLimiter:
+    """
+    Limita peticiones por minuto (RPM) y tokens por minuto (TPM) de un
+    proveedor, y se adapta a las cabeceras de cuota y a `Retry-After`.
+
+    Es seguro compartirlo entre hilos y entre event loops: las reservas se
+    calculan bajo un lock y la espera la hace cada llamador.
+    """
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0):
+        """
+        Args:
+            requests_per_minute (int): Límite RPM (0 = sin límite)
+            tokens_per_minute (int): Límite TPM (0 = sin límite)
+        """
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> float:
+        """
+        Reservar una petición de `tokens` tokens estimados
+
+        Args:
+            tokens (int): Tokens estimados (prompt + max_tokens)
+
+        Returns:
+            float: Segundos a esperar antes de enviar la petición
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._blocked_until - now)
+            if self.requests is not None:
+                wait = max(wait, self.requests.reserve(1, now))
+            if self.tokens is not None:
+                wait = max(wait, self.tokens.reserve(tokens, now))
+            return wait
+
+    def acquire(self, tokens: int) -> float:
+        """
+        Bloquear el hilo hasta que haya cupo para la petición
+
+        Args:
+            tokens (int): Tokens estimados de la petición
+
+        Returns:
+            float: Segundos esperados
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self, tokens: int) -> float:
+        """
+        Esperar de forma asíncrona hasta que haya cupo para la petición
+
+        Args:
+            tokens (int): Tokens estimados de la petición
+
+        Returns:
+            float: Segundos esperados
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def observe(self, headers: Mapping[str, str]) -> None:
+        """
+        Ajustar los cubos con las cabeceras de cuota de una respuesta
+
+        OpenAI y Groq informan `x-ratelimit-*`; en Groq el límite de
+        peticiones es diario, así que de él solo se usa el agotamiento.
+
+        Args:
+            headers (Mapping[str, str]): Cabeceras HTTP de la respuesta
+        """
+        if not headers:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self.tokens is not None:
+                limit_tokens = _header_int(headers, "x-ratelimit-limit-tokens")
+                if limit_tokens:
+                    self.tokens.set_capacity(limit_tokens)
+                remaining_tokens = _header_int(headers, "x-ratelimit-remaining-tokens")
+                if remaining_tokens is not None:
+                    self.tokens.sync_remaining(remaining_tokens, now)
+
+            if _header_int(headers, "x-ratelimit-remaining-requests") == 0:
+                reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+                if reset:
+                    self._blocked_until = max(self._blocked_until, now + reset)
+
+    def on_rate_limited(self, headers: Optional[Mapping[str, str]]) -> None:
+        """
+        Pausar el proveedor tras un 429 durante lo indicado por el servidor
+
+        Args:
+            headers (Optional[Mapping[str, str]]): Cabeceras de la respuesta 429
+        """
+        headers = headers or {}
+        retry_after_ms = parse_duration(headers.get("retry-after-ms"))
+        if retry_after_ms is not None:
+            retry_after = retry_after_ms / 1000
+        else:
+            retry_after = parse_duration(headers.get("retry-after"))
+        if retry_after is None:
+            retry_after = parse_duration(headers.get("x-ratelimit-reset-tokens")) or 1.0
+
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+        # Las cabeceras del 429 también traen el cupo restante
+        self.observe(headers)
@@ -0,0 +1,144 @@
+"""
+Reintentos con backoff exponencial y circuit breaker por proveedor
+"""
+import random
+import threading
+import time
+
+from utils.rate_limit import ProviderRateLimitError
+
+# Nombres de excepciones de los SDK (openai/groq) que indican fallos transitorios
+_TRANSIENT_ERROR_NAMES = {"APITimeoutError", "APIConnectionError", "InternalServerError"}
+
+
+class CircuitOpenError(Exception):
+    """El circuito del proveedor está abierto y la llamada se rechaza sin enviarse"""
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Determinar si un error merece reintentarse
+
+    Args:
+        error (Exception): Error de la llamada al proveedor
+
+    Returns:
+        bool: True para cuotas, timeouts, errores de conexión y 5xx
+    """
+    if isinstance(error, (ProviderRateLimitError, TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in _TRANSIENT_ERROR_NAMES:
+        return True
+    status_code = getattr(error, "status_code", None)
+    return isinstance(status_code, int) and (status_code >= 500 or status_code in (408, 409))
+
+
+class RetryPolicy:
+    """
+    Política de reintentos con backoff exponencial y jitter completo
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0):
+        """
+        Args:
+            max_attempts (int): Intentos totales (1 = sin reintentos)
+            base_delay (float): Espera base en segundos
+            max_delay (float): Espera máxima en segundos
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int) -> float:
+        """
+        Espera antes del siguiente intento
+
+        Args:
+            attempt (int): Número del intento que acaba de fallar (desde 1)
+
+        Returns:
+            float: Segundos aleatorios entre 0 y el tope exponencial
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de tres estados para un proveedor
+
+    - closed: las llamadas pasan; tras `failure_threshold` fallos seguidos se abre
+    - open: las llamadas se rechazan hasta que pasa `recovery_seconds`
+    - half_open: se dejan pasar hasta `half_open_max_calls` sondas; un éxito
+      cierra el circuito y un fallo lo vuelve a abrir
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_seconds: float = 30.0, half_open_max_calls: int = 1):
+        """
+        Args:
+            failure_threshold (int): Fallos consecutivos que abren el circuito
+            recovery_seconds (float): Tiempo abierto antes de sondear
+            half_open_max_calls (int): Sondas simultáneas en half_open
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_seconds = recovery_seconds
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._lock = threading.Lock()
+
+    def _update_state(self) -> None:
+        """Pasar de open a half_open cuando vence el tiempo de recuperación"""
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_seconds:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+
+    @property
+    def state(self) -> str:
+        """Estado actual del circuito"""
+        with self._lock:
+            self._update_state()
+            return self._state
+
+    def allow_request(self) -> bool:
+        """
+        Consultar (y reservar en half_open) si una llamada puede pasar
+
+        Returns:
+            bool: True si la llamada puede enviarse
+        """
+        with self._lock:
+            self._update_state()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            return False
+
+    def record_success(self) -> None:
+        """Registrar una llamada exitosa"""
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._half_open_calls = 0
+
+    def record_failure(self) -> None:
+        """Registrar una llamada fallida por un error transitorio"""
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._half_open_calls = 0
+
+    def release(self) -> None:
+        """Liberar una sonda half_open que terminó sin veredicto (p. ej. error 4xx)"""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
@@ -0,0 +1,348 @@
+"""
+Almacén columnar de resultados de análisis para lotes grandes
+"""
+import math
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional
+
+import numpy as np
+
+# pandas solo se necesita al exportar: se importa en esos métodos
+if TYPE_CHECKING:
+    import pandas as pd
+
+SENTIMENT_CATEGORIES = ("Positivo", "Negativo", "Neutral")
+_SENTIMENT_CODES = {name: code for code, name in enumerate(SENTIMENT_CATEGORIES)}
+
+# Columnas de listas de textos, codificadas contra un diccionario común
+LIST_COLUMNS = ("aspectos_positivos", "aspectos_negativos", "recomendaciones")
+
+
+def _grow(array: np.ndarray, capacity: int) -> np.ndarray:
+    """Copiar un array a uno nuevo con más capacidad"""
+    grown = np.empty(capacity, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class _StringDictionary:
+    """Tabla de textos únicos: cada texto se guarda una vez y se referencia por código"""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def encode(self, value: str) -> int:
+        """Obtener (o asignar) el código de un texto"""
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+        return code
+
+
+class _ListColumn:
+    """
+    Columna de listas de textos en formato CSR: los códigos de todas las
+    filas van seguidos en `codes` y `offsets[i]:offsets[i + 1]` delimita la fila i
+    """
+
+    def __init__(self, capacity: int):
+        self.offsets = np.zeros(capacity + 1, dtype=np.int32)
+        self.codes = np.empty(capacity * 2, dtype=np.int32)
+        self.size = 0
+
+    def append(self, row: int, codes: List[int]) -> None:
+        """Añadir la lista de la fila `row` (siempre la siguiente)"""
+        end = self.size + len(codes)
+        if end > len(self.codes):
+            self.codes = _grow(self.codes, max(end, 2 * len(self.codes)))
+        self.codes[self.size:end] = codes
+        self.size = end
+        self.offsets[row + 1] = end
+
+    def resize(self, capacity: int) -> None:
+        """Ampliar la capacidad de filas"""
+        self.offsets = _grow(self.offsets, capacity + 1)
+
+    def row(self, row: int) -> np.ndarray:
+        """Códigos de una fila"""
+        return self.codes[self.offsets[row]:self.offsets[row + 1]]
+
+
+class ResultStore:
+    """
+    Contenedor compacto de resultados de `SentimentAnalyzer`
+
+    Los campos escalares se guardan en columnas NumPy tipadas (sentimiento
+    como categoría int8, puntuación int8, proveedor codificado, latencia
+    float32) y los aspectos y recomendaciones se codifican contra un
+    diccionario común, de modo que cada texto repetido se guarda una sola
+    vez. `to_pandas` y `to_arrow` exponen las columnas sin copiarlas.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        """
+        Args:
+            capacity (int): Filas reservadas inicialmente (crece al doble)
+        """
+        capacity = max(1, capacity)
+        self._size = 0
+        self._row = np.empty(capacity, dtype=np.int32)
+        self._sentiment = np.empty(capacity, dtype=np.int8)
+        self._score = np.empty(capacity, dtype=np.int8)
+        self._provider = np.empty(capacity, dtype=np.int8)
+        self._latency = np.empty(capacity, dtype=np.float32)
+        self._duplicate_of = np.empty(capacity, dtype=np.int32)
+        self._providers = _StringDictionary()
+        self._terms = _StringDictionary()
+        self._lists = {name: _ListColumn(capacity) for name in LIST_COLUMNS}
+        self._reviews: List[str] = []
+        self._summaries: List[str] = []
+        self._errors: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _reserve(self) -> None:
+        """Duplicar la capacidad cuando se llena"""
+        if self._size < len(self._row):
+            return
+        capacity = 2 * len(self._row)
+        self._row = _grow(self._row, capacity)
+        self._sentiment = _grow(self._sentiment, capacity)
+        self._score = _grow(self._score, capacity)
+        self._provider = _grow(self._provider, capacity)
+        self._latency = _grow(self._latency, capacity)
+        self._duplicate_of = _grow(self._duplicate_of, capacity)
+        for column in self._lists.values():
+            column.resize(capacity)
+
+    def append(
+        self,
+        result: Optional[Dict],
+        review: str = "",
+        row: Optional[int] = None,
+        latency: Optional[float] = None,
+        error: Optional[str] = None,
+        duplicate_of: Optional[int] = None
+    ) -> int:
+        """
+        Añadir un resultado
+
+        Args:
+            result (Optional[Dict]): Resultado del analizador (None si falló)
+            review (str): Texto de la reseña
+            row (Optional[int]): Fila de origen; por defecto la posición de inserción
+            latency (Optional[float]): Segundos que tardó el análisis
+            error (Optional[str]): Mensaje de error si el análisis falló
+            duplicate_of (Optional[int]): Fila del representante si el resultado
+                se copió de una reseña casi duplicada
+
+        Returns:
+            int: Posición del resultado en el almacén
+        """
+        self._reserve()
+        position = self._size
+        result = result or {}
+
+        self._row[position] = position if row is None else row
+        self._sentiment[position] = _SENTIMENT_CODES.get(result.get("sentimiento_general"), -1)
+        self._score[position] = result.get("puntuacion") or 0
+        provider = result.get("proveedor")
+        self._provider[position] = self._providers.encode(provider) if provider else -1
+        self._latency[position] = math.nan if latency is None else latency
+        self._duplicate_of[position] = -1 if duplicate_of is None else duplicate_of
+        for name, column in self._lists.items():
+            column.append(position, [self._terms.encode(value) for value in result.get(name, [])])
+        self._reviews.append(review)
+        self._summaries.append(result.get("resumen", ""))
+        if error:
+            self._errors[position] = error
+
+        self._size += 1
+        return position
+
+    def append_item(self, item: Dict) -> int:
+        """
+        Añadir un elemento de `analyze_batch`
+
+        Args:
+            item (Dict): {"indice", "resena", "resultado", "error", "latencia"}
+                y opcionalmente "duplicado_de"
+
+        Returns:
+            int: Posición del resultado en el almacén
+        """
+        return self.append(
+            item["resultado"],
+            review=item["resena"],
+            row=item["indice"],
+            latency=item.get("latencia"),
+            error=item["error"],
+            duplicate_of=item.get("duplicado_de")
+        )
+
+    def __getitem__(self, position: int) -> Dict:
+        """
+        Reconstruir el resultado de una posición con la forma del analizador
+
+        Args:
+            position (int): Posición en el almacén
+
+        Returns:
+            Dict: {"indice", "resena", "resultado", "error", "latencia", "duplicado_de"}
+        """
+        if not 0 <= position < self._size:
+            raise IndexError(position)
+        result = None
+        sentiment = self._sentiment[position]
+        if sentiment >= 0:
+            result = {
+                "sentimiento_general": SENTIMENT_CATEGORIES[sentiment],
+                "puntuacion": int(self._score[position]),
+                **{
+                    name: [self._terms.values[code] for code in column.row(position)]
+                    for name, column in self._lists.items()
+                },
+                "resumen": self._summaries[position],
+            }
+            if self._provider[position] >= 0:
+                result["proveedor"] = self._providers.values[self._provider[position]]
+        latency = float(self._latency[position])
+        duplicate_of = int(self._duplicate_of[position])
+        return {
+            "indice": int(self._row[position]),
+            "resena": self._reviews[position],
+            "resultado": result,
+            "error": self._errors.get(position),
+            "latencia": None if math.isnan(latency) else latency,
+            "duplicado_de": None if duplicate_of < 0 else duplicate_of,
+        }
+
+    def __iter__(self) -> Iterator[Dict]:
+        for position in range(self._size):
+            yield self[position]
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes ocupados por las columnas numéricas (sin los textos)"""
+        arrays = [self._row, self._sentiment, self._score, self._provider, self._latency, self._duplicate_of]
+        for column in self._lists.values():
+            arrays += [column.offsets, column.codes]
+        return sum(array.nbytes for array in arrays)
+
+    def _sentiment_categorical(self) -> "pd.Categorical":
+        """Sentimiento como Categorical que reutiliza los códigos int8"""
+        import pandas as pd
+        
+        return pd.Categorical.from_codes(self._sentiment[:self._size], categories=list(SENTIMENT_CATEGORIES))
+
+    def to_pandas(self, include_lists: bool = True) -> "pd.DataFrame":
+        """
+        Convertir a DataFrame
+
+        Las columnas numéricas y categóricas se construyen sobre los arrays
+        del almacén sin copiarlos; las listas de aspectos sí requieren
+        objetos de Python, por lo que pueden omitirse para gráficos.
+
+        Args:
+            include_lists (bool): Incluir aspectos y recomendaciones como listas
+
+        Returns:
+            pd.DataFrame: Una fila por resultado, en orden de inserción
+        """
+        import pandas as pd
+        
+        n = self._size
+        missing = self._sentiment[:n] < 0
+        data = {
+            "fila": self._row[:n],
+            "reseña": self._reviews,
+            "sentimiento": self._sentiment_categorical(),
+            "puntuación": pd.arrays.IntegerArray(self._score[:n], mask=missing),
+            "proveedor": pd.Categorical.from_codes(self._provider[:n], categories=list(self._providers.values)),
+            "latencia": self._latency[:n],
+            "duplicado_de": pd.arrays.IntegerArray(self._duplicate_of[:n], mask=self._duplicate_of[:n] < 0),
+            "resumen": self._summaries,
+        }
+        if include_lists:
+            values = self._terms.values
+            for name, column in self._lists.items():
+                data[name] = [
+                    [values[code] for code in column.row(position)] for position in range(n)
+                ]
+        data["error"] = [self._errors.get(position, "") for position in range(n)]
+        return pd.DataFrame(data, copy=False)
+
+    def to_arrow(self):
+        """
+        Convertir a una tabla de Apache Arrow (requiere pyarrow)
+
+        Las listas se exportan como ListArray de DictionaryArray sobre los
+        mismos buffers de códigos y desplazamientos.
+
+        Returns:
+            pyarrow.Table: Una fila por resultado
+        """
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError("La exportación a Arrow requiere pyarrow: pip install pyarrow")
+
+        n = self._size
+        sentiment = self._sentiment[:n]
+        providers = self._provider[:n]
+        terms = pa.array(self._terms.values, type=pa.string())
+        columns = {
+            "fila": pa.array(self._row[:n]),
+            "reseña": pa.array(self._reviews, type=pa.string()),
+            "sentimiento": pa.DictionaryArray.from_arrays(
+                pa.array(sentiment, mask=sentiment < 0), pa.array(SENTIMENT_CATEGORIES)
+            ),
+            "puntuación": pa.array(self._score[:n], mask=sentiment < 0),
+            "proveedor": pa.DictionaryArray.from_arrays(
+                pa.array(providers, mask=providers < 0), pa.array(self._providers.values, type=pa.string())
+            ),
+            "latencia": pa.array(self._latency[:n]),
+            "duplicado_de": pa.array(self._duplicate_of[:n], mask=self._duplicate_of[:n] < 0),
+            "resumen": pa.array(self._summaries, type=pa.string()),
+        }
+        for name, column in self._lists.items():
+            columns[name] = pa.ListArray.from_arrays(
+                pa.array(column.offsets[:n + 1]),
+                pa.DictionaryArray.from_arrays(pa.array(column.codes[:column.size]), terms)
+            )
+        columns["error"] = pa.array([self._errors.get(position) for position in range(n)], type=pa.string())
+        return pa.table(columns)
+
+    def sentiment_counts(self) -> "pd.Series":
+        """
+        Contar resultados por sentimiento
+
+        Returns:
+            pd.Series: Conteo por categoría (incluye las que tienen 0)
+        """
+        import pandas as pd
+        
+        counts = np.bincount(self._sentiment[:self._size][self._sentiment[:self._size] >= 0], minlength=3)
+        return pd.Series(counts, index=list(SENTIMENT_CATEGORIES), name="reseñas")
+
+    def term_counts(self, column: str, top: int = 10) -> "pd.Series":
+        """
+        Contar los textos más frecuentes de una columna de listas
+
+        Args:
+            column (str): "aspectos_positivos", "aspectos_negativos" o "recomendaciones"
+            top (int): Número de textos a devolver
+
+        Returns:
+            pd.Series: Frecuencia por texto, de mayor a menor
+        """
+        import pandas as pd
+        
+        list_column = self._lists[column]
+        counts = np.bincount(list_column.codes[:list_column.size], minlength=len(self._terms.values))
+        order = np.argsort(counts, kind="stable")[::-1][:top]
+        order = order[counts[order] > 0]
+        return pd.Series(counts[order], index=[self._terms.values[code] for code in order], name="menciones")
@@ -0,0 +1,206 @@
+"""
+Enrutamiento de peticiones entre proveedores según latencia y errores
+"""
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+
+class ProviderStats:
+    """
+    Ventana deslizante de latencias y resultados de un proveedor
+
+    La ventana está limitada en número de llamadas y en antigüedad: sin la
+    segunda, un proveedor que dejó de elegirse tras una caída conservaría
+    sus errores para siempre.
+    """
+
+    def __init__(self, window_size: int, max_age: Optional[float] = None):
+        """
+        Args:
+            window_size (int): Número de llamadas recientes a conservar
+            max_age (Optional[float]): Segundos tras los que se descarta una
+                llamada; None para no caducarlas
+        """
+        self.max_age = max_age
+        self.latencies = deque(maxlen=window_size)
+        self.outcomes = deque(maxlen=window_size)
+        # Instante de cada llamada, paralelo a `outcomes` y a `latencies`
+        self._outcome_times = deque(maxlen=window_size)
+        self._latency_times = deque(maxlen=window_size)
+
+    def add(self, latency: float, success: bool, now: Optional[float] = None) -> None:
+        """Registrar una llamada"""
+        now = time.monotonic() if now is None else now
+        self.outcomes.append(success)
+        self._outcome_times.append(now)
+        if success:
+            self.latencies.append(latency)
+            self._latency_times.append(now)
+
+    def expire(self, now: Optional[float] = None) -> None:
+        """Descartar las llamadas más antiguas que `max_age`"""
+        if self.max_age is None:
+            return
+        cutoff = (time.monotonic() if now is None else now) - self.max_age
+        while self._outcome_times and self._outcome_times[0] < cutoff:
+            self._outcome_times.popleft()
+            self.outcomes.popleft()
+        while self._latency_times and self._latency_times[0] < cutoff:
+            self._latency_times.popleft()
+            self.latencies.popleft()
+
+    @property
+    def samples(self) -> int:
+        """Número de llamadas registradas en la ventana"""
+        return len(self.outcomes)
+
+    @property
+    def error_rate(self) -> float:
+        """Fracción de llamadas fallidas en la ventana"""
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        Calcular un percentil de latencia de las llamadas exitosas
+
+        Args:
+            q (float): Percentil entre 0 y 100
+
+        Returns:
+            Optional[float]: Latencia en segundos, o None sin datos
+        """
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+        return ordered[index]
+
+
+class LatencyRouter:
+    """
+    Elige el proveedor más rápido y sano a partir de las llamadas recientes
+
+    Mientras un proveedor tiene pocas muestras se le envía tráfico para
+    conocerlo; después se elige el de menor p50 entre los que no superan
+    la tasa máxima de errores. Las muestras caducan tras `max_sample_age`,
+    así que un proveedor descartado por una caída pasajera vuelve a
+    calentamiento y recibe tráfico de nuevo. Es segura para usarse desde
+    varios hilos.
+    """
+
+    def __init__(
+        self,
+        window_size: int = 200,
+        min_samples: int = 5,
+        max_error_rate: float = 0.5,
+        hedge_percentile: float = 95,
+        default_hedge_seconds: float = 5.0,
+        max_sample_age: Optional[float] = 300.0
+    ):
+        """
+        Args:
+            window_size (int): Llamadas recientes por proveedor
+            min_samples (int): Muestras antes de confiar en los percentiles
+            max_error_rate (float): Tasa de errores a partir de la cual un
+                proveedor se considera no sano
+            hedge_percentile (float): Percentil usado como plazo de cobertura
+            default_hedge_seconds (float): Plazo cuando aún no hay muestras
+            max_sample_age (Optional[float]): Segundos tras los que caduca una
+                muestra; None para conservarlas hasta que las desplacen otras
+        """
+        self.window_size = window_size
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.hedge_percentile = hedge_percentile
+        self.default_hedge_seconds = default_hedge_seconds
+        self.max_sample_age = max_sample_age
+        self._stats: Dict[str, ProviderStats] = {}
+        self._lock = threading.Lock()
+
+    def _get_stats(self, provider: str) -> ProviderStats:
+        """Obtener (o crear) las estadísticas de un proveedor, sin las muestras caducadas"""
+        stats = self._stats.get(provider)
+        if stats is None:
+            stats = self._stats[provider] = ProviderStats(self.window_size, self.max_sample_age)
+        stats.expire()
+        return stats
+
+    def record(self, provider: str, latency: float, success: bool) -> None:
+        """
+        Registrar el resultado de una llamada
+
+        Args:
+            provider (str): Proveedor que atendió la llamada
+            latency (float): Duración en segundos
+            success (bool): Si la llamada terminó sin error
+        """
+        with self._lock:
+            self._get_stats(provider.lower()).add(latency, success)
+
+    def choose(self, candidates: List[str]) -> str:
+        """
+        Elegir el proveedor al que enviar la próxima petición
+
+        Args:
+            candidates (List[str]): Proveedores configurados
+
+        Returns:
+            str: Proveedor elegido
+        """
+        if not candidates:
+            raise ValueError("No hay proveedores disponibles para enrutar")
+
+        with self._lock:
+            stats = {provider: self._get_stats(provider) for provider in candidates}
+
+            # Calentamiento: conocer primero a los proveedores sin muestras suficientes
+            warming = [p for p in candidates if stats[p].samples < self.min_samples]
+            if warming:
+                return min(warming, key=lambda p: stats[p].samples)
+
+            healthy = [p for p in candidates if stats[p].error_rate <= self.max_error_rate]
+            if not healthy:
+                return min(candidates, key=lambda p: stats[p].error_rate)
+
+            return min(healthy, key=lambda p: stats[p].percentile(50) or float("inf"))
+
+    def hedge_deadline(self, provider: str) -> float:
+        """
+        Plazo tras el cual conviene lanzar la petición de cobertura
+
+        Args:
+            provider (str): Proveedor primario
+
+        Returns:
+            float: Segundos a esperar antes de lanzar el segundo proveedor
+        """
+        with self._lock:
+            stats = self._get_stats(provider.lower())
+            if len(stats.latencies) < self.min_samples:
+                return self.default_hedge_seconds
+            return stats.percentile(self.hedge_percentile)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """
+        Obtener el estado actual de cada proveedor
+
+        Returns:
+            Dict[str, Dict]: Muestras, tasa de errores y p50/p95/p99 por proveedor
+        """
+        with self._lock:
+            for stats in self._stats.values():
+                stats.expire()
+            return {
+                provider: {
+                    "samples": stats.samples,
+                    "error_rate": stats.error_rate,
+                    "p50": stats.percentile(50),
+                    "p95": stats.percentile(95),
+                    "p99": stats.percentile(99)
+                }
+                for provider, stats in self._stats.items()
+            }
@@ -0,0 +1,275 @@
+"""
+Esquema tipado del resultado de análisis y parser validado de respuestas de la IA
+"""
+import json
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+_CODE_FENCE_RE = re.compile(r"```(?:json)?", re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_SINGLE_QUOTED_KEY_RE = re.compile(r"'([^'\"\n]*)'\s*:")
+_SINGLE_QUOTED_VALUE_RE = re.compile(r":\s*'([^'\"\n]*)'")
+_PYTHON_LITERALS = {r"\bTrue\b": "true", r"\bFalse\b": "false", r"\bNone\b": "null"}
+_NUMBER_RE = re.compile(r"-?\d+(?:[.,]\d+)?")
+
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "„": '"', "‘": "'", "’": "'"})
+
+
+class ResultParseError(ValueError):
+    """La respuesta de la IA no contiene un resultado de análisis utilizable"""
+
+
+@dataclass
+class SentimentResult:
+    """
+    Resultado de análisis validado y normalizado
+
+    Usa `__slots__` para que miles de resultados en memoria ocupen lo mínimo.
+    """
+
+    __slots__ = (
+        "sentimiento_general",
+        "puntuacion",
+        "aspectos_positivos",
+        "aspectos_negativos",
+        "recomendaciones",
+        "resumen",
+    )
+
+    sentimiento_general: str
+    puntuacion: int
+    aspectos_positivos: List[str]
+    aspectos_negativos: List[str]
+    recomendaciones: List[str]
+    resumen: str
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SentimentResult":
+        """
+        Validar y normalizar un diccionario devuelto por la IA
+
+        Si falta el sentimiento se deduce de la puntuación y viceversa; si
+        faltan ambos el resultado no es utilizable.
+
+        Args:
+            data (Dict[str, Any]): Objeto JSON de la respuesta
+
+        Returns:
+            SentimentResult: Resultado validado
+
+        Raises:
+            ResultParseError: Si no hay sentimiento ni puntuación válidos
+        """
+        if not isinstance(data, dict):
+            raise ResultParseError("El resultado no es un objeto JSON")
+
+        sentiment = _coerce_sentiment(data.get("sentimiento_general"))
+        score = _coerce_score(data.get("puntuacion"))
+
+        if sentiment is None and score is None:
+            raise ResultParseError("Faltan 'sentimiento_general' y 'puntuacion'")
+        if score is None:
+            score = {"Positivo": 8, "Negativo": 3, "Neutral": 5}[sentiment]
+        if sentiment is None:
+            sentiment = "Positivo" if score >= 7 else "Negativo" if score <= 4 else "Neutral"
+
+        return cls(
+            sentimiento_general=sentiment,
+            puntuacion=score,
+            aspectos_positivos=_coerce_list(data.get("aspectos_positivos")),
+            aspectos_negativos=_coerce_list(data.get("aspectos_negativos")),
+            recomendaciones=_coerce_list(data.get("recomendaciones")),
+            resumen=str(data.get("resumen") or "").strip(),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convertir al diccionario que consumen la interfaz y la caché"""
+        return {
+            "sentimiento_general": self.sentimiento_general,
+            "puntuacion": self.puntuacion,
+            "aspectos_positivos": list(self.aspectos_positivos),
+            "aspectos_negativos": list(self.aspectos_negativos),
+            "recomendaciones": list(self.recomendaciones),
+            "resumen": self.resumen,
+        }
+
+
+def _coerce_sentiment(value: Any) -> Any:
+    """Normalizar el sentimiento a Positivo/Negativo/Neutral (o None)"""
+    if not isinstance(value, str):
+        return None
+    text = unicodedata.normalize("NFKD", value.strip().lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    if text.startswith("pos"):
+        return "Positivo"
+    if text.startswith("neg"):
+        return "Negativo"
+    if text.startswith(("neu", "mixt", "mix")):
+        return "Neutral"
+    return None
+
+
+def _coerce_score(value: Any) -> Any:
+    """Convertir la puntuación a entero entre 1 y 10 (o None)"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        number = float(value)
+    elif isinstance(value, str):
+        match = _NUMBER_RE.search(value)
+        if not match:
+            return None
+        number = float(match.group().replace(",", "."))
+    else:
+        return None
+    return int(min(10, max(1, round(number))))
+
+
+def _coerce_list(value: Any) -> List[str]:
+    """Convertir un campo de lista a lista de textos no vacíos"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value.strip()] if value.strip() else []
+    if isinstance(value, (list, tuple)):
+        return [str(item).strip() for item in value if item is not None and str(item).strip()]
+    return [str(value)]
+
+
+def _close_truncated(text: str) -> str:
+    """Cerrar cadenas, arrays y objetos que quedaron abiertos por truncamiento"""
+    stack = []
+    in_string = False
+    escaped = False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+
+    if in_string:
+        text += '"'
+    text = text.rstrip().rstrip(",:")
+    return text + "".join(reversed(stack))
+
+
+def repair_json(content: str) -> str:
+    """
+    Reparar los defectos habituales del JSON generado por un LLM
+
+    Quita bloques de código, comillas tipográficas, comas finales y
+    literales de Python, y cierra estructuras truncadas.
+
+    Args:
+        content (str): Respuesta de la IA
+
+    Returns:
+        str: Texto JSON candidato
+    """
+    text = _CODE_FENCE_RE.sub("", content).translate(_SMART_QUOTES)
+    start = text.find("{")
+    if start == -1:
+        raise ResultParseError("No se encontró un objeto JSON en la respuesta")
+    end = text.rfind("}")
+    text = text[start:end + 1] if end > start else text[start:]
+
+    text = _SINGLE_QUOTED_KEY_RE.sub(r'"\1":', text)
+    text = _SINGLE_QUOTED_VALUE_RE.sub(r': "\1"', text)
+    for pattern, replacement in _PYTHON_LITERALS.items():
+        text = re.sub(pattern, replacement, text)
+    text = _TRAILING_COMMA_RE.sub(r"\1", text)
+
+    try:
+        json.loads(text)
+        return text
+    except json.JSONDecodeError:
+        return _TRAILING_COMMA_RE.sub(r"\1", _close_truncated(text))
+
+
+class ParseStats:
+    """
+    Contadores de resultados del parser, seguros entre hilos
+
+    - direct: JSON válido a la primera
+    - repaired: JSON recuperado con `repair_json`
+    - fallback: se recurrió al parsing por palabras clave
+    """
+
+    def __init__(self):
+        self.direct = 0
+        self.repaired = 0
+        self.fallback = 0
+        self._lock = threading.Lock()
+
+    def record(self, outcome: str) -> None:
+        """Registrar un resultado ("direct", "repaired" o "fallback")"""
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Obtener los contadores y la tasa de éxito del parser
+
+        Returns:
+            Dict[str, float]: Contadores y "success_rate" (directos + reparados)
+        """
+        with self._lock:
+            total = self.direct + self.repaired + self.fallback
+            return {
+                "direct": self.direct,
+                "repaired": self.repaired,
+                "fallback": self.fallback,
+                "success_rate": (self.direct + self.repaired) / total if total else 1.0,
+            }
+
+
+def _load_json_object(content: str) -> Any:
+    """Leer la respuesta como JSON, o el tramo entre la primera '{' y la última '}'"""
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        start = content.find("{")
+        end = content.rfind("}")
+        if start == -1 or end <= start:
+            raise
+        return json.loads(content[start:end + 1])
+
+
+def parse_sentiment_result(content: str) -> Tuple[SentimentResult, str]:
+    """
+    Convertir la respuesta de la IA en un resultado validado
+
+    Primero intenta leer el JSON tal cual (caso normal con salida
+    estructurada); si no es válido, aplica `repair_json` una sola vez.
+
+    Args:
+        content (str): Respuesta de la IA
+
+    Returns:
+        Tuple[SentimentResult, str]: Resultado y "direct" o "repaired"
+
+    Raises:
+        ResultParseError: Si ni la respuesta ni su reparación son válidas
+    """
+    try:
+        return SentimentResult.from_dict(_load_json_object(content)), "direct"
+    except (json.JSONDecodeError, ResultParseError):
+        pass
+
+    try:
+        data = json.loads(repair_json(content))
+    except json.JSONDecodeError as e:
+        raise ResultParseError(f"JSON irreparable: {str(e)}")
+    return SentimentResult.from_dict(data), "repaired"
@@ -0,0 +1,128 @@
+"""
+Parser JSON incremental para respuestas de la IA recibidas en streaming
+"""
+import json
+from typing import Any, Dict
+
+
+class IncrementalJSONParser:
+    """
+    Extrae los campos de primer nivel de un objeto JSON a medida que llegan
+
+    Cada llamada a `feed` añade un fragmento de texto y devuelve los campos
+    que acaban de completarse. El texto previo a la primera '{' (por ejemplo
+    un bloque ```json) se ignora. Los valores que no sean JSON válido se
+    descartan: el resultado final lo valida igualmente `_parse_ai_response`.
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self._buffer = ""
+        self._pos = 0
+        self._state = "start"
+        self._key = None
+        self._token_start = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    @property
+    def done(self) -> bool:
+        """True cuando se cerró el objeto de primer nivel"""
+        return self._state == "done"
+
+    def feed(self, chunk: str) -> Dict[str, Any]:
+        """
+        Procesar un nuevo fragmento de la respuesta
+
+        Args:
+            chunk (str): Texto recibido
+
+        Returns:
+            Dict[str, Any]: Campos completados con este fragmento
+        """
+        self._buffer += chunk
+        completed = {}
+        buffer = self._buffer
+
+        while self._pos < len(buffer) and self._state != "done":
+            ch = buffer[self._pos]
+            state = self._state
+
+            if state == "start":
+                if ch == "{":
+                    self._state = "key"
+            elif state == "key":
+                if ch == '"':
+                    self._token_start = self._pos
+                    self._state = "key_string"
+                elif ch == "}":
+                    self._state = "done"
+            elif state == "key_string":
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._key = json.loads(buffer[self._token_start:self._pos + 1])
+                    self._state = "colon"
+            elif state == "colon":
+                if ch == ":":
+                    self._state = "value"
+            elif state == "value":
+                if not ch.isspace():
+                    self._token_start = self._pos
+                    self._depth = 0
+                    self._in_string = False
+                    self._escaped = False
+                    self._state = "in_value"
+                    continue
+            elif state == "in_value":
+                end = self._scan_value(ch)
+                if end is not None:
+                    try:
+                        value = json.loads(buffer[self._token_start:end])
+                        self.fields[self._key] = value
+                        completed[self._key] = value
+                    except json.JSONDecodeError:
+                        pass
+                    self._state = "key"
+                    if ch == "}" and end == self._pos:
+                        self._state = "done"
+            self._pos += 1
+
+        return completed
+
+    def _scan_value(self, ch: str):
+        """
+        Avanzar un carácter dentro de un valor
+
+        Returns:
+            Posición final (exclusiva) del valor si terminó, o None
+        """
+        first = self._buffer[self._token_start]
+        if self._in_string:
+            if self._escaped:
+                self._escaped = False
+            elif ch == "\\":
+                self._escaped = True
+            elif ch == '"':
+                self._in_string = False
+                if first == '"' and self._depth == 0:
+                    return self._pos + 1
+            return None
+
+        if ch == '"':
+            self._in_string = True
+        elif ch in "{[":
+            self._depth += 1
+        elif ch in "}]":
+            if self._depth == 0:
+                # Fin del objeto de primer nivel tras un número o literal
+                return self._pos
+            self._depth -= 1
+            if self._depth == 0:
+                return self._pos + 1
+        elif self._depth == 0 and first not in '"{[' and (ch == "," or ch.isspace()):
+            return self._pos
+        return None